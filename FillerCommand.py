@@ -4,14 +4,46 @@ import traceback
 import math
 import collections
 import json
+import time
+import os
 
 from adsk.fusion import BRepFaces
-from .Fusion360Utilities.Fusion360Utilities import AppObjects, combine_feature, item_id
+from .Fusion360Utilities.Fusion360Utilities import AppObjects, combine_feature, item_id, get_default_dir, \
+    extrude_all_profiles, start_group, end_group
 from .Fusion360Utilities.Fusion360CommandBase import Fusion360CommandBase
+from .Fusion360Utilities.Fusion360MeshUtilities import body_mesh, write_binary_stl
+from .Fusion360Utilities.Fusion360MeshBVH import MeshBVH
+from .FillerPlan import plan_fill, plan_tiles, parametric_cells, estimate_fill, solve_fill, draft_plan, encode_plan, \
+    decode_plan, GRADE_LEVELS
+from .FillerEngines import ToolLibrary, CellTools, FillProgress, CutGuard, guarded_cut, tiled_cut, mirror_half, \
+    mirror_union, GUARD_FACE_LIMIT
+from .FillerVoxel import voxel_infill_mesh
+from .FillerSDF import sdf_infill_mesh
+from .FillerCost import dry_run, write_dry_run, engine_cost, choose_engine, fit_cost, read_cost_records, \
+    append_cost_record
 
 
 Point = collections.namedtuple("Point", ["x", "y"])
 
+# Feature definition keys a target solid fraction can solve for, by their dialog names
+SOLVE_PARAMETERS = {'Rib Thickness': 'input_rib_thickness', 'Size': 'input_size'}
+SOLVE_NAMES = {parameter: name for name, parameter in SOLVE_PARAMETERS.items()}
+
+# feature_def symmetry values by their dialog names
+SYMMETRY_PLANES = {'None': None, 'Detect': 'Detect', 'YZ Plane': 'YZ', 'XZ Plane': 'XZ'}
+
+# Engines a benchmark fills every selected body with
+BENCHMARK_ENGINES = ('Sequential', 'Tiled', 'Parametric')
+
+# Measured fill times, automatic engine selection is fitted to them
+COST_RECORDS_FILE = 'engine-costs.jsonl'
+
+# Inputs the estimate line depends on, other changes only show or hide inputs
+ESTIMATE_INPUTS = ('selection_input', 'type_input', 'body_type_input', 'size_input', 'shell_input', 'rib_input',
+                   'graded_input', 'grade_rib_input', 'grade_distance_input', 'grade_face_input', 'anchor_input',
+                   'anchor_point_input', 'draft_input', 'symmetry_input', 'target_input', 'target_density_input',
+                   'target_mass_input', 'solve_for_input')
+
 
 def start_sketch(z):
     ao = AppObjects()
@@ -91,161 +123,231 @@ def shape_extrude(prof, height):
     return extrude_feature
 
 
-# def make_fill(infill_type, body_type, input_size, input_shell_thickness, input_rib_thickness, start_body):
-def make_fill(feature_def, start_body: adsk.fusion.BRepBody, app_name):
+# Temporary full height tools for every motif of one grade level, built from sketches at the given origin
+def build_motif_tools(plan, origin, level, z_center, height):
+    tbm = adsk.fusion.TemporaryBRepManager.get()
+
+    gap = plan['levels'][level]['gap']
+    height_input = adsk.core.ValueInput.createByReal(height)
+
+    tools = {}
+    for motif_index, motif in enumerate(plan['motifs']):
+        center = adsk.core.Point3D.create(origin[0] + motif.dx, origin[1] + motif.dy, z_center)
+
+        if motif.sides == 0:
+            prof = circle_sketch(center, plan['input_size'], gap)
+        else:
+            prof = shape_sketch(center, plan['input_size'], gap, motif.sides, motif.offset)
+
+        body = shape_extrude(prof, height_input).bodies[0]
+        tools[motif_index] = tbm.copy(body)
+        body.deleteMe()
 
+    return tools
+
+
+# Draws cell outlines in one sketch, the sketch is only solved once at the end
+# Returns False if cancelled
+def draw_cells(sketch: adsk.fusion.Sketch, cells, progress: FillProgress):
+    lines = sketch.sketchCurves.sketchLines
+    circles = sketch.sketchCurves.sketchCircles
+
+    sketch.isComputeDeferred = True
+    try:
+        for x, y, sides, offset, spoke in cells:
+            center = adsk.core.Point3D.create(x, y, 0)
+
+            if sides == 0:
+                circles.addByCenterRadius(center, spoke)
+            else:
+                corners = [pointy_shape_corner(center, spoke, corner, offset, sides) for corner in range(sides)]
+                first = lines.addByTwoPoints(corners[0], corners[1])
+                previous_point = first.endSketchPoint
+                for corner in corners[2:]:
+                    previous_point = lines.addByTwoPoints(previous_point, corner).endSketchPoint
+                lines.addByTwoPoints(previous_point, first.startSketchPoint)
+
+            if not progress.step():
+                return False
+    finally:
+        sketch.isComputeDeferred = False
+
+    return True
+
+
+# Removes the timeline items after an index, groups with their features
+def delete_timeline_after(first):
     ao = AppObjects()
+    time_line = ao.time_line
 
-    infill_type = feature_def['infill_type']
-    body_type = feature_def['body_type']
-    input_size = feature_def['input_size']
-    input_shell_thickness = feature_def['input_shell_thickness']
-    input_rib_thickness = feature_def['input_rib_thickness']
+    while time_line.count > first:
+        timeline_object = time_line.item(time_line.count - 1)
+        if timeline_object.isGroup:
+            adsk.fusion.TimelineGroup.cast(timeline_object).deleteMe(True)
+        else:
+            timeline_object.entity.deleteMe()
 
-    # Set styles of progress dialog.
-    progressDialog = ao.ui.createProgressDialog()
-    progressDialog.cancelButtonText = 'Cancel'
-    progressDialog.isBackgroundTranslucent = False
-    progressDialog.isCancelButtonShown = True
 
-    base_feature = ao.root_comp.features.baseFeatures.add()
+# Design space position of a picked vertex, construction point or sketch point
+def point_position(entity):
+    sketch_point = adsk.fusion.SketchPoint.cast(entity)
+    if sketch_point is not None:
+        return list(sketch_point.worldGeometry.asArray())
 
-    base_feature.startEdit()
+    return list(entity.geometry.asArray())
+
+
+# Plans the fill of one body, from a low quality mesh of the body unless a mesh is given
+def plan_body(feature_def, start_body: adsk.fusion.BRepBody, grade_face: adsk.fusion.BRepFace = None, mesh=None):
+
+    # Graded fills measure distance from a picked face, otherwise from the outer surface of the body
+    grade_bvh = None
+    if grade_face is not None:
+        grade_bvh = MeshBVH(*body_mesh(grade_face))
+
+    # Place every tool, trimmed to the local height of the body
+    if mesh is None:
+        mesh = body_mesh(start_body)
 
-    # General bounding box
     bounding_box = start_body.boundingBox
-    extent_vector = bounding_box.maxPoint.asVector()
-    extent_vector.subtract(bounding_box.minPoint.asVector())
-
-    mid_vector = extent_vector.copy()
-    mid_vector.scaleBy(.5)
-    mid_vector.add(bounding_box.minPoint.asVector())
-
-    height_raw = extent_vector.z * 1.1
-    height = adsk.core.ValueInput.createByReal(height_raw)
-
-    # Hex specific
-    if infill_type == "Hex":
-        gap = input_rib_thickness / math.sqrt(3)
-        sides = 6
-        offset = 30
-        x_space = math.sqrt(3) * input_size / 4
-        y_space = 3 * input_size / 4
-
-    # Square specific
-    elif infill_type == "Square":
-        gap = input_rib_thickness * math.sqrt(2) / 2
-        sides = 4
-        offset = 0
-        x_space = input_size / 2
-        y_space = input_size / 2
-
-    # Triangle specific
-    elif infill_type == "Triangle":
-        gap = input_rib_thickness
-        sides = 3
-        offset = 60
-        x_space = input_size / 4
-        y_space = math.sqrt(3) * input_size / 4
-
-    # Circle specific
-    elif infill_type == "Circle":
-        gap = input_rib_thickness / 2
-        x_space = input_size / 2
-        y_space = math.sqrt(3) * input_size / 2
+    plan_for = lambda trial: plan_fill(trial, bounding_box.minPoint.asArray(), bounding_box.maxPoint.asArray(),
+                                       mesh, grade_bvh)
 
+    # Drafts coarsen the cells until their count fits the draft limit
+    if feature_def.get('draft'):
+        return draft_plan(feature_def, plan_for)
+
+    return plan_for(feature_def)
+
+
+# Solves the rib thickness or cell size of one body for a target solid fraction
+# Graded fills are re-planned while solving, returns None if the target cannot be met
+def solve_body(feature_def, start_body: adsk.fusion.BRepBody, grade_face: adsk.fusion.BRepFace = None):
+    plan_for = None
+    if feature_def.get('grade_distance'):
+        mesh = body_mesh(start_body)
+        plan_for = lambda trial: plan_body(trial, start_body, grade_face, mesh)
+
+    return solve_fill(feature_def, start_body.volume, start_body.area, feature_def['target_fraction'],
+                      feature_def['solve_for'], plan_for)
+
+
+# Writes the infilled body straight to an STL file, no features or BRep booleans are created
+def export_fill_mesh(feature_def, start_body: adsk.fusion.BRepBody, file_name,
+                     grade_face: adsk.fusion.BRepFace = None):
+    start = time.perf_counter()
+
+    # The mesh engines sample the whole body, mirroring would not save them any work
+    mesh = body_mesh(start_body, adsk.fusion.TriangleMeshQualityOptions.NormalQualityTriangleMesh)
+    plan = plan_body(dict(feature_def, symmetry=None), start_body, grade_face, mesh)
+
+    if plan is None:
+        return None
+
+    # Smooth surfaces from distance fields, or the faster blocky voxel faces
+    if feature_def.get('mesh_engine', 'Voxel') == 'SDF':
+        triangles = sdf_infill_mesh(plan, feature_def, mesh)
     else:
-        return
-
-    cp_1 = mid_vector.asPoint()
-    cp_2 = adsk.core.Point3D.create(cp_1.x + x_space, cp_1.y + y_space, cp_1.z)
-
-    if infill_type in ['Square', 'Hex']:
-        prof_1 = shape_sketch(cp_1, input_size, gap, sides, offset)
-        prof_2 = shape_sketch(cp_2, input_size, gap, sides, offset)
-
-    elif infill_type in ['Triangle']:
-        cp_3 = adsk.core.Point3D.create(cp_1.x + input_size, cp_1.y, cp_1.z)
-        cp_4 = adsk.core.Point3D.create(cp_1.x + (3 * x_space), cp_1.y + y_space, cp_1.z)
-        prof_1 = shape_sketch(cp_1, input_size, gap, sides, 0)
-        prof_2 = shape_sketch(cp_2, input_size, gap, sides, offset)
-        prof_3 = shape_sketch(cp_3, input_size, gap, sides, offset)
-        prof_4 = shape_sketch(cp_4, input_size, gap, sides, 0)
-
-    elif infill_type in ['Circle']:
-        prof_1 = circle_sketch(cp_1, input_size, gap)
-        prof_2 = circle_sketch(cp_2, input_size, gap)
-    else:
-        return
+        triangles = voxel_infill_mesh(plan, feature_def, mesh)
+    write_binary_stl(file_name, triangles)
+
+    return {"body": start_body.name, "cells": len(plan['cells']), "triangles": len(triangles),
+            "file_name": file_name, "seconds": time.perf_counter() - start}
+
+
+# Cost constants fitted to the fills measured so far, and the file new measurements are added to
+def fitted_cost(app_name):
+    cost_file = os.path.join(get_default_dir(app_name), COST_RECORDS_FILE)
+    return fit_cost(read_cost_records(cost_file)), cost_file
+
+
+# Plans one body and predicts the work of every engine, no features or temporary bodies are created
+def dry_run_body(feature_def, start_body: adsk.fusion.BRepBody, grade_face: adsk.fusion.BRepFace = None,
+                 cost=None):
+    start = time.perf_counter()
 
-    d1_space = adsk.core.ValueInput.createByReal(x_space * 2)
-    d2_space = adsk.core.ValueInput.createByReal(y_space * 2)
+    plan = plan_body(feature_def, start_body, grade_face)
+    if plan is None:
+        return None
 
-    x_qty_raw = math.ceil(extent_vector.x / d1_space.realValue) + 4
-    y_qty_raw = math.ceil(extent_vector.y / d2_space.realValue) + 4
+    report = dry_run(plan, feature_def, start_body.faces.count, cost=cost)
+    report["body"] = start_body.name
+    report["plan_seconds"] = time.perf_counter() - start
 
-    x_qty = adsk.core.ValueInput.createByReal(x_qty_raw)
-    y_qty = adsk.core.ValueInput.createByReal(y_qty_raw)
+    return report
 
-    extrude_cut_collection = []
-    extrude_1 = shape_extrude(prof_1, height)
-    extrude_2 = shape_extrude(prof_2, height)
 
-    extrude_cut_collection.append(extrude_1.bodies[0])
-    extrude_cut_collection.append(extrude_2.bodies[0])
+# Analytic estimate of a planned fill, drafts are planned with a coarser cell size and have no shell
+def plan_estimate(feature_def, start_body: adsk.fusion.BRepBody, plan):
+    estimate_def = dict(feature_def, input_size=plan['input_size'])
+    if feature_def.get('draft'):
+        estimate_def['body_type'] = "Direct Cut"
 
-    if infill_type in ['Triangle']:
-        d1_space = adsk.core.ValueInput.createByReal(3 * input_size / 2)
-        x_qty = adsk.core.ValueInput.createByReal(x_qty_raw / 2)
+    return estimate_fill(estimate_def, start_body.volume, start_body.area, plan)
 
-        extrude_3 = shape_extrude(prof_3, height)
-        extrude_4 = shape_extrude(prof_4, height)
-        extrude_cut_collection.append(extrude_3.bodies[0])
-        extrude_cut_collection.append(extrude_4.bodies[0])
+
+# Cuts one planned body and adds the result in a new base feature
+# Returns the run metrics or None if cancelled
+def fill_body(feature_def, start_body: adsk.fusion.BRepBody, plan, tiles, library: ToolLibrary,
+              progress: FillProgress, app_name, engine=None):
+
+    ao = AppObjects()
+
+    infill_type = feature_def['infill_type']
+    body_type = feature_def['body_type']
+    input_size = feature_def['input_size']
+    input_shell_thickness = feature_def['input_shell_thickness']
+    input_rib_thickness = feature_def['input_rib_thickness']
+
+    start = time.perf_counter()
+
+    base_feature = ao.root_comp.features.baseFeatures.add()
+
+    base_feature.startEdit()
 
     tbm = adsk.fusion.TemporaryBRepManager.get()
 
     trans_core = tbm.copy(start_body)
 
-    pattern_list = []
+    cell_tools = CellTools(plan, library)
 
-    for body in extrude_cut_collection:
-        trans = tbm.copy(body)
-        pattern_list.append(trans)
-        body.deleteMe()
+    engine = engine or feature_def.get('engine', 'Sequential')
+    metrics = {"body": start_body.name, "engine": engine, "cells": len(plan['cells']),
+               "candidate_cells": plan['candidate_count'], "start_volume": start_body.volume}
 
-    # Show dialog
-    iterations = int(x_qty.realValue * y_qty.realValue * 4 * len(pattern_list))
-    i = 0
-    progressDialog.title = 'Fusion Filler'
-    progressDialog.message = '  Completed %v of %m Steps  '
-    progressDialog.minimumValue = 0
-    progressDialog.maximumValue = iterations
-    # progressDialog.show('Computing Features:  ', 'Percentage: %p, Current step %v of %m', 0, iterations, 1)
+    estimate = plan_estimate(feature_def, start_body, plan)
+    if estimate is not None:
+        metrics['estimated_volume'] = estimate['volume']
+
+    # Symmetric plans cut the lower half of the core and mirror it
+    mirror = plan.get('mirror')
+    if mirror is not None:
+        metrics['symmetry'] = mirror['symmetry']
+        trans_core = mirror_half(trans_core, mirror)
+    elif plan.get('mirror_rejected'):
+        metrics['symmetry_rejected'] = plan['mirror_rejected']
 
-    for x_int in range(int(x_qty.realValue) * 2):
+    # Cores growing past the limits are split and finished in quarters
+    guard = CutGuard(metrics, feature_def.get('guard_face_limit'), feature_def.get('guard_rss_limit'))
 
-        x_val = x_int * d1_space.realValue - x_qty.realValue * d1_space.realValue
+    if engine == 'Tiled':
+        trans_core = tiled_cut(trans_core, cell_tools, plan, tiles, progress, metrics, guard)
+    else:
+        trans_core = guarded_cut(trans_core, cell_tools, plan, plan['cells'], progress, guard)
 
-        for y_int in range(int(y_qty.realValue) * 2):
-            y_val = y_int * d2_space.realValue - y_qty.realValue * d2_space.realValue
+    if trans_core is None:
+        return None
 
-            trans_matrix = adsk.core.Matrix3D.create()
-            trans_matrix.translation = adsk.core.Vector3D.create(x_val, y_val, 0)
-            for body in pattern_list:
-                trans_tool = tbm.copy(body)
-                tbm.transform(trans_tool, trans_matrix)
-                tbm.booleanOperation(trans_core, trans_tool, adsk.fusion.BooleanTypes.DifferenceBooleanType)
-                # If progress dialog is cancelled, stop drawing.
-                if progressDialog.wasCancelled:
-                    return
-                i += 1
-            progressDialog.progressValue = i
+    if mirror is not None:
+        trans_core = mirror_union(trans_core, mirror)
+
+    metrics['cut_seconds'] = time.perf_counter() - start
 
     # ao.ui.messageBox("volume:   " + str(trans_core.volume))
-    progressDialog.message = '  Finishing Up  '
+    progress.progress_dialog.message = '  Finishing Up  '
 
-    if body_type == "Create Shell":
+    # Drafts only show the lattice, the shell is added when they are promoted
+    if body_type == "Create Shell" and not feature_def.get('draft'):
         # Shell Main body
         # ao.root_comp.bRepBodies.add(trans_core, base_feature)
         base_feature.finishEdit()
@@ -273,7 +375,8 @@ def make_fill(feature_def, start_body: adsk.fusion.BRepBody, app_name):
     base_feature.finishEdit()
     filler_feature_id = item_id(base_feature, app_name)
     new_body_id = item_id(new_body, app_name)
-    feature_def = {
+    feature_def = dict(feature_def)
+    feature_def.update({
         "infill_type": infill_type,
         "body_type": body_type,
         "input_size": input_size,
@@ -282,11 +385,331 @@ def make_fill(feature_def, start_body: adsk.fusion.BRepBody, app_name):
         "new_body_id": new_body_id,
         "filler_feature_id": filler_feature_id,
         "start_body_id": item_id(start_body, app_name),
+        "start_revision_id": start_body.revisionId,
         "revisionId": new_body.revisionId
-    }
+    })
+
+    if feature_def.get('draft'):
+        feature_def["draft_input_size"] = plan['input_size']
 
     base_feature.attributes.add(app_name, "feature_def", json.dumps(feature_def))
 
+    # The applied cells, updates reuse them while the start body is unchanged
+    base_feature.attributes.add(app_name, "fill_plan", encode_plan(plan))
+
+    metrics['volume'] = new_body.volume
+    metrics['seconds'] = time.perf_counter() - start
+
+    return metrics
+
+
+# Fills one planned body with timeline features, every cell outline in one sketch and a single extrude cut
+# The features are grouped in the timeline, the feature_def is kept on the cut
+# Returns the run metrics or None if cancelled
+def parametric_fill_body(feature_def, start_body: adsk.fusion.BRepBody, plan, progress: FillProgress, app_name):
+    ao = AppObjects()
+
+    start = time.perf_counter()
+    first = ao.time_line.count
+    group_start = start_group()
+
+    metrics = {"body": start_body.name, "engine": 'Parametric', "cells": len(plan['cells']),
+               "candidate_cells": plan['candidate_count'], "start_volume": start_body.volume}
+
+    estimate = plan_estimate(feature_def, start_body, plan)
+    if estimate is not None:
+        metrics['estimated_volume'] = estimate['volume']
+
+    if plan.get('mirror') is not None:
+        metrics['symmetry'] = plan['mirror']['symmetry']
+    elif plan.get('mirror_rejected'):
+        metrics['symmetry_rejected'] = plan['mirror_rejected']
+
+    core = start_body.copyToComponent(ao.root_comp)
+
+    sketch = start_sketch(plan['z_base'])
+    if not draw_cells(sketch, parametric_cells(plan), progress):
+        delete_timeline_after(first)
+        return None
+    metrics['sketch_seconds'] = time.perf_counter() - start
+
+    progress.progress_dialog.message = '  Cutting {} Cells  '.format(sketch.profiles.count)
+    cut_feature = extrude_all_profiles(sketch, plan['height'], ao.root_comp,
+                                       adsk.fusion.FeatureOperations.CutFeatureOperation, [core])
+    new_body = cut_feature.bodies.item(0)
+    metrics['cut_seconds'] = time.perf_counter() - start
+
+    # Drafts only show the lattice, the shell is added when they are promoted
+    if feature_def['body_type'] == "Create Shell" and not feature_def.get('draft'):
+        shell_body = start_body.copyToComponent(ao.root_comp)
+
+        input_collection = adsk.core.ObjectCollection.create()
+        input_collection.add(shell_body)
+        shell_input = ao.root_comp.features.shellFeatures.createInput(input_collection)
+        shell_input.insideThickness = adsk.core.ValueInput.createByReal(feature_def['input_shell_thickness'])
+        ao.root_comp.features.shellFeatures.add(shell_input)
+
+        combine_feature(new_body, [shell_body], adsk.fusion.FeatureOperations.JoinFeatureOperation)
+
+    end_group(group_start)
+
+    # The engine setting is kept, so Automatic fills choose again when they are updated
+    feature_def = dict(feature_def)
+    feature_def.update({
+        "filled_engine": 'Parametric',
+        "new_body_id": item_id(new_body, app_name),
+        "filler_feature_id": item_id(cut_feature, app_name),
+        "start_body_id": item_id(start_body, app_name),
+        "start_revision_id": start_body.revisionId,
+        "revisionId": new_body.revisionId
+    })
+    if feature_def.get('draft'):
+        feature_def["draft_input_size"] = plan['input_size']
+
+    cut_feature.attributes.add(app_name, "feature_def", json.dumps(feature_def))
+    cut_feature.attributes.add(app_name, "fill_plan", encode_plan(plan))
+
+    metrics['volume'] = new_body.volume
+    metrics['seconds'] = time.perf_counter() - start
+
+    return metrics
+
+
+# Fills a body with each engine in turn and removes the results again, returns the metrics of every engine
+def benchmark_body(feature_def, start_body: adsk.fusion.BRepBody, app_name, grade_face: adsk.fusion.BRepFace = None,
+                   engines=BENCHMARK_ENGINES):
+    ao = AppObjects()
+
+    results = []
+    for engine in engines:
+        first = ao.time_line.count
+        metrics = make_fill(dict(feature_def, engine=engine), start_body, app_name, grade_face)
+        delete_timeline_after(first)
+
+        # If progress dialog is cancelled, stop the benchmark.
+        if metrics is None:
+            break
+        results.append(metrics)
+
+    return results
+
+
+# Fills several bodies in one run, sharing motif tools between bodies with the same lattice
+# jobs -> list of (feature_def, start_body, grade_face)
+# plans -> optional stored plan of each job, jobs without one are planned
+# Bodies are filled cheapest first under a single progress dialog
+# Returns the metrics of every finished body
+def make_fills(jobs, app_name, plans=None):
+
+    ao = AppObjects()
+
+    cost, cost_file = fitted_cost(app_name)
+
+    planned = []
+    for index, (feature_def, start_body, grade_face) in enumerate(jobs):
+        start = time.perf_counter()
+        plan = plans[index] if plans else None
+        if plan is None:
+            plan = plan_body(feature_def, start_body, grade_face)
+
+        if plan is None:
+            continue
+
+        # Automatic picks the engine with the lowest predicted time, otherwise the user's choice is kept
+        core_faces = start_body.faces.count
+        engine = feature_def.get('engine', 'Sequential')
+        tiles = None
+        reason = None
+        if engine == 'Automatic':
+            predicted, tiles, reason = choose_engine(plan, feature_def, core_faces, cost)
+            engine = predicted['engine']
+        else:
+            if engine == 'Tiled':
+                tiles = plan_tiles(plan, core_faces, feature_def.get('tile_size'), feature_def.get('tile_face_budget'))
+            predicted = engine_cost(plan, feature_def, core_faces, engine, tiles, cost)
+
+        # Parametric fills step through every drawn outline, both halves of a mirrored plan
+        if tiles is not None:
+            steps = sum(len(tile['cells']) for tile in tiles)
+        elif engine == 'Parametric':
+            steps = len(parametric_cells(plan))
+        else:
+            steps = len(plan['cells'])
+
+        planned.append((feature_def, start_body, plan, tiles, steps, time.perf_counter() - start,
+                        engine, predicted, reason))
+
+    if not planned:
+        return []
+
+    # Every boolean costs about the same, so the step count orders the bodies
+    planned.sort(key=lambda job: job[4])
+
+    # Tools tall enough for every body of the run
+    z_min = min(job[2]['z_base'] for job in planned)
+    z_max = max(job[2]['z_base'] + job[2]['height'] for job in planned)
+    library = ToolLibrary(build_motif_tools, (z_min + z_max) / 2, z_max - z_min)
+
+    # Set styles of progress dialog.
+    progressDialog = ao.ui.createProgressDialog()
+    progressDialog.cancelButtonText = 'Cancel'
+    progressDialog.isBackgroundTranslucent = False
+    progressDialog.isCancelButtonShown = True
+
+    # Show dialog
+    iterations = sum(job[4] for job in planned)
+    progressDialog.title = 'Fusion Filler'
+    progressDialog.message = '  Completed %v of %m Steps  '
+    progressDialog.minimumValue = 0
+    progressDialog.maximumValue = iterations
+    # progressDialog.show('Computing Features:  ', 'Percentage: %p, Current step %v of %m', 0, iterations, 1)
+    progress = FillProgress(progressDialog)
+
+    all_metrics = []
+    for feature_def, start_body, plan, tiles, steps, plan_seconds, engine, predicted, reason in planned:
+        progressDialog.message = '  Completed %v of %m Steps  '
+
+        if engine == 'Parametric':
+            metrics = parametric_fill_body(feature_def, start_body, plan, progress, app_name)
+        else:
+            metrics = fill_body(feature_def, start_body, plan, tiles, library, progress, app_name, engine)
+
+        # If progress dialog is cancelled, stop the batch.
+        if metrics is None:
+            break
+
+        metrics['plan_seconds'] = plan_seconds
+        metrics['predicted_seconds'] = predicted['seconds']
+        if reason is not None:
+            metrics['engine_reason'] = reason
+        all_metrics.append(metrics)
+
+        # Every finished fill refines the cost model of later runs
+        append_cost_record(cost_file, {"engine": engine, "cells": metrics['cells'],
+                                       "core_faces": start_body.faces.count, "terms": predicted['terms'],
+                                       "seconds": metrics['cut_seconds'], "reason": reason})
+
+    return all_metrics
+
+
+# def make_fill(infill_type, body_type, input_size, input_shell_thickness, input_rib_thickness, start_body):
+def make_fill(feature_def, start_body: adsk.fusion.BRepBody, app_name, grade_face: adsk.fusion.BRepFace = None,
+              plan=None):
+    all_metrics = make_fills([(feature_def, start_body, grade_face)], app_name, [plan])
+
+    if all_metrics:
+        return all_metrics[0]
+
+    return None
+
+
+# Fill parameters shared by every body of a run, from the command inputs
+def base_feature_def(input_values):
+    feature_def = {
+        "infill_type": input_values['type_input'],
+        "body_type": input_values['body_type_input'],
+        "input_size": input_values['size_input'],
+        "input_shell_thickness": input_values['shell_input'],
+        "input_rib_thickness": input_values['rib_input'],
+        "engine": input_values['engine_input'],
+    }
+
+    # Targets are met by solving one parameter for each body before it is filled
+    fraction = target_fraction(input_values, input_values.get('selection_input'))
+    if fraction is not None:
+        feature_def["target_fraction"] = fraction
+        feature_def["solve_for"] = SOLVE_PARAMETERS[input_values['solve_for_input']]
+
+    feature_def["guard_face_limit"] = input_values['face_limit_input']
+
+    if input_values['draft_input']:
+        feature_def["draft"] = True
+
+    # Mirror planes by their dialog names, Detect checks each body for a plane when it is planned
+    symmetry = SYMMETRY_PLANES[input_values['symmetry_input']]
+    if symmetry is not None:
+        feature_def["symmetry"] = symmetry
+
+    # Zero tile size lets the face budget pick the tiles
+    tile_size = input_values['tile_size_input']
+    if feature_def['engine'] == 'Tiled' and tile_size > 0:
+        feature_def["tile_size"] = tile_size
+
+    # Graded rib thickness, measured from a picked face or from the outer surface
+    if input_values['graded_input']:
+        feature_def["grade_rib_thickness"] = input_values['grade_rib_input']
+        feature_def["grade_distance"] = input_values['grade_distance_input']
+        feature_def["grade_levels"] = GRADE_LEVELS
+
+    return feature_def
+
+
+# Solid fraction wanted for the selected bodies, a target mass is shared by all of them
+# Returns None without a target
+def target_fraction(input_values, bodies):
+    target = input_values['target_input']
+
+    if target == 'Solid %':
+        return input_values['target_density_input'] / 100
+
+    elif target == 'Mass' and bodies:
+        full_mass = sum(adsk.fusion.BRepBody.cast(body).physicalProperties.mass for body in bodies)
+        if full_mass > 0:
+            return input_values['target_mass_input'] / full_mass
+
+    return None
+
+
+# Expected infill of the selected bodies, from the analytic estimate without any geometry
+# With a target the solved value of each body is listed
+def estimate_text(feature_def, bodies):
+    ao = AppObjects()
+
+    if not bodies:
+        return 'Select bodies for an estimate'
+
+    if feature_def['input_size'] <= 0:
+        return ''
+
+    volume = 0.0
+    solid_volume = 0.0
+    mass = 0.0
+    solved_values = []
+    for selection in bodies:
+        body = adsk.fusion.BRepBody.cast(selection)
+
+        body_def = feature_def
+        if 'target_fraction' in feature_def:
+            body_def = solve_fill(feature_def, body.volume, body.area, feature_def['target_fraction'],
+                                  feature_def['solve_for'])
+            if body_def is None:
+                return 'Target can not be met for ' + body.name
+            solved_values.append(ao.units_manager.formatInternalValue(body_def[feature_def['solve_for']],
+                                                                      ao.units_manager.defaultLengthUnits, True))
+
+        estimate = estimate_fill(body_def, body.volume, body.area)
+        if estimate is None:
+            return ''
+
+        volume += body.volume
+        solid_volume += estimate['volume']
+        mass += estimate['volume'] * body.physicalProperties.density
+
+    volume_units = ao.units_manager.defaultLengthUnits + '^3'
+    text = '{:.0f}% solid, {}, {:.3g} kg'.format(100 * solid_volume / volume,
+                                                 ao.units_manager.formatInternalValue(solid_volume, volume_units,
+                                                                                      True),
+                                                 mass)
+    if solved_values:
+        text += '\n' + SOLVE_NAMES[feature_def['solve_for']] + ': ' + ', '.join(solved_values)
+
+    return text
+
+
+# Symmetry planes are checked against each body, a plane the body does not match is filled in full
+def rejected_symmetry_text(symmetry):
+    return 'Not symmetric across the {} plane, filled in full'.format(symmetry)
+
 
 # Class for the Fusion 360 Command
 class FillerCommand(Fusion360CommandBase):
@@ -300,34 +723,125 @@ class FillerCommand(Fusion360CommandBase):
         ao = AppObjects()
 
         # Get the values from the user input
-        infill_type = input_values['type_input']
-        body_type = input_values['body_type_input']
-        input_size = input_values['size_input']
-        input_shell_thickness = input_values['shell_input']
-        input_rib_thickness = input_values['rib_input']
         all_selections = input_values['selection_input']
-
-        start_body = adsk.fusion.BRepBody.cast(all_selections[0])
-        start_volume = start_body.volume
-        start_body_count = ao.design.rootComponent.bRepBodies.count
-
-        start_body_id = item_id(start_body, self.app_name)
-
-        feature_def = {
-            "infill_type": infill_type,
-            "body_type": body_type,
-            "input_size": input_size,
-            "input_shell_thickness": input_shell_thickness,
-            "input_rib_thickness": input_rib_thickness,
-            "start_body_id": start_body_id,
-        }
-
-        make_fill(feature_def, start_body, self.app_name)
-
-        # final_volume = start_body.volume
-        # ao.ui.messageBox(
-        #     'The final percentage infill is:  {0:.2g}% \n'.format(100 * final_volume / start_volume)
-        # )
+        output = input_values['output_input']
+
+        base_def = base_feature_def(input_values)
+
+        grade_face = None
+        if input_values['graded_input']:
+            grade_faces = input_values.get('grade_face_input')
+            if grade_faces:
+                grade_face = adsk.fusion.BRepFace.cast(grade_faces[0])
+                base_def["grade_face_id"] = item_id(grade_face, self.app_name)
+
+        # A fixed anchor keeps every cell in place when the body is edited
+        anchor = input_values['anchor_input']
+        if anchor == 'Design Origin':
+            base_def["anchor"] = [0.0, 0.0, 0.0]
+        elif anchor == 'Point' and input_values.get('anchor_point_input'):
+            anchor_point = input_values['anchor_point_input'][0]
+            base_def["anchor"] = point_position(anchor_point)
+            base_def["anchor_point_id"] = item_id(anchor_point, self.app_name)
+
+        # One job per selected body, all with the same parameters unless solved for a target
+        jobs = []
+        for selection in all_selections:
+            start_body = adsk.fusion.BRepBody.cast(selection)
+            body_def = dict(base_def)
+
+            if 'target_fraction' in body_def:
+                body_def = solve_body(body_def, start_body, grade_face)
+                if body_def is None:
+                    ao.ui.messageBox('The target can not be met for {}, it is skipped'.format(start_body.name))
+                    continue
+
+            body_def["start_body_id"] = item_id(start_body, self.app_name)
+            jobs.append((body_def, start_body, grade_face))
+
+        if output == 'STL Mesh':
+            for body_def, start_body, grade_face in jobs:
+                body_def["mesh_engine"] = input_values['mesh_engine_input']
+
+            folder_dialog = ao.ui.createFolderDialog()
+            folder_dialog.title = 'Folder for Infill Meshes'
+            if folder_dialog.showDialog() != adsk.core.DialogResults.DialogOK:
+                return
+
+            all_metrics = []
+            for body_def, start_body, grade_face in jobs:
+                file_name = os.path.join(folder_dialog.folder, start_body.name + '-infill.stl')
+                metrics = export_fill_mesh(body_def, start_body, file_name, grade_face)
+                if metrics is not None:
+                    all_metrics.append(metrics)
+
+            message = 'Wrote {} infill meshes in {:.1f} s\n\n'.format(len(all_metrics),
+                                                                    sum(m['seconds'] for m in all_metrics))
+            for metrics in all_metrics:
+                message += '{}:  {} triangles, {:.1f} s\n'.format(metrics['file_name'], metrics['triangles'],
+                                                                  metrics['seconds'])
+            ao.ui.messageBox(message)
+            return
+
+        if output == 'Benchmark':
+            message = ''
+            for body_def, start_body, grade_face in jobs:
+                results = benchmark_body(body_def, start_body, self.app_name, grade_face)
+                message += '{}:  {} cells\n'.format(start_body.name, results[0]['cells'] if results else 0)
+                for metrics in results:
+                    message += '    {}:  {:.1f} s (predicted {:.1f} s), {:.0f}% solid\n'.format(
+                        metrics['engine'], metrics['seconds'], metrics['predicted_seconds'],
+                        100 * metrics['volume'] / metrics['start_volume'])
+            ao.ui.messageBox(message)
+            return
+
+        if output == 'Plan JSON':
+            file_dialog = ao.ui.createFileDialog()
+            file_dialog.title = 'Save Fill Plan'
+            file_dialog.filter = 'JSON Files (*.json)'
+            file_dialog.initialFilename = 'infill-plan.json'
+            if file_dialog.showSave() != adsk.core.DialogResults.DialogOK:
+                return
+
+            cost, cost_file = fitted_cost(self.app_name)
+            reports = []
+            for body_def, start_body, grade_face in jobs:
+                report = dry_run_body(body_def, start_body, grade_face, cost)
+                if report is not None:
+                    reports.append(report)
+            write_dry_run(file_dialog.filename, reports)
+
+            message = 'Wrote the plan of {} bodies to {}\n\n'.format(len(reports), file_dialog.filename)
+            for report in reports:
+                message += '{}:  {} cells\n'.format(report['body'], report['cell_count'])
+                if report['mirror_rejected']:
+                    message += '    {}\n'.format(rejected_symmetry_text(report['mirror_rejected']))
+                for engine in report['engines']:
+                    message += '    {}:  {} booleans, {} peak faces, about {:.0f} s\n'.format(
+                        engine['engine'], engine['booleans'], engine['peak_faces'], engine['seconds'])
+            ao.ui.messageBox(message)
+            return
+
+        all_metrics = make_fills(jobs, self.app_name)
+
+        if len(jobs) > 1:
+            message = 'Filled {} of {} bodies in {:.1f} s\n\n'.format(len(all_metrics), len(jobs),
+                                                                     sum(m['seconds'] for m in all_metrics))
+            for metrics in all_metrics:
+                message += '{}:  {} cells, {:.0f}% solid (estimated {:.0f}%), {}, {:.1f} s\n'.format(
+                    metrics['body'], metrics['cells'], 100 * metrics['volume'] / metrics['start_volume'],
+                    100 * metrics.get('estimated_volume', 0) / metrics['start_volume'], metrics['engine'],
+                    metrics['seconds'])
+                if 'engine_reason' in metrics:
+                    message += '    Automatic: {}\n'.format(metrics['engine_reason'])
+                if 'symmetry_rejected' in metrics:
+                    message += '    {}\n'.format(rejected_symmetry_text(metrics['symmetry_rejected']))
+            ao.ui.messageBox(message)
+
+        # A single fill only reports a mirror plane it could not use
+        elif all_metrics and 'symmetry_rejected' in all_metrics[0]:
+            ao.ui.messageBox('{}:  {}'.format(all_metrics[0]['body'],
+                                              rejected_symmetry_text(all_metrics[0]['symmetry_rejected'])))
 
     # Run when the user selects your command icon from the Fusion 360 UI
     # Typically used to create and display a command dialog box
@@ -352,9 +866,9 @@ class FillerCommand(Fusion360CommandBase):
 
         # inputs.addBoolValueInput('bool_input', '***Sample***Checked', True)
         # inputs.addStringValueInput('string_input', '***Sample***String Value', 'Default value')
-        selection = inputs.addSelectionInput('selection_input', 'Body for Infill', 'Select a solid body')
+        selection = inputs.addSelectionInput('selection_input', 'Bodies for Infill', 'Select one or more solid bodies')
         selection.addSelectionFilter("SolidBodies")
-        selection.setSelectionLimits(1, 1)
+        selection.setSelectionLimits(1, 0)
 
         drop_down_input = inputs.addDropDownCommandInput('type_input', 'Infill Style',
                                                          adsk.core.DropDownStyles.TextListDropDownStyle)
@@ -367,6 +881,127 @@ class FillerCommand(Fusion360CommandBase):
         radio.listItems.add("Create Shell", True)
         radio.listItems.add("Direct Cut", False)
 
+        # Graded infill, hidden until enabled
+        inputs.addBoolValueInput('graded_input', 'Graded Infill', True, '', False)
+        grade_rib = inputs.addValueInput('grade_rib_input', 'Rib Thickness at Surface',
+                                         ao.units_manager.defaultLengthUnits,
+                                         adsk.core.ValueInput.createByString('.2 in'))
+        grade_distance = inputs.addValueInput('grade_distance_input', 'Grading Distance',
+                                              ao.units_manager.defaultLengthUnits,
+                                              adsk.core.ValueInput.createByString('1 in'))
+        grade_face = inputs.addSelectionInput('grade_face_input', 'Grade From Face',
+                                              'Optionally select a face, defaults to the outer surface')
+        grade_face.addSelectionFilter("SolidFaces")
+        grade_face.setSelectionLimits(0, 1)
+
+        for grade_input in [grade_rib, grade_distance, grade_face]:
+            grade_input.isVisible = False
+
+        # Lattice anchor, the center of each body moves the cells whenever the body changes size
+        anchor_input = inputs.addDropDownCommandInput('anchor_input', 'Lattice Anchor',
+                                                      adsk.core.DropDownStyles.TextListDropDownStyle)
+        anchor_input.listItems.add('Body Center', True)
+        anchor_input.listItems.add('Design Origin', False)
+        anchor_input.listItems.add('Point', False)
+        anchor_point = inputs.addSelectionInput('anchor_point_input', 'Anchor Point',
+                                                'Select a vertex, construction point or sketch point')
+        anchor_point.addSelectionFilter("Vertices")
+        anchor_point.addSelectionFilter("ConstructionPoints")
+        anchor_point.addSelectionFilter("SketchPoints")
+        anchor_point.setSelectionLimits(0, 1)
+        anchor_point.isVisible = False
+
+        output_input = inputs.addDropDownCommandInput('output_input', 'Output',
+                                                      adsk.core.DropDownStyles.TextListDropDownStyle)
+        output_input.listItems.add('BRep Body', True)
+        output_input.listItems.add('STL Mesh', False)
+        output_input.listItems.add('Plan JSON', False)
+        output_input.listItems.add('Benchmark', False)
+
+        mesh_engine_input = inputs.addDropDownCommandInput('mesh_engine_input', 'Mesh Engine',
+                                                           adsk.core.DropDownStyles.TextListDropDownStyle)
+        mesh_engine_input.listItems.add('Voxel', True)
+        mesh_engine_input.listItems.add('SDF', False)
+        mesh_engine_input.isVisible = False
+
+        engine_input = inputs.addDropDownCommandInput('engine_input', 'Boolean Engine',
+                                                      adsk.core.DropDownStyles.TextListDropDownStyle)
+        engine_input.listItems.add('Automatic', True)
+        engine_input.listItems.add('Sequential', False)
+        engine_input.listItems.add('Tiled', False)
+        engine_input.listItems.add('Parametric', False)
+
+        tile_size = inputs.addValueInput('tile_size_input', 'Tile Size (0 for automatic)',
+                                         ao.units_manager.defaultLengthUnits,
+                                         adsk.core.ValueInput.createByReal(0))
+        tile_size.isVisible = False
+
+        # Quick fills for reviews, Update Fills can promote them to full quality later
+        inputs.addBoolValueInput('draft_input', 'Draft Quality', True, '', False)
+
+        symmetry_input = inputs.addDropDownCommandInput('symmetry_input', 'Symmetry',
+                                                        adsk.core.DropDownStyles.TextListDropDownStyle)
+        for name in SYMMETRY_PLANES:
+            symmetry_input.listItems.add(name, name == 'None')
+
+        inputs.addIntegerSpinnerCommandInput('face_limit_input', 'Face Limit (0 for none)', 0, 10000000, 1000,
+                                             GUARD_FACE_LIMIT)
+
+        # Target density or mass, solved before filling
+        target_input = inputs.addDropDownCommandInput('target_input', 'Target',
+                                                      adsk.core.DropDownStyles.TextListDropDownStyle)
+        target_input.listItems.add('None', True)
+        target_input.listItems.add('Solid %', False)
+        target_input.listItems.add('Mass', False)
+
+        target_density = inputs.addValueInput('target_density_input', 'Target Solid %', '',
+                                              adsk.core.ValueInput.createByReal(40))
+        target_mass = inputs.addValueInput('target_mass_input', 'Target Mass', 'kg',
+                                           adsk.core.ValueInput.createByString('1 kg'))
+        solve_for = inputs.addDropDownCommandInput('solve_for_input', 'Solve For',
+                                                   adsk.core.DropDownStyles.TextListDropDownStyle)
+        solve_for.listItems.add('Rib Thickness', True)
+        solve_for.listItems.add('Size', False)
+
+        for target_value_input in [target_density, target_mass, solve_for]:
+            target_value_input.isVisible = False
+
+        inputs.addTextBoxCommandInput('estimate_input', 'Estimate', 'Select bodies for an estimate', 1, True)
+
+    # Show the grading and tiling inputs only when they apply, and refresh the estimate when its inputs change
+    def on_input_changed(self, command: adsk.core.Command, inputs: adsk.core.CommandInputs, changed_input,
+                         input_values):
+        if changed_input.id == 'graded_input':
+            for input_id in ['grade_rib_input', 'grade_distance_input', 'grade_face_input']:
+                inputs.itemById(input_id).isVisible = changed_input.value
+
+        elif changed_input.id == 'anchor_input':
+            inputs.itemById('anchor_point_input').isVisible = input_values['anchor_input'] == 'Point'
+
+        elif changed_input.id == 'engine_input':
+            inputs.itemById('tile_size_input').isVisible = input_values['engine_input'] == 'Tiled'
+
+        # Mesh output skips the boolean engines, a plan compares all of them
+        elif changed_input.id == 'output_input':
+            is_brep = input_values['output_input'] == 'BRep Body'
+            is_plan = input_values['output_input'] == 'Plan JSON'
+            inputs.itemById('engine_input').isVisible = is_brep or is_plan
+            inputs.itemById('face_limit_input').isVisible = is_brep
+            inputs.itemById('symmetry_input').isVisible = is_brep or is_plan
+            inputs.itemById('mesh_engine_input').isVisible = input_values['output_input'] == 'STL Mesh'
+            inputs.itemById('tile_size_input').isVisible = ((is_brep or is_plan) and
+                                                            input_values['engine_input'] == 'Tiled')
+
+        elif changed_input.id == 'target_input':
+            target = input_values['target_input']
+            inputs.itemById('target_density_input').isVisible = target == 'Solid %'
+            inputs.itemById('target_mass_input').isVisible = target == 'Mass'
+            inputs.itemById('solve_for_input').isVisible = target != 'None'
+
+        if any(input_values.has_changed(input_id) for input_id in ESTIMATE_INPUTS):
+            inputs.itemById('estimate_input').text = estimate_text(base_feature_def(input_values),
+                                                                   input_values.get('selection_input'))
+
 
 # Class for the Fusion 360 Command
 class FillerUpdateCommand(Fusion360CommandBase):
@@ -393,20 +1028,63 @@ class FillerUpdateCommand(Fusion360CommandBase):
         #     "revisionId": new_body.revisionId
         # }
 
+        promote = input_values['promote_input']
+
         for attribute in attributes:
             feature_def = json.loads(attribute.value)
 
             base_feature = attribute.parent
             new_body = base_feature.bodies.item(0)
 
-            if new_body.revisionId != feature_def["revisionId"]:
-                base_feature.timelineObject.rollTo(False)
-                base_feature.deleteMe()
+            # Drafts are filled again at full quality from the settings they were created with
+            promoted = promote and feature_def.get('draft', False)
+            if promoted:
+                feature_def.pop('draft')
+                feature_def.pop('draft_input_size', None)
+
+            if promoted or new_body.revisionId != feature_def["revisionId"]:
+                # Read before the feature is deleted, drafts being promoted are planned again
+                fill_plan = base_feature.attributes.itemByName(self.app_name, "fill_plan")
+                stored_plan = fill_plan.value if fill_plan is not None and not promoted else None
+
+                timeline_object = base_feature.timelineObject
+                timeline_object.rollTo(False)
+
+                # Parametric fills are a group of features around the cut
+                if (feature_def.get('filled_engine', feature_def.get('engine')) == 'Parametric' and
+                        timeline_object.parentGroup is not None):
+                    timeline_object.parentGroup.deleteMe(True)
+                else:
+                    base_feature.deleteMe()
 
                 attributes = ao.design.findAttributes(self.app_name, "id")
 
+                grade_face = None
+                anchor = feature_def.get("anchor")
                 for attribute in attributes:
                     if attribute.value == feature_def["start_body_id"]:
                         start_body = attribute.parent
+                    elif attribute.value == feature_def.get("grade_face_id"):
+                        grade_face = attribute.parent
 
-                make_fill(feature_def, start_body, self.app_name)
+                    # The lattice follows a moved anchor point, otherwise it keeps the stored position
+                    elif attribute.value == feature_def.get("anchor_point_id"):
+                        feature_def["anchor"] = point_position(attribute.parent)
+
+                # An unchanged start body and anchor get the same cells, so the stored plan is cut again as it is
+                plan = None
+                if (stored_plan is not None and feature_def.get("anchor") == anchor and
+                        start_body.revisionId == feature_def.get("start_revision_id")):
+                    plan = decode_plan(stored_plan)
+
+                # Targets are solved again for the edited body
+                if plan is None and 'target_fraction' in feature_def:
+                    solved_def = solve_body(feature_def, start_body, grade_face)
+                    if solved_def is not None:
+                        feature_def = solved_def
+
+                make_fill(feature_def, start_body, self.app_name, grade_face, plan)
+
+    def on_create(self, command: adsk.core.Command, inputs: adsk.core.CommandInputs):
+        # Promoting refills every draft at full quality, the slow fill drafts are made to avoid
+        inputs.addBoolValueInput('promote_input', 'Promote Draft Fills', True, '', False)
@@ -0,0 +1,317 @@
+import collections
+import json
+import math
+import os
+
+import numpy as np
+
+from .FillerPlan import plan_tiles, parametric_cells, HEIGHT_BANDS
+from .FillerVoxel import mesh_voxel_size
+
+
+# Rough cost of the engines, seconds per boolean plus seconds per face of the body it is applied to,
+# and seconds per voxel for the mesh engines.  fit_cost replaces them with measured values.
+DEFAULT_COST = {
+    "boolean_seconds": .02,
+    "face_seconds": 2e-5,
+    "tool_seconds": .2,
+    "sketch_curve_seconds": .002,
+    "voxel_seconds": 1e-7,
+    "sdf_sample_seconds": 2e-6,
+}
+
+# Cost constant multiplying each work term of engine_cost
+COST_TERMS = {
+    "booleans": "boolean_seconds",
+    "face_ops": "face_seconds",
+    "tools": "tool_seconds",
+    "sketch_curves": "sketch_curve_seconds",
+    "voxels": "voxel_seconds",
+    "sdf_samples": "sdf_sample_seconds",
+}
+
+# Boolean engines automatic selection chooses from
+AUTOMATIC_ENGINES = ("Sequential", "Tiled", "Parametric")
+
+# Work terms of the boolean engines, fit_cost solves for their constants together
+FIT_TERMS = ("booleans", "face_ops", "tools", "sketch_curves")
+
+
+def cell_faces(plan, cell):
+    """
+    Faces a cut adds to the core, the sides of the tool plus its top and bottom
+    """
+    return (plan["motifs"][cell.motif].sides or 2) + 2
+
+
+def _cut_faces(core_faces, added_faces):
+    # Faces touched while cutting cells one after another from a body that grows by each cell's faces,
+    # and the faces of the finished body
+    added_faces = np.asarray(added_faces, dtype=np.int64)
+    before = core_faces + np.cumsum(added_faces) - added_faces
+    return int(before.sum()), core_faces + int(added_faces.sum())
+
+
+def cost_seconds(terms, cost=None):
+    """
+    Seconds of the work terms of engine_cost with a set of cost constants
+    :rtype: float
+    """
+    cost = dict(DEFAULT_COST, **(cost or {}))
+    return sum(cost[COST_TERMS[term]] * count for term, count in terms.items())
+
+
+def engine_cost(plan, feature_def, core_faces, engine, tiles=None, cost=None):
+    """
+    Predicted work of filling a plan with an engine, no geometry is created
+    :param plan: The fill plan
+    :type plan: dict
+    :param feature_def: The filler feature definition
+    :type feature_def: dict
+    :param core_faces: Face count of the uncut core
+    :type core_faces: int
+    :param engine: Sequential, Tiled, Parametric, Voxel or SDF
+    :type engine: str
+    :param tiles: Tiles of a Tiled fill, defaults to plan_tiles
+    :type tiles: list
+    :param cost: Optional cost constants, defaults to DEFAULT_COST
+    :type cost: dict
+    :return: Boolean op count, peak faces of a temporary body, the work terms and estimated seconds
+    :rtype: dict
+    """
+    cells = plan["cells"]
+
+    # Full height tools are built once per motif and level, trimmed tools once per distinct height range
+    tool_count = len(plan["motifs"]) * len(plan["levels"])
+    trimmed = {(cell.motif, cell.level, cell.z_lo, cell.z_hi) for cell in cells
+               if (cell.z_lo, cell.z_hi) != (0, HEIGHT_BANDS)}
+
+    if engine == "Sequential":
+        face_ops, faces = _cut_faces(core_faces, [cell_faces(plan, cell) for cell in cells])
+        result = {
+            "engine": engine,
+            "booleans": len(cells) + len(trimmed),
+            "peak_faces": faces,
+            "terms": {"booleans": len(cells) + len(trimmed), "face_ops": face_ops, "tools": tool_count},
+        }
+
+    elif engine == "Tiled":
+        if tiles is None:
+            tiles = plan_tiles(plan, core_faces, feature_def.get('tile_size'), feature_def.get('tile_face_budget'))
+
+        face_ops = 0
+        peak_cut_faces = 0
+        final_faces = 0
+        for tile in tiles:
+            added = [cell_faces(plan, cells[i]) for i in tile["cells"]]
+            tile_face_ops, tile_faces = _cut_faces(tile["estimated_faces"] - sum(added), added)
+            face_ops += tile_face_ops
+            peak_cut_faces = max(peak_cut_faces, tile_faces)
+            final_faces += tile_faces
+
+        # Balanced merge, every level touches all the faces once
+        merge_levels = math.ceil(math.log2(len(tiles))) if len(tiles) > 1 else 0
+        face_ops += merge_levels * final_faces
+
+        booleans = sum(len(tile["cells"]) for tile in tiles) + len(tiles) * 2 - 1 + len(trimmed)
+        result = {
+            "engine": engine,
+            "booleans": booleans,
+            "tiles": len(tiles),
+            "peak_cut_faces": peak_cut_faces,
+            "peak_faces": final_faces,
+            "terms": {"booleans": booleans, "face_ops": face_ops, "tools": tool_count},
+        }
+
+    elif engine == "Parametric":
+        # One sketch of every outline, mirrored halves are drawn in full, and one extrude cut through all of them
+        outlines = parametric_cells(plan)
+        curves = sum(sides or 1 for _, _, sides, _, _ in outlines)
+        faces = core_faces + sum((sides or 2) + 2 for _, _, sides, _, _ in outlines)
+
+        result = {
+            "engine": engine,
+            "booleans": 1,
+            "sketch_curves": curves,
+            "peak_faces": faces,
+            "terms": {"booleans": 1, "face_ops": faces, "sketch_curves": curves},
+        }
+
+    elif engine in ("Voxel", "SDF"):
+        voxel_size = mesh_voxel_size(plan, feature_def)
+        voxels = math.prod(int(math.ceil(extent / voxel_size)) + 2 for extent in plan["extent"])
+
+        result = {
+            "engine": engine,
+            "booleans": 0,
+            "voxel_size": voxel_size,
+            "voxels": voxels,
+            "peak_faces": 0,
+            "terms": {"voxels" if engine == "Voxel" else "sdf_samples": voxels},
+        }
+
+    else:
+        return None
+
+    result["seconds"] = cost_seconds(result["terms"], cost)
+    return result
+
+
+def choose_engine(plan, feature_def, core_faces, cost=None, engines=None):
+    """
+    Picks the boolean engine with the lowest predicted time for a plan
+    :param plan: The fill plan
+    :type plan: dict
+    :param feature_def: The filler feature definition
+    :type feature_def: dict
+    :param core_faces: Face count of the uncut core
+    :type core_faces: int
+    :param cost: Optional cost constants, usually from fit_cost
+    :type cost: dict
+    :param engines: Optional engines to choose from, defaults to AUTOMATIC_ENGINES
+    :type engines: list
+    :return: The chosen engine's cost, its tiles if Tiled, and the reason it was chosen
+    :rtype: (dict, list, str)
+    """
+    engines = engines or AUTOMATIC_ENGINES
+
+    tiles = None
+    if "Tiled" in engines:
+        tiles = plan_tiles(plan, core_faces, feature_def.get('tile_size'), feature_def.get('tile_face_budget'))
+
+    costs = sorted((engine_cost(plan, feature_def, core_faces, engine, tiles, cost) for engine in engines),
+                   key=lambda engine: engine["seconds"])
+    chosen = costs[0]
+
+    reason = '{} cells on a {} face body, {} about {:.0f} s'.format(len(plan["cells"]), core_faces,
+                                                                    chosen["engine"], chosen["seconds"])
+    for other in costs[1:]:
+        reason += ', {} about {:.0f} s'.format(other["engine"], other["seconds"])
+
+    return chosen, tiles if chosen["engine"] == "Tiled" else None, reason
+
+
+def fit_cost(records, cost=None):
+    """
+    Least squares fit of the boolean cost constants to measured runs
+    The constants are replaced as a set, and only when the runs determine every one of them: at least one
+    run per constant, runs that tell the terms apart and positive fitted values.  Otherwise the given (or
+    default) constants are returned unchanged.  Runs of one engine never tell the terms apart, Parametric
+    always has one boolean and face operations that follow its sketch curves, so a fit needs runs of
+    Parametric and of Sequential or Tiled, as a Benchmark records.
+    :param records: Measured runs, each with the work terms of its engine_cost and its cut seconds
+    :type records: list
+    :param cost: Optional starting cost constants, defaults to DEFAULT_COST
+    :type cost: dict
+    :return: The cost constants
+    :rtype: dict
+    """
+    cost = dict(DEFAULT_COST, **(cost or {}))
+
+    records = [record for record in records if record.get("seconds", 0) > 0 and "terms" in record]
+    if len(records) < len(FIT_TERMS):
+        return cost
+
+    a = np.array([[record["terms"].get(term, 0) for term in FIT_TERMS] for record in records], dtype=np.float64)
+    b = np.array([record["seconds"] for record in records])
+
+    # Relative errors, so long runs do not drown out the short ones
+    weights = 1 / b
+    a *= weights[:, None]
+
+    # Unit columns, so face counts do not dwarf boolean counts in the rank test
+    scale = np.linalg.norm(a, axis=0)
+    if np.any(scale == 0):
+        return cost
+    a /= scale
+
+    if np.linalg.matrix_rank(a) < len(FIT_TERMS):
+        return cost
+
+    solution = np.linalg.lstsq(a, b * weights, rcond=None)[0] / scale
+    if np.any(solution <= 0):
+        return cost
+
+    cost.update({COST_TERMS[term]: float(value) for term, value in zip(FIT_TERMS, solution)})
+    return cost
+
+
+def read_cost_records(file_name):
+    """
+    Measured runs from a JSON lines file, an empty list if there is none yet
+    :rtype: list
+    """
+    if not os.path.exists(file_name):
+        return []
+
+    records = []
+    with open(file_name) as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+
+    return records
+
+
+def append_cost_record(file_name, record):
+    """
+    Adds a measured run to a JSON lines file
+    """
+    with open(file_name, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+
+def dry_run(plan, feature_def, core_faces, tiles=None, engines=("Sequential", "Tiled", "Parametric", "Voxel", "SDF"),
+            cost=None):
+    """
+    Everything known about a fill before it runs: the cell plan, counts per motif and level,
+    and the predicted work of every engine
+    :param plan: The fill plan
+    :type plan: dict
+    :param feature_def: The filler feature definition
+    :type feature_def: dict
+    :param core_faces: Face count of the uncut core
+    :type core_faces: int
+    :return: A JSON serializable report
+    :rtype: dict
+    """
+    cells = plan["cells"]
+    motif_counts = collections.Counter(cell.motif for cell in cells)
+    level_counts = collections.Counter(cell.level for cell in cells)
+
+    if tiles is None and "Tiled" in engines:
+        tiles = plan_tiles(plan, core_faces, feature_def.get('tile_size'), feature_def.get('tile_face_budget'))
+
+    return {
+        "feature_def": feature_def,
+        "origin": list(plan["origin"]),
+        "anchor": list(plan["anchor"]),
+        "mirror": plan.get("mirror"),
+        "mirror_rejected": plan.get("mirror_rejected"),
+        "extent": list(plan["extent"]),
+        "z_base": plan["z_base"],
+        "band_height": plan["band_height"],
+        "motifs": [motif._asdict() for motif in plan["motifs"]],
+        "levels": plan["levels"],
+        "candidate_cells": plan["candidate_count"],
+        "cell_count": len(cells),
+        "cells_per_motif": [motif_counts[index] for index in range(len(plan["motifs"]))],
+        "cells_per_level": [level_counts[index] for index in range(len(plan["levels"]))],
+        "core_faces": core_faces,
+        "engines": [engine_cost(plan, feature_def, core_faces, engine, tiles, cost) for engine in engines],
+        "cells": [list(cell) for cell in cells],
+    }
+
+
+def write_dry_run(file_name, reports):
+    """
+    Writes dry run reports to a JSON file
+    :param file_name: The full path of the JSON file
+    :type file_name: str
+    :param reports: Reports from dry_run
+    :type reports: list
+    """
+    with open(file_name, 'w') as f:
+        json.dump(reports, f)
@@ -0,0 +1,367 @@
+import time
+
+import adsk.core
+import adsk.fusion
+
+from .FillerPlan import band_range, HEIGHT_BANDS
+from .Fusion360Utilities.Fusion360Utilities import process_rss
+
+
+# Default limits on a temporary body during the boolean loop and on the process memory (bytes)
+# A limit of zero is never crossed
+GUARD_FACE_LIMIT = 20000
+GUARD_RSS_LIMIT = 8 * 1024 ** 3
+
+# Booleans between two checks of the limits, counting faces and reading the memory is not free
+GUARD_CHECK_INTERVAL = 25
+
+
+# Class to share motif tool bodies between every fill of a run that uses the same lattice
+# build_tools(plan, origin, level, z_center, height) -> {motif index: temporary body} for one grade level
+class ToolLibrary(object):
+
+    def __init__(self, build_tools, z_center, height):
+        self.build_tools = build_tools
+        self.z_center = z_center
+        self.height = height
+
+        self.tool_sets = {}
+
+    # Motif tools, their origin and trimmed tool cache for the lattice of a plan
+    def tool_set(self, plan):
+        key = (plan['infill_type'], plan['input_size'], tuple(level['gap'] for level in plan['levels']),
+               tuple(motif.sides for motif in plan['motifs']))
+        tool_set = self.tool_sets.get(key)
+
+        if tool_set is None:
+            tool_set = {
+                "origin": plan['origin'][:2],
+                "tools": {},
+                "banded": {},
+            }
+            self.tool_sets[key] = tool_set
+
+        return tool_set
+
+    # Full height motif tool, every motif of a grade level is built on first use
+    def motif_tool(self, tool_set, plan, motif_index, level):
+        if (motif_index, level) not in tool_set['tools']:
+            level_tools = self.build_tools(plan, tool_set['origin'], level, self.z_center, self.height)
+            for built_index, tool in level_tools.items():
+                tool_set['tools'][(built_index, level)] = tool
+
+        return tool_set['tools'][(motif_index, level)]
+
+
+# Class to trim and place the motif tool bodies of a plan
+class CellTools(object):
+
+    def __init__(self, plan, library: ToolLibrary):
+        self.plan = plan
+        self.library = library
+        self.tool_set = library.tool_set(plan)
+        self.tool_origin = self.tool_set['origin']
+
+    # Copy of a motif tool trimmed to the height bands of a cell
+    # Cached per motif, grade level and height range so bodies at the same height share trimmed tools
+    def banded(self, cell):
+        # Full height tools are the fallback for cells without a local height
+        motif_tool = self.library.motif_tool(self.tool_set, self.plan, cell.motif, cell.level)
+        if cell.z_lo == 0 and cell.z_hi == HEIGHT_BANDS:
+            return motif_tool
+
+        z_min, z_max = band_range(self.plan, cell)
+        key = (cell.motif, cell.level, round(z_min, 7), round(z_max, 7))
+        tool = self.tool_set['banded'].get(key)
+
+        if tool is None:
+            tbm = adsk.fusion.TemporaryBRepManager.get()
+            motif = self.plan['motifs'][cell.motif]
+
+            center = adsk.core.Point3D.create(self.tool_origin[0] + motif.dx, self.tool_origin[1] + motif.dy,
+                                              (z_min + z_max) / 2)
+            box = adsk.core.OrientedBoundingBox3D.create(center,
+                                                         adsk.core.Vector3D.create(1, 0, 0),
+                                                         adsk.core.Vector3D.create(0, 1, 0),
+                                                         self.plan['input_size'] * 2, self.plan['input_size'] * 2,
+                                                         z_max - z_min)
+
+            tool = tbm.copy(motif_tool)
+            tbm.booleanOperation(tool, tbm.createBox(box), adsk.fusion.BooleanTypes.IntersectionBooleanType)
+            self.tool_set['banded'][key] = tool
+
+        return tool
+
+    # New temporary body of a cell's tool moved to the cell position
+    def placed(self, cell):
+        tbm = adsk.fusion.TemporaryBRepManager.get()
+        motif = self.plan['motifs'][cell.motif]
+
+        trans_matrix = adsk.core.Matrix3D.create()
+        trans_matrix.translation = adsk.core.Vector3D.create(cell.x - self.tool_origin[0] - motif.dx,
+                                                             cell.y - self.tool_origin[1] - motif.dy, 0)
+
+        trans_tool = tbm.copy(self.banded(cell))
+        tbm.transform(trans_tool, trans_matrix)
+
+        return trans_tool
+
+
+# Class to count finished cuts on a progress dialog
+class FillProgress(object):
+
+    def __init__(self, progress_dialog: adsk.core.ProgressDialog):
+        self.progress_dialog = progress_dialog
+        self.value = 0
+
+    # Returns False once the user has cancelled
+    def step(self):
+        self.value += 1
+        self.progress_dialog.progressValue = self.value
+        return not self.progress_dialog.wasCancelled
+
+    # Work found or dropped while cutting, like cells cut twice on the seams of a split core
+    # or the cells of a tile that misses the body
+    def add_steps(self, count):
+        self.progress_dialog.maximumValue += count
+
+
+# Class to watch the temporary bodies of a fill, the peaks are recorded in the run metrics
+class CutGuard(object):
+
+    def __init__(self, metrics, face_limit=None, rss_limit=None, check_interval=None):
+        self.metrics = metrics
+        self.face_limit = GUARD_FACE_LIMIT if face_limit is None else face_limit
+        self.rss_limit = GUARD_RSS_LIMIT if rss_limit is None else rss_limit
+        self.check_interval = check_interval or GUARD_CHECK_INTERVAL
+        self.count = 0
+
+        metrics.setdefault('peak_faces', 0)
+        metrics.setdefault('peak_edges', 0)
+        metrics.setdefault('guard_splits', 0)
+
+    # Counts a boolean on a body, every few booleans returns True if the body or the process is over a limit
+    def over_limit(self, body: adsk.fusion.BRepBody):
+        self.count += 1
+        if self.count % self.check_interval:
+            return False
+
+        return self.measure(body)
+
+    # Records the size of a body and the process memory, returns True if either is over its limit
+    def measure(self, body: adsk.fusion.BRepBody):
+        faces = body.faces.count
+        self.metrics['peak_faces'] = max(self.metrics['peak_faces'], faces)
+        self.metrics['peak_edges'] = max(self.metrics['peak_edges'], body.edges.count)
+
+        # Memory is only guarded where the current value can be read
+        rss = process_rss()
+        if rss is not None:
+            self.metrics['peak_rss'] = max(self.metrics.get('peak_rss', 0), rss)
+
+        return bool((self.face_limit and faces > self.face_limit) or
+                    (self.rss_limit and rss is not None and rss > self.rss_limit))
+
+
+# Subtracts every cell's tool from the core in plan order
+def sequential_cut(trans_core: adsk.fusion.BRepBody, cell_tools: CellTools, cells, progress: FillProgress):
+    tbm = adsk.fusion.TemporaryBRepManager.get()
+
+    for cell in cells:
+        tbm.booleanOperation(trans_core, cell_tools.placed(cell), adsk.fusion.BooleanTypes.DifferenceBooleanType)
+
+        # If progress dialog is cancelled, stop drawing.
+        if not progress.step():
+            return False
+
+    return True
+
+
+# Subtracts cells from the core, once the guard trips the rest is cut from quarters of the core
+# Returns the cut core, a new body if it was split, or None if cancelled
+def guarded_cut(trans_core: adsk.fusion.BRepBody, cell_tools: CellTools, plan, cells, progress: FillProgress,
+                guard: CutGuard):
+    tbm = adsk.fusion.TemporaryBRepManager.get()
+
+    for index, cell in enumerate(cells):
+        tbm.booleanOperation(trans_core, cell_tools.placed(cell), adsk.fusion.BooleanTypes.DifferenceBooleanType)
+
+        # If progress dialog is cancelled, stop drawing.
+        if not progress.step():
+            return None
+
+        if index + 1 < len(cells) and guard.over_limit(trans_core):
+            return split_cut(trans_core, cell_tools, plan, cells[index + 1:], progress, guard)
+
+    guard.measure(trans_core)
+    return trans_core
+
+
+# Cuts the remaining cells of an oversized core from each quarter of it, then merges the quarters
+# Cells on a seam are cut from both sides, like the cells of neighbouring tiles
+def split_cut(trans_core: adsk.fusion.BRepBody, cell_tools: CellTools, plan, cells, progress: FillProgress,
+              guard: CutGuard):
+    tbm = adsk.fusion.TemporaryBRepManager.get()
+
+    bounding_box = trans_core.boundingBox
+    x_0, y_0, z_0 = bounding_box.minPoint.asArray()
+    x_1, y_1, z_1 = bounding_box.maxPoint.asArray()
+
+    # Quarters narrower than a few cells would not get much smaller, finish without splitting
+    if min(x_1 - x_0, y_1 - y_0) <= plan['input_size'] * 4:
+        if not sequential_cut(trans_core, cell_tools, cells, progress):
+            return None
+        guard.measure(trans_core)
+        return trans_core
+
+    guard.metrics['guard_splits'] += 1
+    reach = max(level['spoke'] for level in plan['levels'])
+    x_mid = (x_0 + x_1) / 2
+    y_mid = (y_0 + y_1) / 2
+
+    quarters = []
+    for x_lo, x_hi in ((x_0, x_mid), (x_mid, x_1)):
+        for y_lo, y_hi in ((y_0, y_mid), (y_mid, y_1)):
+            quarter_cells = [cell for cell in cells if x_lo - reach < cell.x < x_hi + reach and
+                             y_lo - reach < cell.y < y_hi + reach]
+            quarters.append((x_lo, x_hi, y_lo, y_hi, quarter_cells))
+
+    progress.add_steps(sum(len(quarter[4]) for quarter in quarters) - len(cells))
+
+    pieces = []
+    for x_lo, x_hi, y_lo, y_hi, quarter_cells in quarters:
+        piece = tbm.copy(trans_core)
+        tbm.booleanOperation(piece, tile_box(x_lo, x_hi, y_lo, y_hi, (z_0 + z_1) / 2, (z_1 - z_0) * 1.1),
+                             adsk.fusion.BooleanTypes.IntersectionBooleanType)
+
+        # The cells of an empty quarter are not cut, they come off the total
+        if piece.faces.count == 0:
+            progress.add_steps(-len(quarter_cells))
+            continue
+
+        piece = guarded_cut(piece, cell_tools, plan, quarter_cells, progress, guard)
+        if piece is None:
+            return None
+        pieces.append(piece)
+
+    return balanced_union(pieces)
+
+
+# Temporary box body over a rectangle of the footprint
+def tile_box(x_min, x_max, y_min, y_max, z_center, z_length):
+    tbm = adsk.fusion.TemporaryBRepManager.get()
+
+    center = adsk.core.Point3D.create((x_min + x_max) / 2, (y_min + y_max) / 2, z_center)
+    box = adsk.core.OrientedBoundingBox3D.create(center,
+                                                 adsk.core.Vector3D.create(1, 0, 0),
+                                                 adsk.core.Vector3D.create(0, 1, 0),
+                                                 x_max - x_min, y_max - y_min, z_length)
+
+    return tbm.createBox(box)
+
+
+# Lower half of the core below the mirror plane of a symmetric plan
+def mirror_half(trans_core: adsk.fusion.BRepBody, mirror):
+    tbm = adsk.fusion.TemporaryBRepManager.get()
+
+    bounding_box = trans_core.boundingBox
+    low = list(bounding_box.minPoint.asArray())
+    high = list(bounding_box.maxPoint.asArray())
+
+    pad = max(high[i] - low[i] for i in range(3)) * .05
+    low = [value - pad for value in low]
+    high = [value + pad for value in high]
+    high[mirror['axis']] = mirror['plane']
+
+    half = tbm.copy(trans_core)
+    tbm.booleanOperation(half, tile_box(low[0], high[0], low[1], high[1], (low[2] + high[2]) / 2, high[2] - low[2]),
+                         adsk.fusion.BooleanTypes.IntersectionBooleanType)
+
+    return half
+
+
+# Joins the cut half of a symmetric core with its mirror image
+def mirror_union(trans_core: adsk.fusion.BRepBody, mirror):
+    tbm = adsk.fusion.TemporaryBRepManager.get()
+
+    reflection = adsk.core.Matrix3D.create()
+    reflection.setCell(mirror['axis'], mirror['axis'], -1)
+    reflection.setCell(mirror['axis'], 3, 2 * mirror['plane'])
+
+    mirrored = tbm.copy(trans_core)
+    tbm.transform(mirrored, reflection)
+    tbm.booleanOperation(trans_core, mirrored, adsk.fusion.BooleanTypes.UnionBooleanType)
+
+    return trans_core
+
+
+# Unions bodies pairwise so every body takes part in about log2(n) unions
+def balanced_union(bodies):
+    tbm = adsk.fusion.TemporaryBRepManager.get()
+
+    while len(bodies) > 1:
+        merged = []
+        for i in range(0, len(bodies) - 1, 2):
+            tbm.booleanOperation(bodies[i], bodies[i + 1], adsk.fusion.BooleanTypes.UnionBooleanType)
+            merged.append(bodies[i])
+        if len(bodies) % 2:
+            merged.append(bodies[-1])
+        bodies = merged
+
+    return bodies[0] if bodies else None
+
+
+# Cuts each tile's slice of the core on its own, then merges the finished slices
+# tiles -> from FillerPlan.plan_tiles
+# Tiles that still grow past the guard's limits are split further
+# Returns the merged core or None if cancelled
+def tiled_cut(trans_core: adsk.fusion.BRepBody, cell_tools: CellTools, plan, tiles, progress: FillProgress, metrics,
+              guard: CutGuard = None):
+    tbm = adsk.fusion.TemporaryBRepManager.get()
+    guard = guard or CutGuard(metrics)
+
+    bounding_box = trans_core.boundingBox
+    z_center = (bounding_box.minPoint.z + bounding_box.maxPoint.z) / 2
+    z_length = (bounding_box.maxPoint.z - bounding_box.minPoint.z) * 1.1
+
+    metrics['tiles'] = []
+
+    pieces = []
+    for tile in tiles:
+        start = time.perf_counter()
+
+        piece = tbm.copy(trans_core)
+        tbm.booleanOperation(piece, tile_box(tile['x_min'], tile['x_max'], tile['y_min'], tile['y_max'],
+                                             z_center, z_length),
+                             adsk.fusion.BooleanTypes.IntersectionBooleanType)
+
+        # Tile corners can miss the body entirely, their cells come off the total
+        if piece.faces.count == 0:
+            progress.add_steps(-len(tile['cells']))
+            continue
+
+        piece = guarded_cut(piece, cell_tools, plan, [plan['cells'][i] for i in tile['cells']], progress, guard)
+        if piece is None:
+            return None
+
+        pieces.append(piece)
+        metrics['tiles'].append({
+            "x_min": tile['x_min'],
+            "x_max": tile['x_max'],
+            "y_min": tile['y_min'],
+            "y_max": tile['y_max'],
+            "cells": len(tile['cells']),
+            "estimated_faces": tile['estimated_faces'],
+            "faces": piece.faces.count,
+            "seconds": time.perf_counter() - start,
+        })
+
+    # The tiles cover the core, without any pieces it had nothing to cut
+    if not pieces:
+        return trans_core
+
+    start = time.perf_counter()
+    merged = balanced_union(pieces)
+    metrics['merge_seconds'] = time.perf_counter() - start
+
+    return merged
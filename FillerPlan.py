@@ -0,0 +1,987 @@
+import base64
+import collections
+import json
+import math
+import zlib
+
+import numpy as np
+
+from .Fusion360Utilities.Fusion360MeshBVH import MeshBVH
+
+# Number of equal height bands a cutting tool can be trimmed to
+HEIGHT_BANDS = 8
+
+# Default number of distinct rib thicknesses in a graded fill
+GRADE_LEVELS = 4
+
+# Default upper limit for the faces expected on one tile's slice of the core
+TILE_FACE_BUDGET = 2000
+
+# Default cell count of a draft fill, the cell size is coarsened until the plan fits
+DRAFT_CELL_LIMIT = 1500
+
+# Sides of the polygons that stand in for the circles of a draft fill
+DRAFT_CIRCLE_SIDES = 8
+
+# Mirror planes of a symmetric fill, by the axis they cross
+MIRROR_AXES = {"YZ": 0, "XZ": 1}
+
+# Version of the encoded plan, bumped whenever the layout of the header or the cell records changes
+PLAN_FORMAT_VERSION = 2
+
+# Bits of the motif, height bands and level packed into the code of an encoded cell
+# The code stays below 2 ** 24 so it is exact as a float32
+_CODE_BITS = (4, 4, 4, 8)
+
+# A cutting tool shape, offset from the lattice origin
+Motif = collections.namedtuple("Motif", ["dx", "dy", "sides", "offset"])
+
+# A single placed tool.  z_lo and z_hi are the height bands the tool spans, level is its grade level
+Cell = collections.namedtuple("Cell", ["motif", "x", "y", "z_lo", "z_hi", "level"])
+
+
+def lattice_def(infill_type, input_size, input_rib_thickness):
+    """
+    Defines the repeating tool pattern for an infill type
+    :param infill_type: One of Hex, Square, Triangle or Circle
+    :type infill_type: str
+    :param input_size: The cell size (circumscribed circle diameter)
+    :type input_size: float
+    :param input_rib_thickness: The rib thickness between cells
+    :type input_rib_thickness: float
+    :return: The lattice parameters or None if the type is unknown
+    :rtype: dict
+    """
+    x_qty_scale = 1
+
+    # Hex specific
+    if infill_type == "Hex":
+        gap = input_rib_thickness / math.sqrt(3)
+        x_space = math.sqrt(3) * input_size / 4
+        y_space = 3 * input_size / 4
+        motifs = [Motif(0, 0, 6, 30), Motif(x_space, y_space, 6, 30)]
+        d1_space = x_space * 2
+
+    # Square specific
+    elif infill_type == "Square":
+        gap = input_rib_thickness * math.sqrt(2) / 2
+        x_space = input_size / 2
+        y_space = input_size / 2
+        motifs = [Motif(0, 0, 4, 0), Motif(x_space, y_space, 4, 0)]
+        d1_space = x_space * 2
+
+    # Triangle specific
+    elif infill_type == "Triangle":
+        gap = input_rib_thickness
+        x_space = input_size / 4
+        y_space = math.sqrt(3) * input_size / 4
+        motifs = [Motif(0, 0, 3, 0), Motif(x_space, y_space, 3, 60),
+                  Motif(input_size, 0, 3, 60), Motif(3 * x_space, y_space, 3, 0)]
+        d1_space = 3 * input_size / 2
+        x_qty_scale = .5
+
+    # Circle specific, zero sides
+    elif infill_type == "Circle":
+        gap = input_rib_thickness / 2
+        x_space = input_size / 2
+        y_space = math.sqrt(3) * input_size / 2
+        motifs = [Motif(0, 0, 0, 0), Motif(x_space, y_space, 0, 0)]
+        d1_space = x_space * 2
+
+    else:
+        return None
+
+    return {
+        "infill_type": infill_type,
+        "input_size": input_size,
+        "gap": gap,
+        "spoke": (input_size / 2) - gap,
+        "x_space": x_space,
+        "y_space": y_space,
+        "d1_space": d1_space,
+        "d2_space": y_space * 2,
+        "x_qty_scale": x_qty_scale,
+        "motifs": motifs,
+    }
+
+
+def grid_offsets(lattice, extent_x, extent_y):
+    """
+    Translations of the tool pattern needed to cover an extent centered on the lattice origin
+    :return: x offsets and y offsets
+    :rtype: (list, list)
+    """
+    x_qty = (math.ceil(extent_x / (lattice["x_space"] * 2)) + 4) * lattice["x_qty_scale"]
+    y_qty = math.ceil(extent_y / lattice["d2_space"]) + 4
+
+    x_offsets = [x_int * lattice["d1_space"] - x_qty * lattice["d1_space"] for x_int in range(int(x_qty) * 2)]
+    y_offsets = [y_int * lattice["d2_space"] - y_qty * lattice["d2_space"] for y_int in range(int(y_qty) * 2)]
+
+    return x_offsets, y_offsets
+
+
+def lattice_anchor(lattice, center, anchor=None):
+    """
+    Origin of the tool pattern, the lattice point nearest the center of the body.  With an anchor the lattice
+    passes through that design space point, so edits that move the bounding box do not shift any cell.
+    :param lattice: The lattice parameters
+    :type lattice: dict
+    :param center: Center of the body bounding box (x, y, z)
+    :param anchor: Optional fixed point the lattice passes through (x, y, ...)
+    :return: The lattice origin (x, y)
+    :rtype: list
+    """
+    if anchor is None:
+        return [center[0], center[1]]
+
+    # Whole pattern repeats keep the anchor on the lattice
+    return [anchor[0] + round((center[0] - anchor[0]) / lattice["d1_space"]) * lattice["d1_space"],
+            anchor[1] + round((center[1] - anchor[1]) / lattice["d2_space"]) * lattice["d2_space"]]
+
+
+def mirror_offset(lattice, axis):
+    """
+    Position of a mirror plane of the lattice along x (axis 0) or y (axis 1), relative to the lattice origin.
+    Mirroring across the plane maps every tool onto a tool of the same shape, so a fill of one half of a
+    symmetric body can be mirrored into the other half.
+    :param lattice: The lattice parameters
+    :type lattice: dict
+    :param axis: 0 for a plane parallel to YZ, 1 for a plane parallel to XZ
+    :type axis: int
+    :return: The offset or None if no plane across that axis mirrors the lattice
+    :rtype: float
+    """
+    pitches = (lattice["d1_space"], lattice["d2_space"])
+    pitch = pitches[axis]
+    other_pitch = pitches[1 - axis]
+    half_step = (lattice["x_space"], lattice["y_space"])[axis] / 2
+
+    def on_lattice(value, period):
+        remainder = value % period
+        return min(remainder, period - remainder) < 1e-9 * period
+
+    # Tool corners sit at (360 / sides) * i - offset degrees, the same shape has the same corner angle
+    # modulo the angle between its corners
+    def same_corners(sides, angle, other_angle):
+        return sides == 0 or on_lattice(angle - other_angle, 360 / sides)
+
+    motif_positions = [((motif.dx, motif.dy)[axis], (motif.dx, motif.dy)[1 - axis]) for motif in lattice["motifs"]]
+
+    for step in range(int(round(pitch / half_step))):
+        offset = step * half_step
+
+        mirrored = True
+        for motif, (along, across) in zip(lattice["motifs"], motif_positions):
+            # Mirroring across x turns a corner angle to 180 - angle, mirroring across y to -angle
+            mirror_angle = 180 + motif.offset if axis == 0 else motif.offset
+
+            if not any(other.sides == motif.sides and same_corners(motif.sides, mirror_angle, -other.offset) and
+                       on_lattice(2 * offset - along - other_along, pitch) and
+                       on_lattice(across - other_across, other_pitch)
+                       for other, (other_along, other_across) in zip(lattice["motifs"], motif_positions)):
+                mirrored = False
+                break
+
+        if mirrored:
+            return offset
+
+    return None
+
+
+def mirror_symmetric(mesh, axis, tolerance):
+    """
+    Checks a body for mirror symmetry across the middle of its bounding box, by mirroring the mesh vertices and
+    triangle centers and measuring their distance to the mesh
+    :param mesh: Vertices and triangles of the body
+    :type mesh: (numpy.ndarray, numpy.ndarray)
+    :param axis: 0 for a plane parallel to YZ, 1 for a plane parallel to XZ
+    :type axis: int
+    :param tolerance: Largest distance of a mirrored sample from the body
+    :type tolerance: float
+    :rtype: bool
+    """
+    vertices, triangles = mesh
+    plane = (vertices[:, axis].min() + vertices[:, axis].max()) / 2
+
+    samples = np.concatenate([vertices, vertices[triangles].mean(axis=1)])
+    samples[:, axis] = 2 * plane - samples[:, axis]
+
+    return bool(MeshBVH(vertices, triangles).distance(samples).max() <= tolerance)
+
+
+def lattice_solid_fraction(infill_type, input_size, input_rib_thickness):
+    """
+    Share of a slab that is left standing by an endless lattice, from the tool area per repeat of the pattern
+    :return: The solid fraction (0 to 1) or None if the type is unknown
+    :rtype: float
+    """
+    lattice = lattice_def(infill_type, input_size, input_rib_thickness)
+    if lattice is None:
+        return None
+
+    spoke = max(lattice["spoke"], 0)
+    sides = lattice["motifs"][0].sides
+    if sides == 0:
+        tool_area = math.pi * spoke ** 2
+    else:
+        tool_area = sides / 2 * spoke ** 2 * math.sin(2 * math.pi / sides)
+
+    void = len(lattice["motifs"]) * tool_area / (lattice["d1_space"] * lattice["d2_space"])
+
+    return 1 - min(void, 1)
+
+
+def height_map(vertices, triangles, bin_size):
+    """
+    Projects a triangle mesh onto the XY plane and records the Z range of the triangles over each bin.
+    Ranges are conservative, every triangle counts over its whole XY bounding box clipped to its plane.
+    :param vertices: Vertex coordinates (n x 3)
+    :type vertices: numpy.ndarray
+    :param triangles: Triangle vertex indices (m x 3)
+    :type triangles: numpy.ndarray
+    :param bin_size: Edge length of the square bins
+    :type bin_size: float
+    :return: The height map
+    :rtype: dict
+    """
+    corners = vertices[triangles]
+    tri_min = corners.min(axis=1)
+    tri_max = corners.max(axis=1)
+
+    x0, y0 = vertices[:, 0].min(), vertices[:, 1].min()
+    nx = int((vertices[:, 0].max() - x0) // bin_size) + 1
+    ny = int((vertices[:, 1].max() - y0) // bin_size) + 1
+
+    i0 = ((tri_min[:, 0] - x0) // bin_size).astype(np.int64)
+    i1 = ((tri_max[:, 0] - x0) // bin_size).astype(np.int64)
+    j0 = ((tri_min[:, 1] - y0) // bin_size).astype(np.int64)
+    j1 = ((tri_max[:, 1] - y0) // bin_size).astype(np.int64)
+
+    # Expand every triangle into the bins its bounding box covers
+    widths = i1 - i0 + 1
+    counts = widths * (j1 - j0 + 1)
+    owner = np.repeat(np.arange(len(triangles)), counts)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    bin_i = i0[owner] + local % widths[owner]
+    bin_j = j0[owner] + local // widths[owner]
+    flat = bin_i * ny + bin_j
+
+    # Clip each triangle's Z range to its plane over the bin, vertical triangles keep their full range
+    normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    sloped = np.abs(normals[:, 2]) > 1e-9 * np.linalg.norm(normals, axis=1)
+    n_z = np.where(sloped, normals[:, 2], 1.0)
+    slope_x = np.where(sloped, -normals[:, 0] / n_z, 0.0)
+    slope_y = np.where(sloped, -normals[:, 1] / n_z, 0.0)
+
+    center_x = x0 + (bin_i + .5) * bin_size - corners[owner, 0, 0]
+    center_y = y0 + (bin_j + .5) * bin_size - corners[owner, 0, 1]
+    plane_z = corners[owner, 0, 2] + slope_x[owner] * center_x + slope_y[owner] * center_y
+    half_span = (np.abs(slope_x[owner]) + np.abs(slope_y[owner])) * bin_size / 2
+
+    pair_min = np.where(sloped[owner], np.maximum(tri_min[owner, 2], plane_z - half_span), tri_min[owner, 2])
+    pair_max = np.where(sloped[owner], np.minimum(tri_max[owner, 2], plane_z + half_span), tri_max[owner, 2])
+
+    z_min = np.full(nx * ny, np.inf)
+    z_max = np.full(nx * ny, -np.inf)
+    np.minimum.at(z_min, flat, pair_min)
+    np.maximum.at(z_max, flat, pair_max)
+
+    return {
+        "x0": x0,
+        "y0": y0,
+        "bin_size": bin_size,
+        "z_min": z_min.reshape(nx, ny),
+        "z_max": z_max.reshape(nx, ny),
+    }
+
+
+def _footprint_bins(x0, y0, bin_size, shape, xs, ys, radius):
+    """
+    Bin index ranges covered by square footprints, clipped to the grid
+    :return: i0, i1, j0, j1 and a mask of footprints that overlap the grid
+    """
+    nx, ny = shape
+
+    i0 = np.floor((xs - radius - x0) / bin_size).astype(np.int64)
+    i1 = np.floor((xs + radius - x0) / bin_size).astype(np.int64)
+    j0 = np.floor((ys - radius - y0) / bin_size).astype(np.int64)
+    j1 = np.floor((ys + radius - y0) / bin_size).astype(np.int64)
+
+    inside = (i1 >= 0) & (i0 < nx) & (j1 >= 0) & (j0 < ny)
+
+    return (np.clip(i0, 0, nx - 1), np.clip(i1, 0, nx - 1),
+            np.clip(j0, 0, ny - 1), np.clip(j1, 0, ny - 1), inside)
+
+
+def cells_z_range(h_map, xs, ys, radius):
+    """
+    Z range of the material under square footprints
+    :return: z_min and z_max per footprint, z_min > z_max where no material lies under the footprint
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    grid_min = h_map["z_min"]
+    grid_max = h_map["z_max"]
+    i0, i1, j0, j1, inside = _footprint_bins(h_map["x0"], h_map["y0"], h_map["bin_size"], grid_min.shape,
+                                             xs, ys, radius)
+
+    z_min = np.full(len(xs), np.inf)
+    z_max = np.full(len(xs), -np.inf)
+
+    if len(xs) == 0:
+        return z_min, z_max
+
+    # Footprints only span a few bins, so walk the span offsets rather than the cells
+    for di in range(int((i1 - i0).max()) + 1):
+        for dj in range(int((j1 - j0).max()) + 1):
+            i = np.minimum(i0 + di, i1)
+            j = np.minimum(j0 + dj, j1)
+            z_min = np.minimum(z_min, grid_min[i, j])
+            z_max = np.maximum(z_max, grid_max[i, j])
+
+    z_min[~inside] = np.inf
+    z_max[~inside] = -np.inf
+
+    return z_min, z_max
+
+
+def triangle_spans(corners, x0, y0, pixel_size):
+    """
+    Scanline spans of triangles projected onto the XY plane.  A span lists the pixel columns of one pixel
+    row whose centers lie inside a triangle, pixel (i, j) has its center at x0 + (i + .5) * pixel_size,
+    y0 + (j + .5) * pixel_size.
+    :param corners: XY corners of the triangles (m x 3 x 2)
+    :type corners: numpy.ndarray
+    :return: Triangle index, row, first column and last column of every span
+    :rtype: (numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray)
+    """
+    # Expand every triangle into the pixel rows whose centers it spans
+    row_0 = np.ceil((corners[:, :, 1].min(axis=1) - y0) / pixel_size - .5).astype(np.int64)
+    row_1 = np.floor((corners[:, :, 1].max(axis=1) - y0) / pixel_size - .5).astype(np.int64)
+    counts = np.maximum(row_1 - row_0 + 1, 0)
+    owner = np.repeat(np.arange(len(corners)), counts)
+    row = row_0[owner] + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    scan_y = y0 + (row + .5) * pixel_size
+
+    # Span of each scanline inside its triangle
+    x_left = np.full(len(row), np.inf)
+    x_right = np.full(len(row), -np.inf)
+    for k in range(3):
+        a = corners[owner, k]
+        b = corners[owner, (k + 1) % 3]
+        rise = b[:, 1] - a[:, 1]
+        crosses = (scan_y >= np.minimum(a[:, 1], b[:, 1])) & (scan_y <= np.maximum(a[:, 1], b[:, 1])) & (rise != 0)
+        t = (scan_y - a[:, 1]) / np.where(rise != 0, rise, 1.0)
+        x = a[:, 0] + t * (b[:, 0] - a[:, 0])
+        x_left = np.where(crosses, np.minimum(x_left, x), x_left)
+        x_right = np.where(crosses, np.maximum(x_right, x), x_right)
+
+    valid = x_left <= x_right
+    col_0 = np.ceil((x_left[valid] - x0) / pixel_size - .5).astype(np.int64)
+    col_1 = np.floor((x_right[valid] - x0) / pixel_size - .5).astype(np.int64)
+    owner = owner[valid]
+    row = row[valid]
+    spans = col_1 >= col_0
+
+    return owner[spans], row[spans], col_0[spans], col_1[spans]
+
+
+def footprint_raster(vertices, triangles, pixel_size):
+    """
+    Scanline rasterizes a triangle mesh projected onto the XY plane into a coverage bitmap.
+    Pixels are covered when their center is inside a triangle or they hold a vertex, the bitmap is then
+    grown by one pixel so thin regions are never lost.
+    :param vertices: Vertex coordinates (n x 3)
+    :type vertices: numpy.ndarray
+    :param triangles: Triangle vertex indices (m x 3)
+    :type triangles: numpy.ndarray
+    :param pixel_size: Edge length of the square pixels
+    :type pixel_size: float
+    :return: The raster
+    :rtype: dict
+    """
+    corners = vertices[triangles][:, :, :2]
+
+    # One pixel border for the dilation
+    x0 = vertices[:, 0].min() - pixel_size
+    y0 = vertices[:, 1].min() - pixel_size
+    nx = int((vertices[:, 0].max() - x0) // pixel_size) + 2
+    ny = int((vertices[:, 1].max() - y0) // pixel_size) + 2
+
+    owner, row, col_0, col_1 = triangle_spans(corners, x0, y0, pixel_size)
+
+    # Difference array along each row, a running sum marks the covered spans
+    edges = np.zeros((nx + 1, ny), dtype=np.int32)
+    np.add.at(edges, (col_0, row), 1)
+    np.add.at(edges, (col_1 + 1, row), -1)
+    coverage = np.cumsum(edges, axis=0)[:nx] > 0
+
+    coverage[((vertices[:, 0] - x0) // pixel_size).astype(np.int64),
+             ((vertices[:, 1] - y0) // pixel_size).astype(np.int64)] = True
+
+    grown = np.pad(coverage, 1)
+    coverage = np.zeros_like(coverage)
+    for di in range(3):
+        for dj in range(3):
+            coverage |= grown[di:di + nx, dj:dj + ny]
+
+    return {
+        "x0": x0,
+        "y0": y0,
+        "pixel_size": pixel_size,
+        "coverage": coverage,
+    }
+
+
+def raster_hits(raster, xs, ys, radius):
+    """
+    Tests square footprints against a coverage raster with a summed area table
+    :return: True for every footprint that touches a covered pixel
+    :rtype: numpy.ndarray
+    """
+    coverage = raster["coverage"]
+    i0, i1, j0, j1, inside = _footprint_bins(raster["x0"], raster["y0"], raster["pixel_size"], coverage.shape,
+                                             xs, ys, radius)
+
+    table = np.zeros((coverage.shape[0] + 1, coverage.shape[1] + 1), dtype=np.int64)
+    table[1:, 1:] = coverage.cumsum(axis=0).cumsum(axis=1)
+
+    covered = table[i1 + 1, j1 + 1] - table[i0, j1 + 1] - table[i1 + 1, j0] + table[i0, j0]
+
+    return inside & (covered > 0)
+
+
+def grade_ribs(feature_def):
+    """
+    Rib thickness of each grade level.  The first level applies at the grading surface and the last
+    at grade_distance and beyond, a fill without grading has a single level.
+    :param feature_def: The filler feature definition
+    :type feature_def: dict
+    :rtype: list
+    """
+    core_rib = feature_def['input_rib_thickness']
+
+    if not feature_def.get('grade_distance'):
+        return [core_rib]
+
+    near_rib = feature_def['grade_rib_thickness']
+    level_count = max(feature_def.get('grade_levels', GRADE_LEVELS), 2)
+
+    return [near_rib + (core_rib - near_rib) * level / (level_count - 1) for level in range(level_count)]
+
+
+def band_range(plan, cell):
+    """
+    Z values of the bottom and top of a cell's tool
+    """
+    return (plan["z_base"] + cell.z_lo * plan["band_height"],
+            plan["z_base"] + cell.z_hi * plan["band_height"])
+
+
+def estimate_fill(feature_def, volume, area, plan=None):
+    """
+    Analytic infill estimate, no geometry is needed.  The shell is approximated as area times thickness and
+    the core takes the solid fraction of the lattice.  Graded fills weight each level by its share of the
+    tool height in the plan, or without a plan by the depth below the surface each level covers,
+    the shell takes the place of the levels nearest the surface.
+    :param feature_def: The filler feature definition
+    :type feature_def: dict
+    :param volume: Volume of the unfilled body
+    :type volume: float
+    :param area: Surface area of the unfilled body
+    :type area: float
+    :param plan: Optional fill plan
+    :type plan: dict
+    :return: The solid fraction and the volume after the fill or None if the infill type is unknown
+    :rtype: dict
+    """
+    ribs = grade_ribs(feature_def)
+    fractions = [lattice_solid_fraction(feature_def['infill_type'], feature_def['input_size'], rib) for rib in ribs]
+    if fractions[0] is None or volume <= 0:
+        return None
+
+    shell_volume = 0.0
+    if feature_def['body_type'] == "Create Shell":
+        shell_volume = min(area * feature_def['input_shell_thickness'], volume)
+
+    if plan is not None and plan["cells"]:
+        # Cells count by the height of their tools
+        spans = np.bincount([cell.level for cell in plan["cells"]],
+                            [cell.z_hi - cell.z_lo for cell in plan["cells"]], minlength=len(ribs))
+        weights = spans / spans.sum()
+    elif len(ribs) > 1:
+        # Levels switch half way between their grading distances
+        steps = len(ribs) - 1
+        depths = [feature_def['grade_distance'] * (level + .5) / steps for level in range(steps)]
+        reached = [min(area * depth, volume) for depth in [0] + depths] + [volume]
+        weights = np.diff(reached) / volume
+    else:
+        weights = np.ones(1)
+
+    # Levels are ordered from the surface inwards, so the shell replaces the outermost ones
+    level_volumes = weights * volume
+    covered = np.minimum(np.cumsum(level_volumes), shell_volume)
+    level_volumes -= np.diff(covered, prepend=0)
+
+    solid_volume = shell_volume + float(np.dot(level_volumes, fractions))
+
+    return {
+        "solid_fraction": solid_volume / volume,
+        "volume": solid_volume,
+        "shell_volume": shell_volume,
+    }
+
+
+def solve_fill(feature_def, volume, area, target_fraction, parameter='input_rib_thickness', plan_for=None,
+               passes=3):
+    """
+    Picks the rib thickness or the cell size that makes the estimated solid fraction meet a target.
+    The estimate grows with the rib thickness and shrinks with the cell size, so the value is bisected.
+    Graded fills re-plan at each pass so the level weights follow the culled cells of the solved lattice.
+    :param feature_def: The filler feature definition
+    :type feature_def: dict
+    :param volume: Volume of the unfilled body
+    :type volume: float
+    :param area: Surface area of the unfilled body
+    :type area: float
+    :param target_fraction: The wanted solid fraction (0 to 1)
+    :type target_fraction: float
+    :param parameter: input_rib_thickness or input_size
+    :type parameter: str
+    :param plan_for: Optional function returning the fill plan of a feature definition
+    :type plan_for: function
+    :param passes: Number of plan and solve passes when plan_for is given
+    :type passes: int
+    :return: Copy of the feature definition with the solved value or None if the target cannot be met
+    :rtype: dict
+    """
+    trial = dict(feature_def)
+
+    def fraction(value, plan):
+        trial[parameter] = value
+        estimate = estimate_fill(trial, volume, area, plan)
+        return None if estimate is None else estimate['solid_fraction']
+
+    if parameter == 'input_rib_thickness':
+        # No lattice is left once the rib reaches the cell size
+        low, high = 0.0, feature_def['input_size']
+        rising = True
+    else:
+        # Cells vanish when they are no larger than the rib, larger cells approach the lattice minimum
+        low, high = feature_def['input_rib_thickness'], feature_def['input_size']
+        while high < low * 1e4:
+            high_fraction = fraction(high, None)
+            if high_fraction is None or high_fraction <= target_fraction:
+                break
+            high *= 2
+        rising = False
+
+    plan = None
+    for _ in range(passes if plan_for is not None else 1):
+        low_fraction, high_fraction = fraction(low, plan), fraction(high, plan)
+        if low_fraction is None or not min(low_fraction, high_fraction) <= target_fraction <= max(low_fraction,
+                                                                                                   high_fraction):
+            return None
+
+        solve_low, solve_high = low, high
+        for _ in range(50):
+            middle = (solve_low + solve_high) / 2
+            if (fraction(middle, plan) < target_fraction) == rising:
+                solve_low = middle
+            else:
+                solve_high = middle
+
+        trial[parameter] = (solve_low + solve_high) / 2
+        if plan_for is not None:
+            plan = plan_for(dict(trial))
+
+    return trial
+
+
+def draft_plan(feature_def, plan_for, cell_limit=None, passes=4):
+    """
+    Plans a draft fill, the cell size is coarsened until the cell count fits the limit.
+    The cell count falls with the square of the size, so each pass scales the size by the root of the excess.
+    :param feature_def: The filler feature definition
+    :type feature_def: dict
+    :param plan_for: Function returning the fill plan of a feature definition
+    :type plan_for: function
+    :param cell_limit: Optional cell limit, defaults to DRAFT_CELL_LIMIT
+    :type cell_limit: int
+    :param passes: Number of coarsening passes
+    :type passes: int
+    :return: The fill plan, its input_size is the coarsened size
+    :rtype: dict
+    """
+    cell_limit = cell_limit or DRAFT_CELL_LIMIT
+
+    trial = dict(feature_def)
+    plan = plan_for(dict(trial))
+    for _ in range(passes):
+        if plan is None or len(plan["cells"]) <= cell_limit:
+            break
+
+        trial['input_size'] *= math.sqrt(len(plan["cells"]) / cell_limit) * 1.05
+        plan = plan_for(dict(trial))
+
+    return plan
+
+
+def plan_fill(feature_def, min_point, max_point, mesh=None, grade_bvh=None):
+    """
+    Places every tool of the fill.  When a mesh of the body is given, cells whose footprint misses the
+    body are dropped and each tool is trimmed to the height bands covering the local material,
+    otherwise every candidate cell is kept at full height.
+    Graded fills pick each cell's rib thickness from its distance to the grading surface, cells are
+    grouped by grade level.  The lattice passes through feature_def['anchor'] when it is set,
+    otherwise through the center of the bounding box.  With feature_def['symmetry'] set to YZ or XZ (or Detect)
+    and a mesh that is symmetric across that plane, only the cells of the lower half are planned, plan['mirror']
+    holds the plane the cut half is mirrored across.  A YZ or XZ plane the mesh does not match is filled in
+    full, plan['mirror_rejected'] names it.
+    :param feature_def: The filler feature definition
+    :type feature_def: dict
+    :param min_point: Minimum point of the body bounding box (x, y, z)
+    :param max_point: Maximum point of the body bounding box (x, y, z)
+    :param mesh: Optional vertices and triangles of the body
+    :type mesh: (numpy.ndarray, numpy.ndarray)
+    :param grade_bvh: Optional grading surface, defaults to the outer surface of the mesh
+    :type grade_bvh: MeshBVH
+    :return: The fill plan or None if the infill type is unknown
+    :rtype: dict
+    """
+    plan = lattice_def(feature_def['infill_type'], feature_def['input_size'], feature_def['input_rib_thickness'])
+    if plan is None:
+        return None
+
+    # Drafts cut polygons instead of circles, they have far fewer faces
+    if feature_def.get('draft'):
+        plan["motifs"] = [motif._replace(sides=DRAFT_CIRCLE_SIDES) if motif.sides == 0 else motif
+                          for motif in plan["motifs"]]
+
+    levels = []
+    for rib in grade_ribs(feature_def):
+        level_lattice = lattice_def(feature_def['infill_type'], feature_def['input_size'], rib)
+        levels.append({"rib": rib, "gap": level_lattice["gap"], "spoke": level_lattice["spoke"]})
+
+    # Culling has to hold for the largest tool of any level
+    reach = max(level["spoke"] for level in levels)
+
+    extent = [max_point[i] - min_point[i] for i in range(3)]
+    origin = [min_point[i] + extent[i] / 2 for i in range(3)]
+
+    # Symmetric fills plan the lower half, with a mirror plane of the lattice on the middle of the body
+    # The body must match its mirror image to within a quarter of the thinnest rib, Detect tries both planes.
+    # A chosen plane the body or the lattice does not match is filled in full and kept as mirror_rejected
+    symmetry = feature_def.get('symmetry')
+    rejected = None
+    if symmetry == "Detect":
+        symmetry = None
+        if mesh is not None:
+            tolerance = min(level["rib"] for level in levels) / 4
+            symmetry = next((name for name, axis in MIRROR_AXES.items() if mirror_symmetric(mesh, axis, tolerance)),
+                            None)
+
+    elif symmetry in MIRROR_AXES and mesh is not None:
+        tolerance = min(level["rib"] for level in levels) / 4
+        if not mirror_symmetric(mesh, MIRROR_AXES[symmetry], tolerance):
+            symmetry, rejected = None, symmetry
+
+    mirror = None
+    anchor_point = feature_def.get('anchor')
+    if symmetry in MIRROR_AXES:
+        axis = MIRROR_AXES[symmetry]
+        offset = mirror_offset(plan, axis)
+        if offset is not None:
+            anchor_point = list(anchor_point or origin)
+            anchor_point[axis] = origin[axis] - offset
+            mirror = {"symmetry": symmetry, "axis": axis, "plane": origin[axis]}
+        else:
+            rejected = symmetry
+
+    anchor = lattice_anchor(plan, origin, anchor_point)
+
+    # Full height tools are 10% taller than the body, trimmed tools keep the same margin
+    height = extent[2] * 1.1
+    margin = extent[2] * .05
+    z_base = origin[2] - height / 2
+    band_height = height / HEIGHT_BANDS
+
+    # Every candidate position, ordered by x offset, y offset then motif
+    x_offsets, y_offsets = grid_offsets(plan, extent[0], extent[1])
+    motif_count = len(plan["motifs"])
+    shape = (len(x_offsets), len(y_offsets), motif_count)
+
+    xs = (anchor[0] + np.array(x_offsets)[:, None, None] +
+          np.array([motif.dx for motif in plan["motifs"]])[None, None, :])
+    ys = (anchor[1] + np.array(y_offsets)[None, :, None] +
+          np.array([motif.dy for motif in plan["motifs"]])[None, None, :])
+
+    xs = np.broadcast_to(xs, shape).ravel()
+    ys = np.broadcast_to(ys, shape).ravel()
+    motif_indices = np.broadcast_to(np.arange(motif_count), shape).ravel()
+
+    # Cells reaching across the mirror plane are cut from both halves
+    if mirror is not None:
+        keep = (xs, ys)[mirror["axis"]] - reach < mirror["plane"]
+        xs, ys, motif_indices = xs[keep], ys[keep], motif_indices[keep]
+
+    z_lo = np.zeros(len(xs), dtype=np.int64)
+    z_hi = np.full(len(xs), HEIGHT_BANDS, dtype=np.int64)
+    candidate_count = len(xs)
+
+    if mesh is not None:
+        # Drop cells whose footprint misses the body
+        raster = footprint_raster(mesh[0], mesh[1], feature_def['input_size'] / 4)
+        keep = raster_hits(raster, xs, ys, reach)
+        xs, ys, motif_indices, z_lo, z_hi = xs[keep], ys[keep], motif_indices[keep], z_lo[keep], z_hi[keep]
+
+        h_map = height_map(mesh[0], mesh[1], feature_def['input_size'] / 2)
+        z_min, z_max = cells_z_range(h_map, xs, ys, reach)
+        found = z_min <= z_max
+
+        z_lo[found] = np.maximum(np.floor((z_min[found] - margin - z_base) / band_height), 0)
+        z_hi[found] = np.minimum(np.ceil((z_max[found] + margin - z_base) / band_height), HEIGHT_BANDS)
+
+    # Without a distance field every cell takes the core level
+    cell_levels = np.full(len(xs), len(levels) - 1, dtype=np.int64)
+
+    if len(levels) > 1 and len(xs) and (mesh is not None or grade_bvh is not None):
+        if grade_bvh is None:
+            grade_bvh = MeshBVH(mesh[0], mesh[1])
+
+        z_mid = z_base + (z_lo + z_hi) * band_height / 2
+        distance = grade_bvh.distance(np.column_stack([xs, ys, z_mid]))
+        fraction = np.clip(distance / feature_def['grade_distance'], 0, 1)
+        cell_levels = np.rint(fraction * (len(levels) - 1)).astype(np.int64)
+
+        order = np.argsort(cell_levels, kind='stable')
+        xs, ys, motif_indices, z_lo, z_hi, cell_levels = (xs[order], ys[order], motif_indices[order],
+                                                          z_lo[order], z_hi[order], cell_levels[order])
+
+    cells = [Cell(int(motif_index), float(x), float(y), int(lo), int(hi), int(level))
+             for motif_index, x, y, lo, hi, level in zip(motif_indices, xs, ys, z_lo, z_hi, cell_levels)]
+
+    plan.update({
+        "origin": origin,
+        "anchor": anchor,
+        "mirror": mirror,
+        "mirror_rejected": rejected,
+        "extent": extent,
+        "height": height,
+        "z_base": z_base,
+        "band_height": band_height,
+        "candidate_count": candidate_count,
+        "levels": levels,
+        "cells": cells,
+    })
+
+    return plan
+
+
+def parametric_cells(plan):
+    """
+    Outline of every cell for a single sketch.  Symmetric plans add the mirror image of each cell below the
+    plane, the cells above it are those images, and cells centered on the plane are drawn once.
+    :param plan: The fill plan
+    :type plan: dict
+    :return: (x, y, sides, offset, spoke) of each outline
+    :rtype: list
+    """
+    mirror = plan.get('mirror')
+
+    cells = []
+    for cell in plan['cells']:
+        motif = plan['motifs'][cell.motif]
+        spoke = plan['levels'][cell.level]['spoke']
+
+        if mirror is None:
+            cells.append((cell.x, cell.y, motif.sides, motif.offset, spoke))
+            continue
+
+        along = (cell.x, cell.y)[mirror['axis']]
+        if along > mirror['plane'] + 1e-9:
+            continue
+
+        cells.append((cell.x, cell.y, motif.sides, motif.offset, spoke))
+        if along < mirror['plane'] - 1e-9:
+            if mirror['axis'] == 0:
+                cells.append((2 * mirror['plane'] - cell.x, cell.y, motif.sides, -180 - motif.offset, spoke))
+            else:
+                cells.append((cell.x, 2 * mirror['plane'] - cell.y, motif.sides, -motif.offset, spoke))
+
+    return cells
+
+
+def plan_tiles(plan, core_faces, tile_size=None, face_budget=None):
+    """
+    Splits the footprint of a plan into rectangular tiles.  Tiles start at tile_size (or the whole
+    footprint) and are split in four until the faces expected on each slice of the core fit the budget.
+    Cells are listed in every tile their footprint overlaps.  Every tile over the core is kept, with or
+    without cells, so the merged slices rebuild the whole core.
+    :param plan: The fill plan
+    :type plan: dict
+    :param core_faces: Face count of the uncut core
+    :type core_faces: int
+    :param tile_size: Optional starting edge length of the tiles
+    :type tile_size: float
+    :param face_budget: Optional face budget per tile, defaults to TILE_FACE_BUDGET
+    :type face_budget: int
+    :return: Tiles with their bounds, cell indices and estimated face count, ordered by position
+    :rtype: list
+    """
+    face_budget = face_budget or TILE_FACE_BUDGET
+    reach = max(level["spoke"] for level in plan["levels"])
+
+    xs = np.array([cell.x for cell in plan["cells"]])
+    ys = np.array([cell.y for cell in plan["cells"]])
+    cut_faces = np.array([(plan["motifs"][cell.motif].sides or 2) + 2 for cell in plan["cells"]])
+
+    # Pad the outer edges so the tiles fully cover the core
+    pad = [extent * .01 + plan["input_size"] for extent in plan["extent"][:2]]
+    x_min = plan["origin"][0] - plan["extent"][0] / 2 - pad[0]
+    x_max = plan["origin"][0] + plan["extent"][0] / 2 + pad[0]
+    y_min = plan["origin"][1] - plan["extent"][1] / 2 - pad[1]
+    y_max = plan["origin"][1] + plan["extent"][1] / 2 + pad[1]
+    total_area = (x_max - x_min) * (y_max - y_min)
+
+    core_min = [plan["origin"][i] - plan["extent"][i] / 2 for i in range(2)]
+    core_max = [plan["origin"][i] + plan["extent"][i] / 2 for i in range(2)]
+
+    stack = []
+    if tile_size:
+        x_edges = np.linspace(x_min, x_max, max(math.ceil((x_max - x_min) / tile_size), 1) + 1)
+        y_edges = np.linspace(y_min, y_max, max(math.ceil((y_max - y_min) / tile_size), 1) + 1)
+        for i in range(len(x_edges) - 1):
+            for j in range(len(y_edges) - 1):
+                stack.append((x_edges[i], x_edges[i + 1], y_edges[j], y_edges[j + 1]))
+    else:
+        stack.append((x_min, x_max, y_min, y_max))
+
+    tiles = []
+    while stack:
+        x_0, x_1, y_0, y_1 = stack.pop()
+
+        # Only tiles in the padding around the core have nothing to keep
+        if x_1 <= core_min[0] or x_0 >= core_max[0] or y_1 <= core_min[1] or y_0 >= core_max[1]:
+            continue
+
+        inside = (xs + reach > x_0) & (xs - reach < x_1) & (ys + reach > y_0) & (ys - reach < y_1)
+
+        estimate = core_faces * (x_1 - x_0) * (y_1 - y_0) / total_area + cut_faces[inside].sum()
+
+        # Stop splitting once tiles would be narrower than a few cells
+        if estimate > face_budget and min(x_1 - x_0, y_1 - y_0) > plan["input_size"] * 4:
+            x_mid = (x_0 + x_1) / 2
+            y_mid = (y_0 + y_1) / 2
+            stack.extend([(x_0, x_mid, y_0, y_mid), (x_mid, x_1, y_0, y_mid),
+                          (x_0, x_mid, y_mid, y_1), (x_mid, x_1, y_mid, y_1)])
+        else:
+            tiles.append({
+                "x_min": float(x_0),
+                "x_max": float(x_1),
+                "y_min": float(y_0),
+                "y_max": float(y_1),
+                "cells": np.flatnonzero(inside).tolist(),
+                "estimated_faces": int(estimate),
+            })
+
+    tiles.sort(key=lambda tile: (tile["x_min"], tile["y_min"]))
+
+    return tiles
+
+
+def encode_plan(plan):
+    """
+    Compact text encoding of a plan, a JSON header with the lattice anchor, pitch vectors, motif table
+    and levels, and the cells as a zlib compressed, base64 packed float32 array.
+    Each cell takes three floats, its x and y relative to the anchor and a code holding the motif,
+    height bands and level, so a plan of 50k cells encodes to well under a megabyte.
+    :param plan: The fill plan
+    :type plan: dict
+    :return: The encoded plan
+    :rtype: str
+    """
+    cells = plan["cells"]
+    anchor = [float(value) for value in plan["anchor"]]
+
+    records = np.zeros((len(cells), 3), dtype=np.float32)
+    if cells:
+        fields = np.array([(cell.motif, cell.z_lo, cell.z_hi, cell.level) for cell in cells], dtype=np.int64)
+        shifts = np.cumsum((0,) + _CODE_BITS[:-1])
+        records[:, 0] = np.array([cell.x for cell in cells]) - anchor[0]
+        records[:, 1] = np.array([cell.y for cell in cells]) - anchor[1]
+        records[:, 2] = (fields << shifts).sum(axis=1)
+
+    header = {
+        "version": PLAN_FORMAT_VERSION,
+        "infill_type": plan["infill_type"],
+        "input_size": plan["input_size"],
+        "anchor": anchor,
+        "origin": [float(value) for value in plan["origin"]],
+        "pitch": [[plan["d1_space"], 0.0], [0.0, plan["d2_space"]]],
+        "motifs": [list(motif) for motif in plan["motifs"]],
+        "lattice": {key: plan[key] for key in ("gap", "spoke", "x_space", "y_space", "x_qty_scale")},
+        "extent": [float(value) for value in plan["extent"]],
+        "height": float(plan["height"]),
+        "z_base": float(plan["z_base"]),
+        "band_height": float(plan["band_height"]),
+        "candidate_count": int(plan["candidate_count"]),
+        "levels": [{key: float(value) for key, value in level.items()} for level in plan["levels"]],
+        "mirror": plan.get("mirror"),
+        "count": len(cells),
+    }
+
+    return json.dumps({
+        "header": header,
+        "cells": base64.b64encode(zlib.compress(records.tobytes())).decode('ascii'),
+    })
+
+
+def decode_plan(text):
+    """
+    Rebuilds a plan from encode_plan, cell positions are rounded to float32 around the anchor
+    :param text: The encoded plan
+    :type text: str
+    :return: The fill plan or None if it was encoded by another version
+    :rtype: dict
+    """
+    encoded = json.loads(text)
+    header = encoded["header"]
+    if header.get("version") != PLAN_FORMAT_VERSION:
+        return None
+
+    records = np.frombuffer(zlib.decompress(base64.b64decode(encoded["cells"])),
+                            dtype=np.float32).reshape(-1, 3)
+
+    codes = records[:, 2].astype(np.int64)
+    fields = []
+    shift = 0
+    for bits in _CODE_BITS:
+        fields.append((codes >> shift) & ((1 << bits) - 1))
+        shift += bits
+
+    anchor = header["anchor"]
+    xs = anchor[0] + records[:, 0].astype(np.float64)
+    ys = anchor[1] + records[:, 1].astype(np.float64)
+    cells = [Cell(int(motif), float(x), float(y), int(lo), int(hi), int(level))
+             for motif, x, y, lo, hi, level in zip(fields[0], xs, ys, fields[1], fields[2], fields[3])]
+
+    plan = dict(header["lattice"])
+    plan.update({
+        "infill_type": header["infill_type"],
+        "input_size": header["input_size"],
+        "d1_space": header["pitch"][0][0],
+        "d2_space": header["pitch"][1][1],
+        "motifs": [Motif(*motif) for motif in header["motifs"]],
+        "origin": header["origin"],
+        "anchor": anchor[:2],
+        "mirror": header["mirror"],
+        "extent": header["extent"],
+        "height": header["height"],
+        "z_base": header["z_base"],
+        "band_height": header["band_height"],
+        "candidate_count": header["candidate_count"],
+        "levels": header["levels"],
+        "cells": cells,
+    })
+
+    return plan
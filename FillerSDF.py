@@ -0,0 +1,237 @@
+import math
+
+import numpy as np
+
+from .FillerPlan import band_range
+from .FillerVoxel import mesh_voxel_size, voxel_grid, voxel_centers, voxelize_mesh, erode
+from .Fusion360Utilities.Fusion360MeshBVH import MeshBVH
+
+
+# Cubes per block edge, only one block of distance samples is held in memory at a time
+SDF_BLOCK_SIZE = 32
+
+# Number of nearest cells combined for each sample column
+SDF_NEAREST_CELLS = 4
+
+# Corners of a cube as (i, j, k) offsets and its six tetrahedra around the 0 - 6 diagonal
+# Every cube uses the same diagonal, so the faces shared by neighbouring cubes are split the same way
+_CUBE_CORNERS = np.array([(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0),
+                          (0, 0, 1), (1, 0, 1), (1, 1, 1), (0, 1, 1)])
+_CUBE_TETRAHEDRA = [(0, 1, 2, 6), (0, 2, 3, 6), (0, 3, 7, 6), (0, 7, 4, 6), (0, 4, 5, 6), (0, 5, 1, 6)]
+
+
+def _tetrahedron_cases():
+    # Triangles of each inside / outside case of a tetrahedron, as edges between its corners
+    cases = {}
+    for code in range(1, 15):
+        inside = [corner for corner in range(4) if code >> corner & 1]
+        outside = [corner for corner in range(4) if not code >> corner & 1]
+
+        if len(inside) == 2:
+            a, b = inside
+            c, d = outside
+            cases[code] = [((a, c), (a, d), (b, d)), ((a, c), (b, d), (b, c))]
+        else:
+            lone, others = (inside[0], outside) if len(inside) == 1 else (outside[0], inside)
+            cases[code] = [tuple((lone, other) for other in others)]
+
+    return cases
+
+
+_TETRAHEDRON_CASES = _tetrahedron_cases()
+
+
+def _cell_distance_2d(dx, dy, motif, radius):
+    # Distance to the outline of a cell's tool, negative inside
+    # Polygons use the largest edge distance, exact inside and a lower bound outside near the corners
+    if motif.sides == 0:
+        return np.hypot(dx, dy) - radius
+
+    apothem = radius * math.cos(math.pi / motif.sides)
+    distance = np.full(np.shape(dx), -np.inf)
+    for corner in range(motif.sides):
+        angle = math.radians((360 / motif.sides) * corner - motif.offset) + math.pi / motif.sides
+        distance = np.maximum(distance, dx * math.cos(angle) + dy * math.sin(angle) - apothem)
+
+    return distance
+
+
+def plan_cell_arrays(plan):
+    """
+    Position, radius and z range of every tool of a plan as flat arrays
+    :rtype: dict
+    """
+    cells = plan["cells"]
+    z_ranges = np.array([band_range(plan, cell) for cell in cells]).reshape(-1, 2)
+
+    return {
+        "x": np.array([cell.x for cell in cells]),
+        "y": np.array([cell.y for cell in cells]),
+        "motif": np.array([cell.motif for cell in cells], dtype=np.int64),
+        "radius": np.array([plan["levels"][cell.level]["spoke"] for cell in cells]),
+        "z_lo": z_ranges[:, 0],
+        "z_hi": z_ranges[:, 1],
+    }
+
+
+def lattice_distance(plan, cell_arrays, xs, ys, zs, clamp):
+    """
+    Distance to the union of the cutting tools on a block of samples, negative inside a tool
+    Only the nearest cells of each sample column are combined, the result is clamped to +- clamp.
+    :param xs, ys, zs: Sample coordinates along each axis of the block
+    :return: Distances (len(xs) x len(ys) x len(zs))
+    :rtype: numpy.ndarray
+    """
+    reach = cell_arrays["radius"] + clamp
+    near = ((cell_arrays["x"] + reach >= xs[0]) & (cell_arrays["x"] - reach <= xs[-1]) &
+            (cell_arrays["y"] + reach >= ys[0]) & (cell_arrays["y"] - reach <= ys[-1]))
+    near = np.flatnonzero(near)
+
+    if len(near) == 0:
+        return np.full((len(xs), len(ys), len(zs)), clamp)
+
+    # Outline distance of every nearby cell for every sample column
+    dx = xs[:, None, None] - cell_arrays["x"][near]
+    dy = ys[None, :, None] - cell_arrays["y"][near]
+    dx, dy = np.broadcast_arrays(dx, dy)
+    distance_2d = np.empty(dx.shape)
+    for motif_index, motif in enumerate(plan["motifs"]):
+        group = cell_arrays["motif"][near] == motif_index
+        if group.any():
+            distance_2d[:, :, group] = _cell_distance_2d(dx[:, :, group], dy[:, :, group], motif,
+                                                         cell_arrays["radius"][near][group])
+
+    # Extrude the nearest cells of each column between their z limits
+    count = min(SDF_NEAREST_CELLS, len(near))
+    nearest = np.argpartition(distance_2d, count - 1, axis=2)[:, :, :count]
+    distance_2d = np.take_along_axis(distance_2d, nearest, axis=2)
+    z_lo = cell_arrays["z_lo"][near][nearest]
+    z_hi = cell_arrays["z_hi"][near][nearest]
+
+    distance = np.maximum(np.maximum(distance_2d[..., None], z_lo[..., None] - zs),
+                          zs - z_hi[..., None]).min(axis=2)
+
+    return np.clip(distance, -clamp, clamp)
+
+
+def marching_tetrahedra(values, positions):
+    """
+    Zero level surface of sampled values, solid where values are negative
+    :param values: Samples on a regular grid (nx x ny x nz)
+    :param positions: Function of (n x 3) sample indices returning their coordinates
+    :return: Triangle corners (m x 3 x 3), wound counter clockwise seen from the positive side
+    :rtype: numpy.ndarray
+    """
+    nx, ny, nz = values.shape
+    corner_values = np.stack([values[i:nx - 1 + i, j:ny - 1 + j, k:nz - 1 + k] for i, j, k in _CUBE_CORNERS],
+                             axis=-1)
+
+    # Only cubes the surface passes through
+    mixed = (corner_values.min(axis=-1) < 0) & (corner_values.max(axis=-1) >= 0)
+    cubes = np.argwhere(mixed)
+    if len(cubes) == 0:
+        return np.zeros((0, 3, 3))
+
+    corner_values = corner_values[mixed]
+    corner_points = positions((cubes[:, None, :] + _CUBE_CORNERS).reshape(-1, 3)).reshape(-1, 8, 3)
+
+    triangles = []
+    for tetrahedron in _CUBE_TETRAHEDRA:
+        tet_values = corner_values[:, tetrahedron]
+        tet_points = corner_points[:, tetrahedron]
+        inside = tet_values < 0
+        codes = (inside * (1 << np.arange(4))).sum(axis=1)
+
+        for code, case in _TETRAHEDRON_CASES.items():
+            select = codes == code
+            if not select.any():
+                continue
+
+            case_values = tet_values[select]
+            case_points = tet_points[select]
+
+            # Direction from the solid corners to the empty ones
+            case_inside = inside[select][0]
+            outward = case_points[:, ~case_inside].mean(axis=1) - case_points[:, case_inside].mean(axis=1)
+
+            for edges in case:
+                corners = []
+                for a, b in edges:
+                    t = case_values[:, a] / (case_values[:, a] - case_values[:, b])
+                    corners.append(case_points[:, a] + t[:, None] * (case_points[:, b] - case_points[:, a]))
+                triangle = np.stack(corners, axis=1)
+
+                normals = np.cross(triangle[:, 1] - triangle[:, 0], triangle[:, 2] - triangle[:, 0])
+                flip = (normals * outward).sum(axis=1) < 0
+                triangle[flip] = triangle[flip][:, [0, 2, 1]]
+                triangles.append(triangle)
+
+    return np.concatenate(triangles)
+
+
+def sdf_infill_mesh(plan, feature_def, mesh, voxel_size=None, block_size=None):
+    """
+    Builds the infilled body as a smooth triangle mesh from signed distance fields, without any BRep booleans.
+    The body distance comes from the mesh, the lattice distance is analytic for every cell type.
+    Both are sampled block by block and the zero level is extracted with marching tetrahedra,
+    so memory stays bounded by the block size and the time scales with the sample count, not the cell count.
+    :param plan: The fill plan
+    :type plan: dict
+    :param feature_def: The filler feature definition
+    :type feature_def: dict
+    :param mesh: Vertices and triangles of the body
+    :type mesh: (numpy.ndarray, numpy.ndarray)
+    :param voxel_size: Optional sample spacing, defaults to mesh_voxel_size
+    :type voxel_size: float
+    :param block_size: Optional cubes per block edge, defaults to SDF_BLOCK_SIZE
+    :type block_size: int
+    :return: Triangle corners (m x 3 x 3, cm)
+    :rtype: numpy.ndarray
+    """
+    vertices, triangles = mesh
+    block_size = block_size or SDF_BLOCK_SIZE
+    grid = voxel_grid(vertices, voxel_size or mesh_voxel_size(plan, feature_def))
+    voxel_size = grid["voxel_size"]
+    nx, ny, nz = grid["shape"]
+
+    shell = feature_def['input_shell_thickness'] if feature_def['body_type'] == "Create Shell" else 0.0
+    clamp = shell + 2 * voxel_size
+
+    # Samples sit on the voxel centers, exact body distances are only needed near the surface
+    inside = voxelize_mesh(vertices, triangles, grid)
+    steps = int(math.ceil(clamp / voxel_size)) + 1
+    near = (inside & ~erode(inside, steps)) | (~inside & ~erode(~inside, 2))
+    bvh = MeshBVH(vertices, triangles)
+
+    cell_arrays = plan_cell_arrays(plan)
+    centers = [voxel_centers(grid, axis) for axis in range(3)]
+
+    pieces = []
+    for i0 in range(0, nx - 1, block_size):
+        for j0 in range(0, ny - 1, block_size):
+            for k0 in range(0, nz - 1, block_size):
+                # Blocks share their last layer of samples with the next block
+                block = (slice(i0, min(i0 + block_size + 1, nx)),
+                         slice(j0, min(j0 + block_size + 1, ny)),
+                         slice(k0, min(k0 + block_size + 1, nz)))
+                xs, ys, zs = (centers[axis][block[axis]] for axis in range(3))
+
+                block_inside = inside[block]
+                body = np.where(block_inside, -clamp, clamp)
+                block_near = near[block]
+                if block_near.any():
+                    index = np.argwhere(block_near)
+                    points = np.stack([xs[index[:, 0]], ys[index[:, 1]], zs[index[:, 2]]], axis=1)
+                    distance = np.minimum(bvh.distance(points), clamp)
+                    body[block_near] = np.where(block_inside[block_near], -distance, distance)
+
+                lattice = lattice_distance(plan, cell_arrays, xs, ys, zs, clamp)
+                solid = np.maximum(body, -lattice)
+
+                if shell > 0:
+                    solid = np.minimum(solid, np.maximum(body, -shell - body))
+
+                origin = np.array([xs[0], ys[0], zs[0]])
+                pieces.append(marching_tetrahedra(solid, lambda index: origin + index * voxel_size))
+
+    return np.concatenate(pieces)
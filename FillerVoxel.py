@@ -0,0 +1,228 @@
+import math
+
+import numpy as np
+
+from .FillerPlan import triangle_spans, band_range
+
+
+# Upper limit for the number of voxels in a mesh fill, the voxel size grows to stay below it
+MESH_VOXEL_BUDGET = 20000000
+
+
+def mesh_voxel_size(plan, feature_def, voxel_budget=None):
+    """
+    Voxel size that resolves the thinnest rib (and shell) with two voxels, coarsened to fit the voxel budget
+    :param plan: The fill plan
+    :type plan: dict
+    :param feature_def: The filler feature definition
+    :type feature_def: dict
+    :param voxel_budget: Optional voxel budget, defaults to MESH_VOXEL_BUDGET
+    :type voxel_budget: int
+    :rtype: float
+    """
+    voxel_budget = voxel_budget or MESH_VOXEL_BUDGET
+
+    thinnest = min(level["rib"] for level in plan["levels"])
+    if feature_def['body_type'] == "Create Shell":
+        thinnest = min(thinnest, feature_def['input_shell_thickness'])
+
+    voxel_size = thinnest / 2
+    count = np.prod([extent / voxel_size + 2 for extent in plan["extent"]])
+    if count > voxel_budget:
+        voxel_size *= (count / voxel_budget) ** (1 / 3)
+
+    return voxel_size
+
+
+def voxel_grid(vertices, voxel_size):
+    """
+    Voxel grid around a mesh with one empty voxel on every side.  The grid is nudged off round coordinates
+    so voxel centers do not land exactly on the mesh edges of axis aligned CAD geometry.
+    :return: The grid, voxel (i, j, k) spans origin + (i, j, k) * voxel_size to origin + (i + 1, j + 1, k + 1) * voxel_size
+    :rtype: dict
+    """
+    nudge = voxel_size * np.array([1e-3 * math.sqrt(2), 1e-3 * math.sqrt(3), 1e-3 * math.sqrt(5)])
+    origin = vertices.min(axis=0) - voxel_size + nudge
+    shape = tuple(int(n) for n in np.ceil((vertices.max(axis=0) - origin) / voxel_size) + 1)
+
+    return {
+        "origin": origin,
+        "voxel_size": voxel_size,
+        "shape": shape,
+    }
+
+
+def voxel_centers(grid, axis):
+    return grid["origin"][axis] + (np.arange(grid["shape"][axis]) + .5) * grid["voxel_size"]
+
+
+def voxelize_mesh(vertices, triangles, grid):
+    """
+    Inside / outside classification of every voxel of a closed mesh.  Each column of voxel centers is
+    crossed with the mesh and the crossing parity below a voxel decides whether it is inside.
+    :rtype: numpy.ndarray
+    """
+    voxel_size = grid["voxel_size"]
+    x0, y0, z0 = grid["origin"]
+    nx, ny, nz = grid["shape"]
+
+    corners = vertices[triangles]
+    owner, row, col_0, col_1 = triangle_spans(corners[:, :, :2], x0, y0, voxel_size)
+
+    # One crossing per triangle and voxel column
+    counts = col_1 - col_0 + 1
+    tri = np.repeat(owner, counts)
+    row = np.repeat(row, counts)
+    col = np.repeat(col_0, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    sloped = np.abs(normals[:, 2]) > 1e-12 * np.linalg.norm(normals, axis=1)
+    n_z = np.where(sloped, normals[:, 2], 1.0)
+
+    keep = sloped[tri]
+    tri, row, col = tri[keep], row[keep], col[keep]
+
+    base = corners[tri, 0]
+    crossing_z = (base[:, 2] - (normals[tri, 0] * (x0 + (col + .5) * voxel_size - base[:, 0]) +
+                                normals[tri, 1] * (y0 + (row + .5) * voxel_size - base[:, 1])) / n_z[tri])
+
+    # Each crossing toggles every voxel center above it
+    first = np.clip(np.ceil((crossing_z - z0) / voxel_size - .5).astype(np.int64), 0, nz)
+    toggles = np.zeros((nx, ny, nz + 1), dtype=np.uint8)
+    np.add.at(toggles, (col, row, first), 1)
+
+    return (np.cumsum(toggles, axis=2, dtype=np.uint8)[:, :, :nz] % 2).astype(bool)
+
+
+def lattice_void(plan, grid):
+    """
+    Voxels removed by the cutting tools of a plan, each tool spans its trimmed height range
+    :rtype: numpy.ndarray
+    """
+    voxel_size = grid["voxel_size"]
+    x0, y0, z0 = grid["origin"]
+    nx, ny, nz = grid["shape"]
+
+    void_lo = np.full((nx, ny), np.inf)
+    void_hi = np.full((nx, ny), -np.inf)
+
+    cells = plan["cells"]
+    for motif_index, motif in enumerate(plan["motifs"]):
+        for level_index, level in enumerate(plan["levels"]):
+            group = [cell for cell in cells if cell.motif == motif_index and cell.level == level_index]
+            radius = level["spoke"]
+            if not group or radius <= 0:
+                continue
+
+            xs = np.array([cell.x for cell in group])
+            ys = np.array([cell.y for cell in group])
+            z_ranges = np.array([band_range(plan, cell) for cell in group])
+
+            # Test the voxel columns of a square stencil around each cell
+            stencil = int(math.ceil(2 * radius / voxel_size)) + 2
+            offsets = np.arange(stencil)
+            i = (np.floor((xs - radius - x0) / voxel_size).astype(np.int64)[:, None, None] + offsets[None, :, None])
+            j = (np.floor((ys - radius - y0) / voxel_size).astype(np.int64)[:, None, None] + offsets[None, None, :])
+            i, j = np.broadcast_arrays(i, j)
+            dx = x0 + (i + .5) * voxel_size - xs[:, None, None]
+            dy = y0 + (j + .5) * voxel_size - ys[:, None, None]
+
+            if motif.sides == 0:
+                inside = dx * dx + dy * dy <= radius * radius
+            else:
+                # Regular polygon, inside of every edge by the apothem
+                apothem = radius * math.cos(math.pi / motif.sides)
+                inside = np.ones(dx.shape, dtype=bool)
+                for corner in range(motif.sides):
+                    angle = math.radians((360 / motif.sides) * corner - motif.offset) + math.pi / motif.sides
+                    inside &= dx * math.cos(angle) + dy * math.sin(angle) <= apothem
+
+            inside &= (i >= 0) & (i < nx) & (j >= 0) & (j < ny)
+            owner = np.broadcast_to(np.arange(len(group))[:, None, None], i.shape)[inside]
+            np.minimum.at(void_lo, (i[inside], j[inside]), z_ranges[owner, 0])
+            np.maximum.at(void_hi, (i[inside], j[inside]), z_ranges[owner, 1])
+
+    z_centers = z0 + (np.arange(nz) + .5) * voxel_size
+    return (z_centers >= void_lo[:, :, None]) & (z_centers <= void_hi[:, :, None])
+
+
+def erode(mask, steps):
+    """
+    Shrinks a voxel mask by a number of face neighbour steps
+    :rtype: numpy.ndarray
+    """
+    for _ in range(steps):
+        shrunk = mask.copy()
+        shrunk[1:] &= mask[:-1]
+        shrunk[:-1] &= mask[1:]
+        shrunk[:, 1:] &= mask[:, :-1]
+        shrunk[:, :-1] &= mask[:, 1:]
+        shrunk[:, :, 1:] &= mask[:, :, :-1]
+        shrunk[:, :, :-1] &= mask[:, :, 1:]
+        mask = shrunk
+
+    return mask
+
+
+def boundary_triangles(solid, grid):
+    """
+    Triangles of the voxel faces between solid and empty voxels, wound counter clockwise seen from outside
+    :return: Triangle corners (m x 3 x 3)
+    :rtype: numpy.ndarray
+    """
+    voxel_size = grid["voxel_size"]
+    padded = np.pad(solid, 1)
+    unit = np.eye(3) * voxel_size
+
+    faces = []
+    for axis in range(3):
+        u = unit[(axis + 1) % 3]
+        v = unit[(axis + 2) % 3]
+
+        lower = np.delete(padded, -1, axis=axis)
+        upper = np.delete(padded, 0, axis=axis)
+
+        for mask, outward in ((lower & ~upper, True), (~lower & upper, False)):
+            index = np.argwhere(mask)
+
+            # Faces sit on the far side of the lower voxel, padding shifts the other axes by one
+            corner = index - 1
+            corner[:, axis] = index[:, axis]
+            p0 = grid["origin"] + corner * voxel_size
+
+            if outward:
+                quad = [p0, p0 + u, p0 + u + v, p0 + v]
+            else:
+                quad = [p0, p0 + v, p0 + u + v, p0 + u]
+
+            faces.append(np.stack([quad[0], quad[1], quad[2]], axis=1))
+            faces.append(np.stack([quad[0], quad[2], quad[3]], axis=1))
+
+    return np.concatenate(faces)
+
+
+def voxel_infill_mesh(plan, feature_def, mesh, voxel_size=None):
+    """
+    Builds the infilled body as a triangle mesh on a voxel grid, without any BRep booleans
+    :param plan: The fill plan
+    :type plan: dict
+    :param feature_def: The filler feature definition
+    :type feature_def: dict
+    :param mesh: Vertices and triangles of the body
+    :type mesh: (numpy.ndarray, numpy.ndarray)
+    :param voxel_size: Optional voxel size, defaults to mesh_voxel_size
+    :type voxel_size: float
+    :return: Triangle corners (m x 3 x 3, cm)
+    :rtype: numpy.ndarray
+    """
+    vertices, triangles = mesh
+    grid = voxel_grid(vertices, voxel_size or mesh_voxel_size(plan, feature_def))
+
+    inside = voxelize_mesh(vertices, triangles, grid)
+    solid = inside & ~lattice_void(plan, grid)
+
+    if feature_def['body_type'] == "Create Shell":
+        steps = max(int(round(feature_def['input_shell_thickness'] / grid["voxel_size"])), 1)
+        solid |= inside & ~erode(inside, steps)
+
+    return boundary_triangles(solid, grid)
@@ -1,67 +1,155 @@
 import traceback
+import collections.abc
+import importlib
+import time
 
 import adsk.core
 import adsk.fusion
 import json
 
-handlers = []
+from .Fusion360DebugUtilities import debug_log, close_debug_logs
 
 
-# Returns a dictionary for all inputs. Very useful for creating quick Fusion 360 Add-ins
-def get_inputs(command_inputs):
-    value_types = [adsk.core.BoolValueCommandInput.classType(), adsk.core.DistanceValueCommandInput.classType(),
-                   adsk.core.FloatSliderCommandInput.classType(), adsk.core.FloatSpinnerCommandInput.classType(),
-                   adsk.core.IntegerSliderCommandInput.classType(), adsk.core.IntegerSpinnerCommandInput.classType(),
-                   adsk.core.ValueCommandInput.classType(), adsk.core.SliderCommandInput.classType(),
-                   adsk.core.StringValueCommandInput.classType()]
+# Class to keep event handlers referenced for as long as their scope lives
+# Scopes are released as a whole, so handlers of closed command dialogs don't pile up over a session
+class HandlerRegistry(object):
 
-    list_types = [adsk.core.ButtonRowCommandInput.classType(), adsk.core.DropDownCommandInput.classType(),
-                  adsk.core.RadioButtonGroupCommandInput.classType()]
+    def __init__(self):
+        self.scopes = {}
 
-    selection_types = [adsk.core.SelectionCommandInput.classType()]
+    def add(self, scope, handler):
+        self.scopes.setdefault(scope, []).append(handler)
+        return handler
 
-    input_values = {}
-    input_values.clear()
+    # Drops one handler, keeping the rest of its scope
+    def discard(self, scope, handler):
+        scope_handlers = self.scopes.get(scope, [])
+        if handler in scope_handlers:
+            scope_handlers.remove(handler)
+        if not scope_handlers:
+            self.scopes.pop(scope, None)
 
-    for command_input in command_inputs:
+    # Drops every handler of a scope, returns how many were released
+    def release(self, scope):
+        return len(self.scopes.pop(scope, []))
 
-        # If the input type is in this list the value of the input is returned
-        if command_input.objectType in value_types:
-            input_values[command_input.id] = command_input.value
-            input_values[command_input.id + '_input'] = command_input
+    # Live handlers of a scope, or of all scopes
+    def count(self, scope=None):
+        if scope is not None:
+            return len(self.scopes.get(scope, []))
 
-        # TODO need to account for radio and button multi select also
-        # If the input type is in this list the name of the selected list item is returned
-        elif command_input.objectType in list_types:
-            if command_input.objectType == adsk.core.DropDownCommandInput.classType():
-                if command_input.dropDownStyle == adsk.core.DropDownStyles.CheckBoxDropDownStyle:
-                    input_values[command_input.id] = command_input.listItems
-                    input_values[command_input.id + '_input'] = command_input
+        return sum(len(scope_handlers) for scope_handlers in self.scopes.values())
 
-                else:
-                    if command_input.selectedItem is not None:
-                        input_values[command_input.id] = command_input.selectedItem.name
-                        input_values[command_input.id + '_input'] = command_input
-            else:
-                if command_input.selectedItem is not None:
-                    input_values[command_input.id] = command_input.selectedItem.name
-                    input_values[command_input.id + '_input'] = command_input
+    # Live handlers by scope
+    def counts(self):
+        return {scope: len(scope_handlers) for scope, scope_handlers in self.scopes.items()}
 
-        # If the input type is a selection an array of entities is returned
-        elif command_input.objectType in selection_types:
-            if command_input.selectionCount > 0:
-                selections = []
-                for i in range(0, command_input.selectionCount):
-                    selections.append(command_input.selection(i).entity)
 
-                input_values[command_input.id] = selections
-                input_values[command_input.id + '_input'] = command_input
+# Handlers of the add-in.  Scopes used here:
+#   'session' - application events for the life of the add-in
+#   (cmd_id, 'definition') - the commandCreated handler, released in on_stop
+#   (cmd_id, 'dialog') - the handlers of an open command dialog, released when the command is destroyed
+#   (palette_id, 'palette') - the handlers of a palette, released when it is closed
+handler_registry = HandlerRegistry()
 
-        else:
-            input_values[command_input.id] = command_input.name
-            input_values[command_input.id + '_input'] = command_input
 
-    return input_values
+# Number of live event handlers, this should stay flat over a long session
+def live_handler_count():
+    return handler_registry.count()
+
+
+# Command input class types, resolved once at import
+VALUE_TYPES = frozenset([adsk.core.BoolValueCommandInput.classType(), adsk.core.DistanceValueCommandInput.classType(),
+                         adsk.core.FloatSliderCommandInput.classType(), adsk.core.FloatSpinnerCommandInput.classType(),
+                         adsk.core.IntegerSliderCommandInput.classType(),
+                         adsk.core.IntegerSpinnerCommandInput.classType(),
+                         adsk.core.ValueCommandInput.classType(), adsk.core.SliderCommandInput.classType(),
+                         adsk.core.StringValueCommandInput.classType()])
+
+LIST_TYPES = frozenset([adsk.core.ButtonRowCommandInput.classType(), adsk.core.DropDownCommandInput.classType(),
+                        adsk.core.RadioButtonGroupCommandInput.classType()])
+
+SELECTION_TYPES = frozenset([adsk.core.SelectionCommandInput.classType()])
+
+DROP_DOWN_TYPE = adsk.core.DropDownCommandInput.classType()
+
+# Marks an input without a value, like an empty selection
+_NO_VALUE = object()
+
+
+# Returns the value of a single input, or _NO_VALUE
+def input_value(command_input):
+    object_type = command_input.objectType
+
+    # If the input type is in this list the value of the input is returned
+    if object_type in VALUE_TYPES:
+        return command_input.value
+
+    # TODO need to account for radio and button multi select also
+    # If the input type is in this list the name of the selected list item is returned
+    elif object_type in LIST_TYPES:
+        if object_type == DROP_DOWN_TYPE and \
+                command_input.dropDownStyle == adsk.core.DropDownStyles.CheckBoxDropDownStyle:
+            return command_input.listItems
+
+        if command_input.selectedItem is not None:
+            return command_input.selectedItem.name
+
+    # If the input type is a selection an array of entities is returned
+    elif object_type in SELECTION_TYPES:
+        if command_input.selectionCount > 0:
+            return [command_input.selection(i).entity for i in range(0, command_input.selectionCount)]
+
+    else:
+        return command_input.name
+
+    return _NO_VALUE
+
+
+# Read only mapping of input values, keyed by input id, with the input itself under id + '_input'
+# Values are looked up when first read and kept for the rest of the event
+# changed holds the ids changed since the handler's previous event, None when every input is new
+class InputValues(collections.abc.Mapping):
+
+    def __init__(self, command_inputs, changed=None):
+        self.command_inputs = command_inputs
+        self.changed = changed
+
+        self._values = {}
+
+    def _value(self, input_id):
+        if input_id not in self._values:
+            command_input = self.command_inputs.itemById(input_id)
+            self._values[input_id] = _NO_VALUE if command_input is None else input_value(command_input)
+
+        return self._values[input_id]
+
+    def has_changed(self, input_id):
+        return self.changed is None or input_id in self.changed
+
+    def __getitem__(self, key):
+        value = self._value(key)
+        if value is not _NO_VALUE:
+            return value
+
+        if key.endswith('_input') and self._value(key[:-len('_input')]) is not _NO_VALUE:
+            return self.command_inputs.itemById(key[:-len('_input')])
+
+        raise KeyError(key)
+
+    def __iter__(self):
+        for command_input in self.command_inputs:
+            if self._value(command_input.id) is not _NO_VALUE:
+                yield command_input.id
+                yield command_input.id + '_input'
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+# Returns a mapping for all inputs. Very useful for creating quick Fusion 360 Add-ins
+def get_inputs(command_inputs, changed=None):
+    return InputValues(command_inputs, changed)
 
 
 # Finds command definition in active UI
@@ -181,8 +269,29 @@ class Fusion360CommandBase:
 
         self.debug = debug
 
-        # global set of event handlers to keep them referenced for the duration of the command
-        self.handlers = []
+        # With debug on, events are recorded in the app's debug log and optionally streamed to this palette
+        self.debug_palette_id = cmd_def.get('debug_palette_id', None)
+
+        # Change number of the last change of each input, reset when the command dialog opens
+        self.input_changes = {}
+        self.change_count = 0
+
+    # Records a handler event in the non blocking debug log when debug is on
+    def debug_event(self, event, input_ids=None, seconds=None, **details):
+        if self.debug:
+            debug_log(self.app_name, self.debug_palette_id).log(event, self.cmd_id, input_ids, seconds, **details)
+
+    # Records an input change for the change sets of later events
+    def note_input_change(self, input_id):
+        self.change_count += 1
+        self.input_changes[input_id] = self.change_count
+
+    # Ids of the inputs changed after a change number, None for the first event of a handler
+    def changed_since(self, change_number):
+        if change_number is None:
+            return None
+
+        return frozenset(input_id for input_id, number in self.input_changes.items() if number > change_number)
 
     def on_preview(self, command: adsk.core.Command, inputs: adsk.core.CommandInputs, args, input_values):
         pass
@@ -205,8 +314,6 @@ class Fusion360CommandBase:
         return CommandCreatedEventHandler(self)
 
     def on_run(self):
-        global handlers
-
         app = adsk.core.Application.cast(adsk.core.Application.get())
         ui = app.userInterface
 
@@ -240,7 +347,7 @@ class Fusion360CommandBase:
 
                 on_command_created_handler = self.get_create_event()
                 cmd_definition.commandCreated.add(on_command_created_handler)
-                handlers.append(on_command_created_handler)
+                handler_registry.add((self.cmd_id, 'definition'), on_command_created_handler)
 
                 new_control = controls_to_add_to.addCommand(cmd_definition)
 
@@ -283,6 +390,11 @@ class Fusion360CommandBase:
             destroy_object(cmd_control)
             destroy_object(cmd_definition)
 
+            handler_registry.release((self.cmd_id, 'definition'))
+            handler_registry.release((self.cmd_id, 'dialog'))
+
+            close_debug_logs()
+
             if self.add_to_drop_down:
                 if drop_down_control.controls.count == 0:
                     drop_down_definition = command_definition_by_id(self.drop_down_cmd_id, ui)
@@ -295,6 +407,41 @@ class Fusion360CommandBase:
                 ui.messageBox('AddIn Stop Failed: {}'.format(traceback.format_exc()))
 
 
+# Command whose class is only imported when its dialog first opens, so add-in startup skips the import
+# cmd_def['module'] and cmd_def['class_name'] name the real command, cmd_def['package'] anchors a relative module
+# Every event is passed on to the real command, palette commands are not supported
+class LazyCommand(Fusion360CommandBase):
+    def __init__(self, cmd_def, debug):
+        super().__init__(cmd_def, debug)
+
+        self.cmd_def = cmd_def
+        self.command = None
+
+    # The real command, imported and built on first use
+    def loaded_command(self):
+        if self.command is None:
+            module = importlib.import_module(self.cmd_def['module'], self.cmd_def.get('package'))
+            self.command = getattr(module, self.cmd_def['class_name'])(self.cmd_def, self.debug)
+
+        return self.command
+
+    def on_create(self, command: adsk.core.Command, inputs: adsk.core.CommandInputs):
+        self.loaded_command().on_create(command, inputs)
+
+    def on_preview(self, command: adsk.core.Command, inputs: adsk.core.CommandInputs, args, input_values):
+        self.loaded_command().on_preview(command, inputs, args, input_values)
+
+    def on_input_changed(self, command: adsk.core.Command, inputs: adsk.core.CommandInputs, changed_input,
+                         input_values):
+        self.loaded_command().on_input_changed(command, inputs, changed_input, input_values)
+
+    def on_execute(self, command: adsk.core.Command, inputs: adsk.core.CommandInputs, args, input_values):
+        self.loaded_command().on_execute(command, inputs, args, input_values)
+
+    def on_destroy(self, command: adsk.core.Command, inputs: adsk.core.CommandInputs, reason, input_values):
+        self.loaded_command().on_destroy(command, inputs, reason, input_values)
+
+
 # Base Class for creating Fusion 360 Commands
 class Fusion360PaletteCommandBase(Fusion360CommandBase):
     def __init__(self, cmd_def, debug):
@@ -327,6 +474,7 @@ class Fusion360PaletteCommandBase(Fusion360CommandBase):
 
         if palette:
             destroy_object(palette)
+        handler_registry.release((self.palette_id, 'palette'))
         super().on_stop()
 
 
@@ -335,6 +483,7 @@ class ExecutePreviewHandler(adsk.core.CommandEventHandler):
         super().__init__()
         self.cmd_object_ = cmd_object
         self.args = None
+        self.last_change = None
 
     def notify(self, args):
         app = adsk.core.Application.cast(adsk.core.Application.get())
@@ -344,11 +493,12 @@ class ExecutePreviewHandler(adsk.core.CommandEventHandler):
 
             command_ = args.firingEvent.sender
             command_inputs = command_.commandInputs
-            if self.cmd_object_.debug:
-                ui.messageBox('***Debug *** Preview: {} execute preview event triggered'.
-                              format(command_.parentCommandDefinition.id))
-            input_values = get_inputs(command_inputs)
+            input_values = get_inputs(command_inputs, self.cmd_object_.changed_since(self.last_change))
+            self.last_change = self.cmd_object_.change_count
+
+            start = time.perf_counter()
             self.cmd_object_.on_preview(command_, command_inputs, args, input_values)
+            self.cmd_object_.debug_event('preview', input_values.changed, time.perf_counter() - start)
 
         except:
             if ui:
@@ -359,6 +509,7 @@ class DestroyHandler(adsk.core.CommandEventHandler):
     def __init__(self, cmd_object):
         super().__init__()
         self.cmd_object_ = cmd_object
+        self.last_change = None
 
     def notify(self, args):
         app = adsk.core.Application.cast(adsk.core.Application.get())
@@ -369,13 +520,18 @@ class DestroyHandler(adsk.core.CommandEventHandler):
             command_inputs = command_.commandInputs
             reason_ = args.terminationReason
 
-            if self.cmd_object_.debug:
-                ui.messageBox('***Debug ***Command: {} destroyed'.format(command_.parentCommandDefinition.id))
-                ui.messageBox("***Debug ***Reason for termination= " + str(reason_))
-
-            input_values = get_inputs(command_inputs)
+            input_values = get_inputs(command_inputs, self.cmd_object_.changed_since(self.last_change))
+            self.last_change = self.cmd_object_.change_count
 
+            start = time.perf_counter()
             self.cmd_object_.on_destroy(command_, command_inputs, reason_, input_values)
+            seconds = time.perf_counter() - start
+
+            # The dialog is gone, its handlers (this one included) can be released
+            handler_registry.release((self.cmd_object_.cmd_id, 'dialog'))
+
+            self.cmd_object_.debug_event('destroy', input_values.changed, seconds, reason=reason_,
+                                         live_handlers=live_handler_count())
 
         except:
             if ui:
@@ -396,13 +552,12 @@ class InputChangedHandler(adsk.core.InputChangedEventHandler):
             command_inputs = command_.commandInputs
             changed_input = args.input
 
-            if self.cmd_object_.debug:
-                ui.messageBox('***Debug Input: {} changed event triggered'.format(command_.parentCommandDefinition.id))
-                ui.messageBox('***Debug The Input: {} was the command'.format(changed_input.id))
-
-            input_values = get_inputs(command_inputs)
+            self.cmd_object_.note_input_change(changed_input.id)
+            input_values = get_inputs(command_inputs, frozenset([changed_input.id]))
 
+            start = time.perf_counter()
             self.cmd_object_.on_input_changed(command_, command_inputs, changed_input, input_values)
+            self.cmd_object_.debug_event('input_changed', input_values.changed, time.perf_counter() - start)
 
         except:
             if ui:
@@ -413,6 +568,7 @@ class CommandExecuteHandler(adsk.core.CommandEventHandler):
     def __init__(self, cmd_object):
         super().__init__()
         self.cmd_object_ = cmd_object
+        self.last_change = None
 
     def notify(self, args):
         try:
@@ -421,12 +577,12 @@ class CommandExecuteHandler(adsk.core.CommandEventHandler):
             command_ = args.firingEvent.sender
             command_inputs = command_.commandInputs
 
-            if self.cmd_object_.debug:
-                ui.messageBox('***Debug command: {} executed successfully'.format(command_.parentCommandDefinition.id))
-
-            input_values = get_inputs(command_inputs)
+            input_values = get_inputs(command_inputs, self.cmd_object_.changed_since(self.last_change))
+            self.last_change = self.cmd_object_.change_count
 
+            start = time.perf_counter()
             self.cmd_object_.on_execute(command_, command_inputs, args, input_values)
+            self.cmd_object_.debug_event('execute', input_values.changed, time.perf_counter() - start)
 
         except:
             if ui:
@@ -443,31 +599,37 @@ class CommandCreatedEventHandler(adsk.core.CommandCreatedEventHandler):
         ui = app.userInterface
 
         try:
-            global handlers
-
             command_ = args.command
             inputs_ = command_.commandInputs
 
+            # Only one dialog of a command is open at a time, anything left from an earlier one is stale
+            scope = (self.cmd_object_.cmd_id, 'dialog')
+            handler_registry.release(scope)
+
+            # A new dialog starts without changes
+            self.cmd_object_.input_changes = {}
+            self.cmd_object_.change_count = 0
+
             on_execute_handler = CommandExecuteHandler(self.cmd_object_)
             command_.execute.add(on_execute_handler)
-            handlers.append(on_execute_handler)
+            handler_registry.add(scope, on_execute_handler)
 
             on_input_changed_handler = InputChangedHandler(self.cmd_object_)
             command_.inputChanged.add(on_input_changed_handler)
-            handlers.append(on_input_changed_handler)
+            handler_registry.add(scope, on_input_changed_handler)
 
             on_destroy_handler = DestroyHandler(self.cmd_object_)
             command_.destroy.add(on_destroy_handler)
-            handlers.append(on_destroy_handler)
+            handler_registry.add(scope, on_destroy_handler)
 
             on_execute_preview_handler = ExecutePreviewHandler(self.cmd_object_)
             command_.executePreview.add(on_execute_preview_handler)
-            handlers.append(on_execute_preview_handler)
-
-            if self.cmd_object_.debug:
-                ui.messageBox('***Debug ***Panel command created successfully')
+            handler_registry.add(scope, on_execute_preview_handler)
 
+            start = time.perf_counter()
             self.cmd_object_.on_create(command_, inputs_)
+            self.cmd_object_.debug_event('create', None, time.perf_counter() - start,
+                                         live_handlers=live_handler_count())
 
         except:
             if ui:
@@ -484,19 +646,20 @@ class PaletteCommandCreatedEventHandler(adsk.core.CommandCreatedEventHandler):
         ui = app.userInterface
 
         try:
-            global handlers
-
             command_ = args.command
             inputs_ = command_.commandInputs
 
+            scope = (self.cmd_object_.cmd_id, 'dialog')
+            handler_registry.release(scope)
+
             on_execute_handler = PaletteCommandExecuteHandler(self.cmd_object_)
             command_.execute.add(on_execute_handler)
-            handlers.append(on_execute_handler)
-
-            if self.cmd_object_.debug:
-                ui.messageBox('***Debug *** Palette Panel command created successfully')
+            handler_registry.add(scope, on_execute_handler)
 
+            start = time.perf_counter()
             self.cmd_object_.on_create(command_, inputs_)
+            self.cmd_object_.debug_event('palette_create', None, time.perf_counter() - start,
+                                         live_handlers=live_handler_count())
 
         except:
             if ui:
@@ -513,9 +676,7 @@ class PaletteCommandExecuteHandler(adsk.core.CommandEventHandler):
             app = adsk.core.Application.cast(adsk.core.Application.get())
             ui = app.userInterface
 
-            if self.cmd_object_.debug:
-                ui.messageBox('***Debug command: {} executed successfully'.format(
-                    self.cmd_object_.parentCommandDefinition.id))
+            start = time.perf_counter()
 
             # Create and display the palette.
             palette = ui.palettes.itemById(self.cmd_object_.palette_id)
@@ -533,16 +694,17 @@ class PaletteCommandExecuteHandler(adsk.core.CommandEventHandler):
                 # Add handler to HTMLEvent of the palette.
                 on_html_event_handler = HTMLEventHandler(self.cmd_object_)
                 palette.incomingFromHTML.add(on_html_event_handler)
-                handlers.append(on_html_event_handler)
+                handler_registry.add((self.cmd_object_.palette_id, 'palette'), on_html_event_handler)
 
                 # Add handler to CloseEvent of the palette.
                 on_closed_handler = CloseEventHandler(self.cmd_object_)
                 palette.closed.add(on_closed_handler)
-                handlers.append(on_closed_handler)
+                handler_registry.add((self.cmd_object_.palette_id, 'palette'), on_closed_handler)
             else:
                 palette.isVisible = True
 
             self.cmd_object_.on_palette_execute(palette)
+            self.cmd_object_.debug_event('palette_execute', None, time.perf_counter() - start)
         except:
             if ui:
                 ui.messageBox('command executed failed: {}'.format(traceback.format_exc()))
@@ -588,6 +750,8 @@ class CloseEventHandler(adsk.core.UserInterfaceGeneralEventHandler):
                 # _ui.messageBox('Close button is clicked.')
             self.cmd_object_.on_palette_close()
 
+            handler_registry.release((self.cmd_object_.palette_id, 'palette'))
+
         except:
             ui.messageBox('Failed:\n{}'.format(traceback.format_exc()))
 
@@ -598,44 +762,77 @@ class MyDocumentActivatedHandler(adsk.core.DocumentEventHandler):
 
         super().__init__()
 
-        # self.execution_function = execution_function
+        self.execution_function = execution_function
 
     def notify(self, args):
         app = adsk.core.Application.cast(adsk.core.Application.get())
         ui = app.userInterface
-        ui.messageBox("here")
-        event_args = adsk.core.DocumentEventArgs.cast(args)
 
-        # self.execution_function(event_args)
+        try:
+            event_args = adsk.core.DocumentEventArgs.cast(args)
+
+            self.execution_function(event_args)
 
-        # Code to react to the event.
-        ui.messageBox('In MyDocumentActivatedHandler event handler.')
+        except:
+            if ui:
+                ui.messageBox('Document activated event failed: {}'.format(traceback.format_exc()))
 
 
+# Calls execution_function(event_args) whenever a document is activated
+# Returns the handler, pass it to remove_document_event to stop
 def create_document_event(execution_function):
     app = adsk.core.Application.cast(adsk.core.Application.get())
     # "application_var" is a variable referencing an Application object.
     on_document_activated = MyDocumentActivatedHandler(execution_function)
     app.documentActivated.add(on_document_activated)
-    handlers.append(on_document_activated)
+    handler_registry.add('session', on_document_activated)
+
+    return on_document_activated
+
+
+def remove_document_event(on_document_activated):
+    app = adsk.core.Application.cast(adsk.core.Application.get())
+    app.documentActivated.remove(on_document_activated)
+
+    handler_registry.discard('session', on_document_activated)
+
 
 # Event handler for the workspaceActivated event.
 class MyWorkspaceActivatedHandler(adsk.core.WorkspaceEventHandler):
-    def __init__(self):
+    def __init__(self, execution_function):
         super().__init__()
+
+        self.execution_function = execution_function
+
     def notify(self, args):
         app = adsk.core.Application.cast(adsk.core.Application.get())
         ui = app.userInterface
-        eventArgs = adsk.core.WorkspaceEventArgs.cast(args)
 
-        # Code to react to the event.
-        ui.messageBox('In MyWorkspaceActivatedHandler event handler.')
+        try:
+            event_args = adsk.core.WorkspaceEventArgs.cast(args)
+
+            self.execution_function(event_args)
+
+        except:
+            if ui:
+                ui.messageBox('Workspace activated event failed: {}'.format(traceback.format_exc()))
 
 
+# Calls execution_function(event_args) whenever a workspace is activated
+# Returns the handler, pass it to remove_workspace_event to stop
 def create_workspace_event(execution_function):
     app = adsk.core.Application.cast(adsk.core.Application.get())
     ui = app.userInterface
     # "userInterface_var" is a variable referencing a UserInterface object.
-    onWorkspaceActivated = MyWorkspaceActivatedHandler()
-    ui.workspaceActivated.add(onWorkspaceActivated)
-    handlers.append(onWorkspaceActivated)
+    on_workspace_activated = MyWorkspaceActivatedHandler(execution_function)
+    ui.workspaceActivated.add(on_workspace_activated)
+    handler_registry.add('session', on_workspace_activated)
+
+    return on_workspace_activated
+
+
+def remove_workspace_event(on_workspace_activated):
+    app = adsk.core.Application.cast(adsk.core.Application.get())
+    app.userInterface.workspaceActivated.remove(on_workspace_activated)
+
+    handler_registry.discard('session', on_workspace_activated)
@@ -3,12 +3,22 @@ __author__ = 'rainsbp'
 import time
 import os
 from os.path import expanduser
+import collections
+import threading
+import json
 
 import adsk.core
 import adsk.fusion
 import traceback
 
 
+# Unwritten entries kept by a debug log, the oldest are dropped when it is full
+DEBUG_LOG_CAPACITY = 10000
+
+# Seconds between background writes of a debug log
+DEBUG_LOG_FLUSH_SECONDS = 1.0
+
+
 # Print a list of list of variables
 # Format of variables should be [[Variable name 1, variable value 1], [Variable name 2, variable value 2], ...]
 def variables_message(variables: list):
@@ -91,3 +101,111 @@ def get_log_file_name():
     log_file_name = home + 'FusionDebugUtilities-PerfLog-' + time_stamp + '.csv'
     return log_file_name
 
+
+
+# Class for a non blocking debug log.  Entries go into a ring buffer and a background thread appends them
+# to the log file as JSON lines, so debug mode never waits on a dialog or on the disk.
+# Entries can also be streamed to HTML palettes, which receive them as 'debug' events.
+# Entries lost to a full buffer are counted, the next write adds a 'dropped' entry with their number.
+class DebugLog(object):
+
+    def __init__(self, file_name, palette_id=None, capacity=None, flush_seconds=None):
+        self.file_name = file_name
+        self.palette_ids = []
+        self.flush_seconds = flush_seconds or DEBUG_LOG_FLUSH_SECONDS
+
+        self.unwritten = collections.deque(maxlen=capacity or DEBUG_LOG_CAPACITY)
+        self.dropped = 0
+        self.written_dropped = 0
+
+        if palette_id:
+            self.stream_to(palette_id)
+
+        self.write_lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._write_loop, name='DebugLog', daemon=True)
+        self.thread.start()
+
+    # Records an event, only touches memory (and the palette if one is streamed to)
+    def log(self, event, cmd_id, input_ids=None, seconds=None, **details):
+        entry = {
+            "time": time.time(),
+            "event": event,
+            "command": cmd_id,
+            "inputs": None if input_ids is None else sorted(input_ids),
+            "seconds": seconds,
+        }
+        entry.update(details)
+
+        if len(self.unwritten) == self.unwritten.maxlen:
+            self.dropped += 1
+
+        self.unwritten.append(entry)
+
+        for palette_id in self.palette_ids:
+            palette = adsk.core.Application.get().userInterface.palettes.itemById(palette_id)
+            if palette:
+                palette.sendInfoToHTML('debug', json.dumps(entry, default=str))
+
+    # Adds a palette that receives every later entry
+    def stream_to(self, palette_id):
+        if palette_id not in self.palette_ids:
+            self.palette_ids.append(palette_id)
+
+    # Appends the unwritten entries to the log file, after a count of the entries dropped since the last write
+    def flush(self):
+        with self.write_lock:
+            lines = []
+
+            dropped = self.dropped
+            if dropped > self.written_dropped:
+                lines.append(json.dumps({"time": time.time(), "event": "dropped",
+                                         "count": dropped - self.written_dropped}) + '\n')
+                self.written_dropped = dropped
+
+            while self.unwritten:
+                lines.append(json.dumps(self.unwritten.popleft(), default=str) + '\n')
+
+            if lines:
+                with open(self.file_name, 'a') as log_file:
+                    log_file.writelines(lines)
+
+    def _write_loop(self):
+        while not self.stopping.wait(self.flush_seconds):
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    # Stops the background writer and writes what is left
+    def close(self):
+        self.stopping.set()
+        self.thread.join()
+        self.flush()
+
+
+# Debug logs of the running add-ins by app name
+_debug_logs = {}
+
+
+# Shared debug log of an app, written to the app's log directory
+# Every palette id passed in is streamed to, so each command can add its own palette
+def debug_log(app_name, palette_id=None):
+    if app_name not in _debug_logs:
+        from .Fusion360Utilities import get_log_file_name
+
+        file_name = os.path.splitext(get_log_file_name(app_name))[0] + '-debug.jsonl'
+        _debug_logs[app_name] = DebugLog(file_name)
+
+    log = _debug_logs[app_name]
+    if palette_id:
+        log.stream_to(palette_id)
+
+    return log
+
+
+# Writes and closes every debug log
+def close_debug_logs():
+    for log in _debug_logs.values():
+        log.close()
+    _debug_logs.clear()
@@ -0,0 +1,281 @@
+import time
+
+import numpy as np
+
+
+# Ray direction for parity tests, skewed off the axes so rays rarely graze mesh edges
+_RAY_DIRECTION = np.array([1.0, 0.000137, 0.000291]) / np.linalg.norm([1.0, 0.000137, 0.000291])
+
+
+def _dot(a, b):
+    return np.einsum('ij,ij->i', a, b)
+
+
+def _ray_triangle_hits(origins, a, b, c):
+    """
+    Moller-Trumbore test of rays along _RAY_DIRECTION against triangles, one ray per triangle
+    :return: True where the ray crosses the triangle in front of its origin
+    :rtype: numpy.ndarray
+    """
+    edge_1 = b - a
+    edge_2 = c - a
+    p = np.cross(_RAY_DIRECTION, edge_2)
+    det = _dot(edge_1, p)
+    parallel = np.abs(det) < 1e-14
+    inv_det = 1.0 / np.where(parallel, 1.0, det)
+
+    s = origins - a
+    u = _dot(s, p) * inv_det
+    q = np.cross(s, edge_1)
+    v = (q @ _RAY_DIRECTION) * inv_det
+    t = _dot(edge_2, q) * inv_det
+
+    return ~parallel & (u >= 0) & (v >= 0) & (u + v <= 1) & (t > 0)
+
+
+def _point_triangle_distance_sq(p, a, b, c):
+    """
+    Squared distance from points to triangles, one point per triangle (Ericson, Real-Time Collision Detection)
+    :rtype: numpy.ndarray
+    """
+    ab = b - a
+    ac = c - a
+    d1 = _dot(ab, p - a)
+    d2 = _dot(ac, p - a)
+    d3 = _dot(ab, p - b)
+    d4 = _dot(ac, p - b)
+    d5 = _dot(ab, p - c)
+    d6 = _dot(ac, p - c)
+
+    va = d3 * d6 - d5 * d4
+    vb = d5 * d2 - d1 * d6
+    vc = d1 * d4 - d3 * d2
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denom = va + vb + vc
+        v = np.where(denom != 0, vb / denom, 0)
+        w = np.where(denom != 0, vc / denom, 0)
+        closest = a + ab * v[:, None] + ac * w[:, None]
+
+        # Regions in reverse priority, later regions override earlier ones
+        in_bc = (va <= 0) & (d4 - d3 >= 0) & (d5 - d6 >= 0)
+        w_bc = np.where(in_bc, (d4 - d3) / ((d4 - d3) + (d5 - d6)), 0)
+        closest = np.where(in_bc[:, None], b + (c - b) * w_bc[:, None], closest)
+
+        in_ac = (vb <= 0) & (d2 >= 0) & (d6 <= 0)
+        w_ac = np.where(in_ac, d2 / (d2 - d6), 0)
+        closest = np.where(in_ac[:, None], a + ac * w_ac[:, None], closest)
+
+        closest = np.where(((d6 >= 0) & (d5 <= d6))[:, None], c, closest)
+
+        in_ab = (vc <= 0) & (d1 >= 0) & (d3 <= 0)
+        v_ab = np.where(in_ab, d1 / (d1 - d3), 0)
+        closest = np.where(in_ab[:, None], a + ab * v_ab[:, None], closest)
+
+        closest = np.where(((d3 >= 0) & (d4 <= d3))[:, None], b, closest)
+        closest = np.where(((d1 <= 0) & (d2 <= 0))[:, None], a, closest)
+
+    offset = p - closest
+    return _dot(offset, offset)
+
+
+def _box_distance_sq(points, box_min, box_max):
+    gap = np.maximum(np.maximum(box_min - points, points - box_max), 0)
+    return _dot(gap, gap)
+
+
+class MeshBVH(object):
+    """
+    Bounding volume hierarchy over a closed triangle mesh for batched point queries
+    :param vertices: Vertex coordinates (n x 3)
+    :type vertices: numpy.ndarray
+    :param triangles: Triangle vertex indices (m x 3)
+    :type triangles: numpy.ndarray
+    :param leaf_size: Maximum number of triangles in a leaf
+    :type leaf_size: int
+    :param chunk_size: Number of points traversed together, bounds the working memory of a query
+    :type chunk_size: int
+    :raises ValueError: If the mesh has no triangles
+    """
+
+    def __init__(self, vertices, triangles, leaf_size=8, chunk_size=4096):
+        triangles = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+        if len(triangles) == 0:
+            raise ValueError('MeshBVH needs at least one triangle')
+
+        self.corners = np.asarray(vertices, dtype=np.float64)[triangles]
+        self.chunk_size = chunk_size
+
+        centroids = self.corners.mean(axis=1)
+        order = np.arange(len(self.corners))
+
+        box_min, box_max, children, starts, counts = [], [], [], [], []
+
+        # Top down median split on the longest axis of the centroid bounds
+        stack = [(0, len(order), -1, 0)]
+        while stack:
+            start, end, parent, side = stack.pop()
+            node = len(starts)
+            if parent >= 0:
+                children[parent][side] = node
+
+            node_corners = self.corners[order[start:end]]
+            box_min.append(node_corners.min(axis=(0, 1)))
+            box_max.append(node_corners.max(axis=(0, 1)))
+            children.append([-1, -1])
+            starts.append(start)
+            counts.append(end - start)
+
+            if end - start > leaf_size:
+                node_centroids = centroids[order[start:end]]
+                axis = np.argmax(node_centroids.max(axis=0) - node_centroids.min(axis=0))
+                middle = (end - start) // 2
+                split = np.argpartition(node_centroids[:, axis], middle)
+                order[start:end] = order[start:end][split]
+                stack.append((start + middle, end, node, 1))
+                stack.append((start, start + middle, node, 0))
+
+        self.corners = self.corners[order]
+        self.box_min = np.array(box_min)
+        self.box_max = np.array(box_max)
+        self.children = np.array(children, dtype=np.int64)
+        self.starts = np.array(starts, dtype=np.int64)
+        self.counts = np.array(counts, dtype=np.int64)
+        self.is_leaf = self.children[:, 0] < 0
+
+    def _leaf_pairs(self, point_ids, nodes):
+        """
+        Expands (point, leaf) pairs into (point, triangle) pairs
+        """
+        counts = self.counts[nodes]
+        pair_points = np.repeat(point_ids, counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        pair_triangles = np.repeat(self.starts[nodes], counts) + local
+        return pair_points, pair_triangles
+
+    def _contains_chunk(self, points):
+        crossings = np.zeros(len(points), dtype=np.int64)
+        inv_direction = 1.0 / _RAY_DIRECTION
+
+        point_ids = np.arange(len(points))
+        nodes = np.zeros(len(points), dtype=np.int64)
+
+        while len(nodes):
+            # Slab test of each ray against its node box
+            t_1 = (self.box_min[nodes] - points[point_ids]) * inv_direction
+            t_2 = (self.box_max[nodes] - points[point_ids]) * inv_direction
+            t_near = np.minimum(t_1, t_2).max(axis=1)
+            t_far = np.maximum(t_1, t_2).min(axis=1)
+            hit = (t_far >= np.maximum(t_near, 0))
+            point_ids, nodes = point_ids[hit], nodes[hit]
+
+            leaf = self.is_leaf[nodes]
+            pair_points, pair_triangles = self._leaf_pairs(point_ids[leaf], nodes[leaf])
+            if len(pair_points):
+                tri = self.corners[pair_triangles]
+                crosses = _ray_triangle_hits(points[pair_points], tri[:, 0], tri[:, 1], tri[:, 2])
+                np.add.at(crossings, pair_points[crosses], 1)
+
+            point_ids = np.repeat(point_ids[~leaf], 2)
+            nodes = self.children[nodes[~leaf]].ravel()
+
+        return crossings % 2 == 1
+
+    def _distance_chunk(self, points):
+        # Greedy descent to a nearby leaf gives each point an upper bound to prune with
+        nodes = np.zeros(len(points), dtype=np.int64)
+        while not self.is_leaf[nodes].all():
+            inner = ~self.is_leaf[nodes]
+            left, right = self.children[nodes[inner]].T
+            left_d = _box_distance_sq(points[inner], self.box_min[left], self.box_max[left])
+            right_d = _box_distance_sq(points[inner], self.box_min[right], self.box_max[right])
+            nodes[inner] = np.where(left_d <= right_d, left, right)
+
+        best = np.full(len(points), np.inf)
+        pair_points, pair_triangles = self._leaf_pairs(np.arange(len(points)), nodes)
+        tri = self.corners[pair_triangles]
+        np.minimum.at(best, pair_points,
+                      _point_triangle_distance_sq(points[pair_points], tri[:, 0], tri[:, 1], tri[:, 2]))
+
+        point_ids = np.arange(len(points))
+        nodes = np.zeros(len(points), dtype=np.int64)
+
+        while len(nodes):
+            near = _box_distance_sq(points[point_ids], self.box_min[nodes], self.box_max[nodes]) < best[point_ids]
+            point_ids, nodes = point_ids[near], nodes[near]
+
+            leaf = self.is_leaf[nodes]
+            pair_points, pair_triangles = self._leaf_pairs(point_ids[leaf], nodes[leaf])
+            if len(pair_points):
+                tri = self.corners[pair_triangles]
+                np.minimum.at(best, pair_points,
+                              _point_triangle_distance_sq(points[pair_points], tri[:, 0], tri[:, 1], tri[:, 2]))
+
+            point_ids = np.repeat(point_ids[~leaf], 2)
+            nodes = self.children[nodes[~leaf]].ravel()
+
+        return np.sqrt(best)
+
+    def _chunked(self, query, points):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        results = [query(points[i:i + self.chunk_size]) for i in range(0, len(points), self.chunk_size)]
+        if not results:
+            return query(points)
+        return np.concatenate(results)
+
+    def contains(self, points):
+        """
+        Inside / outside classification by ray parity
+        :param points: Query points (n x 3)
+        :type points: numpy.ndarray
+        :return: True for points inside the mesh
+        :rtype: numpy.ndarray
+        """
+        return self._chunked(self._contains_chunk, points)
+
+    def distance(self, points):
+        """
+        Unsigned distance to the mesh surface
+        :param points: Query points (n x 3)
+        :type points: numpy.ndarray
+        :rtype: numpy.ndarray
+        """
+        return self._chunked(self._distance_chunk, points)
+
+    def signed_distance(self, points):
+        """
+        Distance to the mesh surface, negative inside
+        :param points: Query points (n x 3)
+        :type points: numpy.ndarray
+        :rtype: numpy.ndarray
+        """
+        return np.where(self.contains(points), -1.0, 1.0) * self.distance(points)
+
+
+def benchmark_mesh_bvh(vertices, triangles, point_count=100000, seed=0):
+    """
+    Measures BVH build time and query throughput for random points in the mesh bounding box
+    :return: Timings and throughput in points per second
+    :rtype: dict
+    """
+    points = np.random.default_rng(seed).uniform(vertices.min(axis=0), vertices.max(axis=0), (point_count, 3))
+
+    start = time.perf_counter()
+    bvh = MeshBVH(vertices, triangles)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    bvh.contains(points)
+    contains_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    bvh.distance(points)
+    distance_time = time.perf_counter() - start
+
+    return {
+        "triangles": len(triangles),
+        "points": point_count,
+        "build_seconds": build_time,
+        "contains_points_per_second": point_count / contains_time,
+        "distance_points_per_second": point_count / distance_time,
+    }
@@ -0,0 +1,52 @@
+import adsk.core
+import adsk.fusion
+
+import numpy as np
+
+
+def body_mesh(body,
+              quality=adsk.fusion.TriangleMeshQualityOptions.LowQualityTriangleMesh):
+    """
+    Calculates a triangle mesh of a body (or a single face) and returns it as NumPy arrays
+    :param body: The body or face to mesh
+    :type body: adsk.fusion.BRepBody or adsk.fusion.BRepFace
+    :param quality: The mesh quality from enumerator
+    :type quality: adsk.fusion.TriangleMeshQualityOptions
+    :return: Vertex coordinates (n x 3, cm) and triangle vertex indices (m x 3)
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    calculator = body.meshManager.createMeshCalculator()
+    calculator.setQuality(quality)
+    mesh = calculator.calculate()
+
+    vertices = np.array(mesh.nodeCoordinatesAsDouble, dtype=np.float64).reshape(-1, 3)
+    triangles = np.array(mesh.nodeIndices, dtype=np.int64).reshape(-1, 3)
+
+    return vertices, triangles
+
+
+def write_binary_stl(file_name, triangles, scale=10.0):
+    """
+    Writes triangles to a binary STL file
+    :param file_name: The full path of the STL file
+    :type file_name: str
+    :param triangles: Triangle corners (m x 3 x 3, cm), wound counter clockwise seen from outside
+    :type triangles: numpy.ndarray
+    :param scale: Scale applied to the coordinates, the default writes millimeters
+    :type scale: float
+    """
+    triangles = np.asarray(triangles, dtype=np.float64) * scale
+
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    lengths = np.linalg.norm(normals, axis=1)
+    normals /= np.where(lengths > 0, lengths, 1.0)[:, None]
+
+    records = np.zeros(len(triangles), dtype=[('normal', '<f4', (3,)), ('corners', '<f4', (3, 3)),
+                                              ('attribute', '<u2')])
+    records['normal'] = normals
+    records['corners'] = triangles
+
+    with open(file_name, 'wb') as f:
+        f.write(b'Fusion 360 Filler'.ljust(80, b' '))
+        f.write(np.uint32(len(triangles)).tobytes())
+        f.write(records.tobytes())
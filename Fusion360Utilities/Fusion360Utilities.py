@@ -7,74 +7,100 @@ import uuid
 from typing import Optional, List
 
 import os
+import sys
+import ctypes
 from os.path import expanduser
 import json
 
 import time
 
 
+# Application objects shared by every AppObjects of the session
+# Cleared by clear_app_objects when another document or workspace is activated
+_app_session = {}
+
+
+# Drops the cached application objects, the next AppObjects looks them up again
+def clear_app_objects(event_args=None):
+    _app_session.clear()
+
+
 # Class to quickly access Fusion Application Objects
+# Lookups are cached for the session, so constructing it in every function is cheap
 class AppObjects(object):
 
     def __init__(self):
 
-        self.app = adsk.core.Application.cast(adsk.core.Application.get())
+        # A closed document invalidates the cache even if no activation event was seen
+        if not _app_session or not _app_session['document'].isValid:
+            _app_session.clear()
+
+            app = adsk.core.Application.cast(adsk.core.Application.get())
+            _app_session.update({
+                "app": app,
+                "import_manager": app.importManager,
+                "ui": app.userInterface,
+                "document": app.activeDocument,
+                "product": app.activeProduct,
+            })
+
+        self.app = _app_session['app']
 
         # Get import manager
-        self.import_manager = self.app.importManager
+        self.import_manager = _app_session['import_manager']
 
         # Get User Interface
-        self.ui = self.app.userInterface
+        self.ui = _app_session['ui']
 
-        self.document = self.app.activeDocument
-        self.product = self.app.activeProduct
+        self.document = _app_session['document']
+        self.product = _app_session['product']
 
         self._design = self.design
 
+    # Value of a lookup, computed once per session
+    @staticmethod
+    def _cached(key, lookup):
+        if key not in _app_session:
+            _app_session[key] = lookup()
+
+        return _app_session[key]
+
     @property
     def design(self) -> Optional[adsk.fusion.Design]:
-        design_ = self.document.products.itemByProductType('DesignProductType')
-        if design_ is not None:
-            return design_
-        else:
-            return None
+        return self._cached('design', lambda: self.document.products.itemByProductType('DesignProductType'))
 
     @property
     def cam(self) -> Optional[adsk.cam.CAM]:
-        cam_ = self.document.products.itemByProductType('CAMProductType')
-        if cam_ is not None:
-            return cam_
-        else:
-            return None
+        return self._cached('cam', lambda: self.document.products.itemByProductType('CAMProductType'))
 
     @property
     def units_manager(self) -> Optional[adsk.core.UnitsManager]:
-        if self.product.productType == 'DesignProductType':
-            units_manager_ = self._design.fusionUnitsManager
-        else:
-            units_manager_ = self.product.unitsManager
+        def lookup():
+            if self.product.productType == 'DesignProductType':
+                return self._design.fusionUnitsManager
+            else:
+                return self.product.unitsManager
 
-        if units_manager_ is not None:
-            return units_manager_
-        else:
-            return None
+        return self._cached('units_manager', lookup)
 
     @property
     def export_manager(self) -> Optional[adsk.fusion.ExportManager]:
         if self._design is not None:
-            export_manager_ = self._design.exportManager
-            return export_manager_
+            return self._cached('export_manager', lambda: self._design.exportManager)
         else:
             return None
 
     @property
     def root_comp(self) -> Optional[adsk.fusion.Component]:
-        if self.product.productType == 'DesignProductType':
-            root_comp_ = self.design.rootComponent
-            return root_comp_
-        else:
-            return None
+        def lookup():
+            if self.product.productType == 'DesignProductType':
+                return self.design.rootComponent
+            else:
+                return None
+
+        return self._cached('root_comp', lookup)
 
+    # Not cached, the design type can change without an activation event
     @property
     def time_line(self) -> Optional[adsk.fusion.Timeline]:
         if self.product.productType == 'DesignProductType':
@@ -209,7 +235,8 @@ def sketch_by_name(sketches: adsk.fusion.Sketches, name: str) -> adsk.fusion.Ske
     return return_sketch
 
 
-def extrude_all_profiles(sketch, distance, component, operation) -> adsk.fusion.ExtrudeFeature:
+def extrude_all_profiles(sketch, distance, component, operation,
+                         participant_bodies=None) -> adsk.fusion.ExtrudeFeature:
     """
     Create extrude features of all profiles in a sketch
     The new feature will be created in the given target component and extruded by a distance
@@ -221,6 +248,8 @@ def extrude_all_profiles(sketch, distance, component, operation) -> adsk.fusion.
     :type component: adsk.fusion.Component
     :param operation: The feature operation type from enumerator.  
     :type operation: adsk.fusion.FeatureOperations
+    :param participant_bodies: Optional bodies a cut or join is limited to
+    :type participant_bodies: list
     :return: THe new extrude feature.
     :rtype: adsk.fusion.ExtrudeFeature
     """
@@ -232,6 +261,8 @@ def extrude_all_profiles(sketch, distance, component, operation) -> adsk.fusion.
     ext_input = extrudes.createInput(profile_collection, operation)
     distance_input = adsk.core.ValueInput.createByReal(distance)
     ext_input.setDistanceExtent(False, distance_input)
+    if participant_bodies is not None:
+        ext_input.participantBodies = list(participant_bodies)
     extrude_feature = extrudes.add(ext_input)
     return extrude_feature
 
@@ -252,64 +283,95 @@ def create_component(target_component, name) -> adsk.fusion.Occurrence:
     return new_occurrence
 
 
-# Creates rectangle pattern of bodies based on vectors
-def rect_body_pattern(target_component, bodies, x_axis, y_axis, x_qty, x_distance, y_qty,
-                      y_distance) -> adsk.core.ObjectCollection:
-
+# Copies a row of body groups along an axis until it has qty groups
+# The row doubles at every step (1, 2, 4 ...) and each step is a single move feature
+# groups -> list of lists of bodies, one list per pattern position
+def double_body_pattern(target_component, groups, axis, qty, distance, metrics):
     move_feats = target_component.features.moveFeatures
 
-    x_bodies = adsk.core.ObjectCollection.create()
-    all_bodies = adsk.core.ObjectCollection.create()
+    while len(groups) < qty:
+        count = min(len(groups), qty - len(groups))
 
-    for body in bodies:
-        x_bodies.add(body)
-        all_bodies.add(body)
+        # Create a collection of entities for move
+        source = adsk.core.ObjectCollection.create()
+        new_groups = []
 
-    for i in range(1, x_qty):
+        for group in groups[:count]:
+            new_group = []
+            for body in group:
+                new_body = body.copyToComponent(target_component)
+                source.add(new_body)
+                new_group.append(new_body)
+            new_groups.append(new_group)
 
-        # Create a collection of entities for move
-        x_source = adsk.core.ObjectCollection.create()
+        translation = axis.copy()
+        translation.normalize()
+        translation.scaleBy(distance * len(groups))
+        transform = adsk.core.Matrix3D.create()
+        transform.translation = translation
 
-        for body in bodies:
-            new_body = body.copyToComponent(target_component)
-            x_source.add(new_body)
-            x_bodies.add(new_body)
-            all_bodies.add(new_body)
+        move_input = move_feats.createInput(source, transform)
+        move_feats.add(move_input)
 
-        x_transform = adsk.core.Matrix3D.create()
-        x_axis.normalize()
-        x_axis.scaleBy(x_distance * i)
-        x_transform.translation = x_axis
+        metrics['move_features'] += 1
+        metrics['body_copies'] += source.count
 
-        move_input_x = move_feats.createInput(x_source, x_transform)
-        move_feats.add(move_input_x)
+        groups = groups + new_groups
 
-    for j in range(1, y_qty):
-        # Create a collection of entities for move
-        y_source = adsk.core.ObjectCollection.create()
+    return groups
 
-        for body in x_bodies:
-            new_body = body.copyToComponent(target_component)
-            y_source.add(new_body)
-            all_bodies.add(new_body)
 
-        y_transform = adsk.core.Matrix3D.create()
-        y_axis.normalize()
-        y_axis.scaleBy(y_distance * j)
-        y_transform.translation = y_axis
+# Creates rectangle pattern of bodies based on vectors
+# Copies double at every step, so an N x M pattern takes about log2(N) + log2(M) move features
+# metrics -> optional dict, receives the move feature count, body copy count and seconds
+def rect_body_pattern(target_component, bodies, x_axis, y_axis, x_qty, x_distance, y_qty,
+                      y_distance, metrics=None) -> adsk.core.ObjectCollection:
+    start = time.perf_counter()
+
+    if metrics is None:
+        metrics = {}
+    metrics.update({"move_features": 0, "body_copies": 0})
+
+    columns = double_body_pattern(target_component, [list(bodies)], x_axis, x_qty, x_distance, metrics)
+    rows = double_body_pattern(target_component, [[body for column in columns for body in column]],
+                               y_axis, y_qty, y_distance, metrics)
 
-        move_input_y = move_feats.createInput(y_source, y_transform)
-        move_feats.add(move_input_y)
+    all_bodies = adsk.core.ObjectCollection.create()
+    for row in rows:
+        for body in row:
+            all_bodies.add(body)
+
+    metrics['seconds'] = time.perf_counter() - start
 
     return all_bodies
 
 
-# Creates Combine Feature in target with all tool bodies as source
-# Specify operation as: adsk.fusion.FeatureOperations
-# target_body -> single body
-# tool_bodies -> list of bodies
-def combine_feature(target_body: adsk.fusion.BRepBody, tool_bodies: List[adsk.fusion.BRepBody],
-                    operation: adsk.fusion.FeatureOperations):
+# Times rect_body_pattern on square grids of a body, every created feature is deleted again
+# Returns one dict per grid size with the timeline feature count and seconds
+def benchmark_rect_body_pattern(body: adsk.fusion.BRepBody, sizes=(2, 4, 8, 16), distance=1.0):
+    ao = AppObjects()
+    time_line = ao.time_line
+    target_component = body.parentComponent
+
+    results = []
+    for size in sizes:
+        first = time_line.count
+        metrics = {}
+        rect_body_pattern(target_component, [body], adsk.core.Vector3D.create(1, 0, 0),
+                          adsk.core.Vector3D.create(0, 1, 0), size, distance, size, distance, metrics)
+
+        metrics.update({"size": size, "bodies": size * size, "timeline_features": time_line.count - first})
+        results.append(metrics)
+
+        for index in range(time_line.count - 1, first - 1, -1):
+            time_line.item(index).entity.deleteMe()
+
+    return results
+
+
+# Creates a single Combine Feature, a failure is recorded in result instead of raised
+def combine_chunk(target_body: adsk.fusion.BRepBody, tool_bodies: List[adsk.fusion.BRepBody],
+                  operation: adsk.fusion.FeatureOperations, result, raise_failure=False):
 
     # Get Combine Features
     combine_features = target_body.parentComponent.features.combineFeatures
@@ -318,13 +380,95 @@ def combine_feature(target_body: adsk.fusion.BRepBody, tool_bodies: List[adsk.fu
     combine_tools = adsk.core.ObjectCollection.create()
 
     for tool in tool_bodies:
-        # todo add error checking
         combine_tools.add(tool)
 
     # Create Combine Feature
-    combine_input = combine_features.createInput(target_body, combine_tools)
-    combine_input.operation = operation
-    combine_features.add(combine_input)
+    try:
+        combine_input = combine_features.createInput(target_body, combine_tools)
+        combine_input.operation = operation
+        combine_feature_ = combine_features.add(combine_input)
+
+    except RuntimeError:
+        if raise_failure:
+            raise
+        result['failed'].append(list(tool_bodies))
+        return None
+
+    result['features'].append(combine_feature_)
+    return combine_feature_
+
+
+# Creates Combine Feature in target with all tool bodies as source
+# Specify operation as: adsk.fusion.FeatureOperations
+# target_body -> single body
+# tool_bodies -> list of bodies
+# batch_size -> optional number of tools per combine feature, all tools go in one feature by default
+# pre_union -> join the tools of each batch, then join the batches pairwise in a tree,
+#              so the target is combined with one tool at the end
+# progress -> optional function(done, total) called after every chunk, return False to stop early
+# With batches, a failed feature is recorded and its tools are left as they are, the remaining batches still run.
+# Without them the single combine raises on failure, as a plain combine feature does
+# Returns the created features and the tool lists of the failed features
+def combine_feature(target_body: adsk.fusion.BRepBody, tool_bodies: List[adsk.fusion.BRepBody],
+                    operation: adsk.fusion.FeatureOperations, batch_size=None, pre_union=False, progress=None):
+
+    tool_bodies = list(tool_bodies)
+    batched = batch_size is not None or pre_union
+    batch_size = batch_size or max(len(tool_bodies), 1)
+    batches = [tool_bodies[i:i + batch_size] for i in range(0, len(tool_bodies), batch_size)]
+
+    result = {"features": [], "failed": []}
+    join = adsk.fusion.FeatureOperations.JoinFeatureOperation
+
+    # One step per chunk, with pre_union each batch, each pairwise join and the final combines
+    if pre_union:
+        total = len(batches) + max(len(batches) - 1, 0) + min(len(batches), 1)
+    else:
+        total = len(batches)
+    done = 0
+
+    def step():
+        nonlocal done
+        done += 1
+        return progress is None or progress(done, total) is not False
+
+    if pre_union:
+        # Each batch joined into its first tool, tools that fail to join are combined with the target later
+        loose = []
+        joined = []
+        for batch in batches:
+            if len(batch) > 1 and combine_chunk(batch[0], batch[1:], join, result) is None:
+                loose.extend(batch)
+            else:
+                joined.append(batch[0])
+            if not step():
+                return result
+
+        # Pairwise joins, about log2 of the batch count levels deep
+        while len(joined) > 1:
+            level = []
+            for i in range(0, len(joined) - 1, 2):
+                if combine_chunk(joined[i], [joined[i + 1]], join, result) is None:
+                    loose.append(joined[i + 1])
+                level.append(joined[i])
+                if not step():
+                    return result
+            if len(joined) % 2:
+                level.append(joined[-1])
+            joined = level
+
+        final_tools = joined + loose
+        batches = [final_tools[i:i + batch_size] for i in range(0, len(final_tools), batch_size)]
+
+        # Tools that failed to join add final chunks
+        total = done + len(batches)
+
+    for batch in batches:
+        combine_chunk(target_body, batch, operation, result, not batched)
+        if not step():
+            return result
+
+    return result
 
 
 # Get default directory
@@ -424,6 +568,38 @@ def item_id(item, app_name):
     return this_id
 
 
+# Memory counters of GetProcessMemoryInfo on Windows
+class _ProcessMemoryCounters(ctypes.Structure):
+    _fields_ = [("cb", ctypes.c_ulong), ("PageFaultCount", ctypes.c_ulong),
+                ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+
+# Current resident memory of the Fusion 360 process in bytes
+# Returns None where it can not be read without extra packages
+def process_rss() -> Optional[int]:
+    if sys.platform == 'win32':
+        counters = _ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+
+        get_current_process = ctypes.windll.kernel32.GetCurrentProcess
+        get_current_process.restype = ctypes.c_void_p
+        get_memory_info = ctypes.windll.psapi.GetProcessMemoryInfo
+        get_memory_info.argtypes = [ctypes.c_void_p, ctypes.POINTER(_ProcessMemoryCounters), ctypes.c_ulong]
+
+        if get_memory_info(get_current_process(), ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize
+        return None
+
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
 def create_progress_bar():
     ao = AppObjects()
 
@@ -1,6 +1,10 @@
-# Importing sample Fusion Command
-# Could import multiple Command definitions here
-from .FillerCommand import FillerCommand, FillerUpdateCommand
+import sys
+import time
+
+# Commands are registered lazily, their modules (and NumPy) are imported when a command dialog first opens
+# Could add multiple Command definitions here
+from .Fusion360Utilities.Fusion360CommandBase import LazyCommand, create_document_event, remove_document_event, \
+    create_workspace_event, remove_workspace_event
 
 commands = []
 command_definitions = []
@@ -15,7 +19,10 @@ cmd = {
     'workspace': 'FusionSolidEnvironment',
     'toolbar_panel_id': 'Filler',
     'command_promoted': True,
-    'class': FillerCommand,
+    'class': LazyCommand,
+    'module': '.FillerCommand',
+    'class_name': 'FillerCommand',
+    'package': __package__,
     'app_name': "FusionFiller"
 }
 command_definitions.append(cmd)
@@ -30,12 +37,16 @@ cmd = {
     'workspace': 'FusionSolidEnvironment',
     'toolbar_panel_id': 'Filler',
     'command_promoted': True,
-    'class': FillerUpdateCommand,
+    'class': LazyCommand,
+    'module': '.FillerCommand',
+    'class_name': 'FillerUpdateCommand',
+    'package': __package__,
     'app_name': "FusionFiller"
 }
 command_definitions.append(cmd)
 
-# Set to True to display various useful messages when debugging your app
+# Set to True to record every command event (inputs and timing) in a debug log next to the app logs
+# Recording doesn't block the UI, so it can stay on while timing fills
 debug = False
 
 # Don't change anything below here:
@@ -44,11 +55,39 @@ for cmd_def in command_definitions:
     commands.append(command)
 
 
+# Handlers that clear the cached application objects when the active document or product changes
+session_events = []
+
+# Seconds spent in run(), creating the command buttons
+run_seconds = None
+
+
+# Clears the application object cache, if the commands have loaded it yet
+def clear_session(event_args=None):
+    utilities = sys.modules.get(__package__ + '.Fusion360Utilities.Fusion360Utilities')
+    if utilities is not None:
+        utilities.clear_app_objects()
+
+
 def run(context):
+    global run_seconds
+    start = time.perf_counter()
+
+    clear_session()
+    session_events.append((create_document_event(clear_session), remove_document_event))
+    session_events.append((create_workspace_event(clear_session), remove_workspace_event))
+
     for run_command in commands:
         run_command.on_run()
 
+    run_seconds = time.perf_counter() - start
+
 
 def stop(context):
     for stop_command in commands:
         stop_command.on_stop()
+
+    for handler, remove_event in session_events:
+        remove_event(handler)
+    session_events.clear()
+    clear_session()
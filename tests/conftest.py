@@ -0,0 +1,11 @@
+import os
+import sys
+import types
+
+# The add-in folder is a package of relative imports, load it under its Fusion 360 name
+ADDIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if 'FusionFiller' not in sys.modules:
+    package = types.ModuleType('FusionFiller')
+    package.__path__ = [ADDIN_DIR]
+    sys.modules['FusionFiller'] = package
@@ -0,0 +1,58 @@
+import numpy as np
+
+
+# Closed, outward wound test bodies and their mass properties
+
+
+def sphere_mesh(radius=1.0, segments=64):
+    """
+    Closed UV sphere
+    """
+    rings = segments // 2
+    theta = np.linspace(0, np.pi, rings + 1)[1:-1]
+    phi = np.linspace(0, 2 * np.pi, segments, endpoint=False)
+
+    ring_points = np.stack([np.outer(np.sin(theta), np.cos(phi)),
+                            np.outer(np.sin(theta), np.sin(phi)),
+                            np.outer(np.cos(theta), np.ones(segments))], axis=-1).reshape(-1, 3)
+    vertices = np.vstack([[0, 0, 1], ring_points, [0, 0, -1]]) * radius
+    bottom = len(vertices) - 1
+
+    triangles = []
+    for j in range(segments):
+        k = (j + 1) % segments
+        triangles.append([0, 1 + j, 1 + k])
+        triangles.append([bottom, 1 + (rings - 2) * segments + k, 1 + (rings - 2) * segments + j])
+        for i in range(rings - 2):
+            a, b = 1 + i * segments + j, 1 + i * segments + k
+            c, d = a + segments, b + segments
+            triangles.append([a, c, d])
+            triangles.append([a, d, b])
+
+    return vertices, np.array(triangles, dtype=np.int64)
+
+
+def box_mesh(min_point, max_point):
+    vertices = np.array([[x, y, z] for x in (min_point[0], max_point[0])
+                         for y in (min_point[1], max_point[1])
+                         for z in (min_point[2], max_point[2])], dtype=np.float64)
+    triangles = np.array([[0, 1, 3], [0, 3, 2], [4, 6, 7], [4, 7, 5], [0, 4, 5], [0, 5, 1],
+                          [2, 3, 7], [2, 7, 6], [0, 2, 6], [0, 6, 4], [1, 5, 7], [1, 7, 3]], dtype=np.int64)
+    return vertices, triangles
+
+
+def ellipsoid_mesh(radii, segments=64):
+    vertices, triangles = sphere_mesh(1.0, segments)
+    return vertices * np.asarray(radii, dtype=np.float64), triangles
+
+
+def mesh_volume(corners):
+    """
+    Enclosed volume of triangle corners (m x 3 x 3) by the divergence theorem
+    """
+    return float(np.einsum('ij,ij->i', corners[:, 0], np.cross(corners[:, 1], corners[:, 2])).sum() / 6)
+
+
+def mesh_area(corners):
+    return float(np.linalg.norm(np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0]),
+                                axis=1).sum() / 2)
@@ -0,0 +1,68 @@
+import importlib
+import sys
+import types
+from unittest import mock
+
+import pytest
+
+ADSK_MODULES = ('adsk', 'adsk.core', 'adsk.fusion', 'adsk.cam')
+
+# Modules the add-in defers until a command dialog first opens
+COMMAND_MODULES = ('FusionFiller.FillerCommand', 'FusionFiller.FillerPlan', 'FusionFiller.FillerEngines',
+                   'FusionFiller.FillerCost', 'FusionFiller.Fusion360Utilities.Fusion360Utilities')
+
+
+class StubModule(types.ModuleType):
+    # Event handler base classes are subclassed by the add-in, everything else is a mock
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+
+        if name.endswith('Handler'):
+            value = type(name, (), {'__init__': lambda handler, *args: None})
+        else:
+            value = mock.MagicMock(name=self.__name__ + '.' + name)
+
+        setattr(self, name, value)
+        return value
+
+
+@pytest.fixture
+def addin():
+    # A fresh copy of the add-in on a stubbed Fusion 360 API, the modules of the other tests are put back after
+    saved = dict(sys.modules)
+    for name in list(sys.modules):
+        if name.startswith('FusionFiller.') or name in ADSK_MODULES:
+            del sys.modules[name]
+
+    for name in ADSK_MODULES:
+        sys.modules[name] = StubModule(name)
+        if '.' in name:
+            setattr(sys.modules['adsk'], name.split('.')[1], sys.modules[name])
+
+    try:
+        yield importlib.import_module('FusionFiller.FusionFiller')
+    finally:
+        for name in list(sys.modules):
+            if name not in saved:
+                del sys.modules[name]
+        sys.modules.update(saved)
+
+
+def test_commands_load_on_first_use(addin):
+    ui = sys.modules['adsk.core'].Application.cast.return_value.userInterface
+
+    addin.run(None)
+    assert not ui.messageBox.called
+    assert not [name for name in COMMAND_MODULES if name in sys.modules]
+    assert addin.run_seconds is not None
+
+    # Opening a dialog imports the real command, once, and both buttons share the module
+    fill, update = addin.commands
+    command = fill.loaded_command()
+    assert type(command).__name__ == 'FillerCommand' and fill.loaded_command() is command
+    assert all(name in sys.modules for name in COMMAND_MODULES)
+    assert type(update.loaded_command()).__module__ == type(command).__module__
+
+    addin.stop(None)
+    assert not ui.messageBox.called
@@ -0,0 +1,147 @@
+import json
+
+import pytest
+
+from FusionFiller.FillerPlan import plan_fill, plan_tiles, HEIGHT_BANDS
+from FusionFiller.FillerCost import engine_cost, cost_seconds, choose_engine, fit_cost, dry_run, cell_faces, \
+    DEFAULT_COST, COST_TERMS, FIT_TERMS, AUTOMATIC_ENGINES
+from meshes import ellipsoid_mesh
+
+INFILL_TYPES = ["Hex", "Square", "Triangle", "Circle"]
+ENGINES = ["Sequential", "Tiled", "Parametric", "Voxel", "SDF"]
+
+
+def feature_def(infill_type, **kwargs):
+    return dict({"infill_type": infill_type, "body_type": "Direct Cut", "input_size": 1.0,
+                 "input_rib_thickness": .2, "input_shell_thickness": .2}, **kwargs)
+
+
+def box_plan(infill_type, size=(8, 6, 1)):
+    return plan_fill(feature_def(infill_type), (0, 0, 0), size)
+
+
+def measured(plans, engines, cost):
+    # Runs that took exactly the time the cost constants predict
+    records = []
+    for plan in plans:
+        for engine in engines:
+            terms = engine_cost(plan, {}, 120, engine)["terms"]
+            records.append({"engine": engine, "terms": terms, "seconds": cost_seconds(terms, cost)})
+    return records
+
+
+@pytest.mark.parametrize("infill_type", INFILL_TYPES)
+def test_engine_cost_counts(infill_type):
+    plan = box_plan(infill_type)
+    cells = plan["cells"]
+    definition = feature_def(infill_type)
+    added = sum(cell_faces(plan, cell) for cell in cells)
+
+    sequential = engine_cost(plan, definition, 120, "Sequential")
+    assert sequential["booleans"] == len(cells)
+    assert sequential["peak_faces"] == 120 + added
+
+    tiles = plan_tiles(plan, 120, 2.0)
+    tiled = engine_cost(plan, definition, 120, "Tiled", tiles)
+    assert tiled["tiles"] == len(tiles) > 1
+    assert tiled["booleans"] == sum(len(tile["cells"]) for tile in tiles) + 2 * len(tiles) - 1
+
+    parametric = engine_cost(plan, definition, 120, "Parametric")
+    assert parametric["booleans"] == 1 and parametric["peak_faces"] == 120 + added
+
+    # A mirrored plan draws the mirror image of every cell below the plane
+    mirrored = engine_cost(dict(plan, mirror={"axis": 0, "plane": 100.0}), definition, 120, "Parametric")
+    assert mirrored["sketch_curves"] == 2 * parametric["sketch_curves"]
+    assert mirrored["peak_faces"] == 120 + 2 * added
+
+    for engine in ENGINES:
+        result = engine_cost(plan, definition, 120, engine)
+        assert result["seconds"] == pytest.approx(cost_seconds(result["terms"]))
+        assert result["seconds"] > 0
+
+    assert engine_cost(plan, definition, 120, "Marching") is None
+
+
+def test_engine_cost_counts_trimmed_tools():
+    vertices, triangles = ellipsoid_mesh((4, 3, 1))
+    plan = plan_fill(feature_def("Hex"), vertices.min(axis=0), vertices.max(axis=0), (vertices, triangles))
+    trimmed = {(cell.motif, cell.level, cell.z_lo, cell.z_hi) for cell in plan["cells"]
+               if (cell.z_lo, cell.z_hi) != (0, HEIGHT_BANDS)}
+
+    assert trimmed
+    assert engine_cost(plan, {}, 1, "Sequential")["booleans"] == len(plan["cells"]) + len(trimmed)
+
+
+def test_choose_engine_picks_the_fastest():
+    plan = box_plan("Hex", (20, 16, 1))
+    definition = feature_def("Hex")
+
+    chosen, tiles, reason = choose_engine(plan, definition, 120)
+    seconds = [engine_cost(plan, definition, 120, engine)["seconds"] for engine in AUTOMATIC_ENGINES]
+    assert chosen["seconds"] == pytest.approx(min(seconds))
+    assert (tiles is not None) == (chosen["engine"] == "Tiled")
+    assert reason.startswith('{} cells on a 120 face body, {}'.format(len(plan["cells"]), chosen["engine"]))
+
+    # Expensive sketches rule out Parametric, and the choice can be limited
+    chosen, _, _ = choose_engine(plan, definition, 120, {"sketch_curve_seconds": 10})
+    assert chosen["engine"] != "Parametric"
+
+    chosen, tiles, _ = choose_engine(plan, definition, 120, engines=("Tiled",))
+    assert chosen["engine"] == "Tiled" and len(tiles) == chosen["tiles"]
+
+
+def test_fit_cost_recovers_the_constants():
+    true_cost = dict(DEFAULT_COST, boolean_seconds=.05, face_seconds=4e-5, tool_seconds=.5,
+                     sketch_curve_seconds=.001)
+    plans = [box_plan(infill_type, size) for infill_type in INFILL_TYPES for size in ((8, 6, 1), (12, 4, 1))]
+
+    fitted = fit_cost(measured(plans, ("Sequential", "Parametric"), true_cost))
+    for term in FIT_TERMS:
+        assert fitted[COST_TERMS[term]] == pytest.approx(true_cost[COST_TERMS[term]], rel=1e-6)
+
+
+def test_fit_cost_keeps_the_defaults_until_the_runs_determine_them():
+    plans = [box_plan(infill_type, size) for infill_type in INFILL_TYPES for size in ((8, 6, 1), (12, 4, 1))]
+    slow = dict(DEFAULT_COST, boolean_seconds=1.0)
+
+    # Too few runs, and any number of runs of one engine
+    assert fit_cost(measured(plans[:1], ("Sequential", "Tiled"), slow)) == DEFAULT_COST
+    assert fit_cost(measured(plans, ("Parametric",), slow)) == DEFAULT_COST
+    assert fit_cost(measured(plans, ("Sequential",), slow)) == DEFAULT_COST
+
+    # Runs without a time are ignored
+    records = measured(plans, ("Sequential", "Parametric"), slow)
+    assert fit_cost([dict(record, seconds=0) for record in records]) == DEFAULT_COST
+
+    # A fit with a constant below zero is dropped as a whole
+    negative = dict(DEFAULT_COST, tool_seconds=-.001)
+    assert fit_cost(measured(plans, ("Sequential", "Parametric"), negative)) == DEFAULT_COST
+
+
+def test_parametric_runs_do_not_skew_the_other_engines():
+    plan = box_plan("Hex", (20, 16, 1))
+    definition = feature_def("Hex")
+    records = measured([box_plan("Hex"), box_plan("Square"), box_plan("Circle")], ("Parametric",),
+                       dict(DEFAULT_COST, boolean_seconds=1.0))
+
+    cost = fit_cost(records)
+    for engine in ("Sequential", "Tiled"):
+        assert engine_cost(plan, definition, 120, engine, cost=cost)["seconds"] == \
+            pytest.approx(engine_cost(plan, definition, 120, engine)["seconds"])
+
+
+def test_dry_run_report():
+    plan = box_plan("Triangle")
+    definition = feature_def("Triangle")
+    report = dry_run(plan, definition, 120)
+
+    assert report["cell_count"] == len(plan["cells"]) == len(report["cells"])
+    assert sum(report["cells_per_motif"]) == sum(report["cells_per_level"]) == report["cell_count"]
+    assert [engine["engine"] for engine in report["engines"]] == ENGINES
+    assert report["candidate_cells"] == plan["candidate_count"]
+
+    # The report goes to a JSON file as it is
+    assert json.loads(json.dumps(report))["cell_count"] == report["cell_count"]
+
+    only = dry_run(plan, definition, 120, engines=("Parametric",))
+    assert [engine["engine"] for engine in only["engines"]] == ["Parametric"]
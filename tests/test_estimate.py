@@ -0,0 +1,94 @@
+import pytest
+
+from FusionFiller.FillerPlan import plan_fill, estimate_fill, solve_fill
+from FusionFiller.FillerVoxel import voxel_infill_mesh
+from FusionFiller.FillerSDF import sdf_infill_mesh
+from meshes import box_mesh, ellipsoid_mesh, mesh_volume, mesh_area
+
+INFILL_TYPES = ["Hex", "Square", "Triangle", "Circle"]
+
+# Relative error allowed between the estimate and the filled mesh.  Shells are estimated as area times
+# thickness, which overcounts at edges and curved faces, and voxels alias on the diagonal ribs of squares.
+TOLERANCE = {"Direct Cut": .025, "Create Shell": .05}
+
+BODIES = {
+    "box": lambda: box_mesh((0, 0, 0), (10, 8, 1)),
+    "ellipsoid": lambda: ellipsoid_mesh((4, 4, 1)),
+}
+
+
+def feature_def(infill_type, body_type):
+    return {"infill_type": infill_type, "body_type": body_type, "input_size": .8, "input_rib_thickness": .16,
+            "input_shell_thickness": .2}
+
+
+def planned(mesh, infill_type, body_type):
+    # The estimate of a planned fill, the plan and its feature definition
+    corners = mesh[0][mesh[1]]
+    definition = feature_def(infill_type, body_type)
+    plan = plan_fill(definition, mesh[0].min(axis=0), mesh[0].max(axis=0), mesh)
+
+    return estimate_fill(definition, mesh_volume(corners), mesh_area(corners), plan), plan, definition
+
+
+@pytest.mark.parametrize("body", sorted(BODIES))
+@pytest.mark.parametrize("body_type", sorted(TOLERANCE))
+@pytest.mark.parametrize("infill_type", INFILL_TYPES)
+def test_estimate_matches_the_voxel_fill(body, body_type, infill_type):
+    mesh = BODIES[body]()
+    estimate, plan, definition = planned(mesh, infill_type, body_type)
+    filled = mesh_volume(voxel_infill_mesh(plan, definition, mesh, .02))
+
+    assert estimate["volume"] == pytest.approx(filled, rel=TOLERANCE[body_type])
+
+
+@pytest.mark.parametrize("infill_type", INFILL_TYPES)
+def test_estimate_matches_the_sdf_fill(infill_type):
+    mesh = ellipsoid_mesh((3, 3, .4), 48)
+    estimate, plan, definition = planned(mesh, infill_type, "Direct Cut")
+    filled = mesh_volume(sdf_infill_mesh(plan, definition, mesh, .04))
+
+    assert estimate["volume"] == pytest.approx(filled, rel=TOLERANCE["Direct Cut"])
+
+
+def test_estimate_of_an_unknown_type_or_empty_body():
+    assert estimate_fill(feature_def("Gyroid", "Direct Cut"), 10, 20) is None
+    assert estimate_fill(feature_def("Hex", "Direct Cut"), 0, 0) is None
+
+
+def test_shell_is_solid():
+    estimate = estimate_fill(dict(feature_def("Hex", "Create Shell"), input_shell_thickness=10), 10, 20)
+    assert estimate["solid_fraction"] == pytest.approx(1)
+
+
+@pytest.mark.parametrize("body_type", sorted(TOLERANCE))
+@pytest.mark.parametrize("infill_type", INFILL_TYPES)
+@pytest.mark.parametrize("parameter", ["input_rib_thickness", "input_size"])
+def test_solve_meets_reachable_targets(parameter, infill_type, body_type):
+    for target in (.6, .8):
+        solved = solve_fill(feature_def(infill_type, body_type), 80, 196, target, parameter)
+        assert solved is not None
+        assert estimate_fill(solved, 80, 196)["solid_fraction"] == pytest.approx(target, abs=1e-6)
+
+
+@pytest.mark.parametrize("parameter", ["input_rib_thickness", "input_size"])
+def test_solve_rejects_unreachable_targets(parameter):
+    assert solve_fill(feature_def("Hex", "Direct Cut"), 80, 196, 1.5, parameter) is None
+
+    # Circles always leave the material between them, and the shell is always solid
+    assert solve_fill(feature_def("Circle", "Direct Cut"), 80, 196, .05, parameter) is None
+    assert solve_fill(feature_def("Hex", "Create Shell"), 80, 196, .3, parameter) is None
+
+
+def test_solve_graded_fill_with_plans():
+    mesh = ellipsoid_mesh((4, 4, 1))
+    corners = mesh[0][mesh[1]]
+    volume, area = mesh_volume(corners), mesh_area(corners)
+    definition = dict(feature_def("Hex", "Direct Cut"), grade_rib_thickness=.3, grade_distance=1.5)
+    plan_for = lambda trial: plan_fill(trial, mesh[0].min(axis=0), mesh[0].max(axis=0), mesh)
+
+    solved = solve_fill(definition, volume, area, .7, plan_for=plan_for)
+    assert solved is not None
+
+    # The estimate of the solved value holds for its own plan, not just the plan of the previous pass
+    assert estimate_fill(solved, volume, area, plan_for(solved))["solid_fraction"] == pytest.approx(.7, abs=1e-3)
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from FusionFiller.Fusion360Utilities.Fusion360MeshBVH import MeshBVH, benchmark_mesh_bvh, _point_triangle_distance_sq
+from meshes import box_mesh, sphere_mesh
+
+
+def test_point_triangle_distance_regions():
+    a, b, c = np.array([[0.0, 0, 0]]), np.array([[2.0, 0, 0]]), np.array([[0.0, 2, 0]])
+
+    # Above the face, beyond an edge and beyond a corner
+    points = np.array([[.5, .5, 3], [1.5, 1.5, 0], [-1, -1, 0], [3, 0, 4]])
+    expected = [9, .5, 2, 17]
+    for point, distance_sq in zip(points, expected):
+        assert np.isclose(_point_triangle_distance_sq(point[None], a, b, c)[0], distance_sq)
+
+
+def test_contains_matches_a_sphere():
+    bvh = MeshBVH(*sphere_mesh(2.0, 48))
+    points = np.random.default_rng(2).uniform(-3, 3, (20000, 3))
+    radius = np.linalg.norm(points, axis=1)
+
+    # Facets lie within 1% of the radius inside the sphere
+    clear = (radius < 1.98) | (radius > 2.0)
+    assert np.array_equal(bvh.contains(points[clear]), radius[clear] < 2.0)
+
+
+def test_contains_and_distance_match_a_box():
+    bvh = MeshBVH(*box_mesh((0, 0, 0), (3, 2, 1)))
+
+    # Axis aligned faces and grid points are where ray parity tests fail
+    grid = np.stack(np.meshgrid(np.linspace(-.5, 3.5, 17), np.linspace(-.5, 2.5, 13), np.linspace(-.5, 1.5, 9),
+                                indexing='ij'), axis=-1).reshape(-1, 3)
+    inside = np.all((grid > 0) & (grid < (3, 2, 1)), axis=1)
+    on_surface = np.all((grid >= 0) & (grid <= (3, 2, 1)), axis=1) & ~inside
+    assert np.array_equal(bvh.contains(grid[~on_surface]), inside[~on_surface])
+
+    depth = np.minimum(grid, np.array([3, 2, 1]) - grid).min(axis=1)
+    assert np.allclose(bvh.distance(grid[inside]), depth[inside])
+    assert np.allclose(bvh.signed_distance(grid[inside]), -depth[inside])
+
+    gap = np.maximum(np.maximum(-grid, grid - (3, 2, 1)), 0)
+    outside = ~inside & ~on_surface
+    assert np.allclose(bvh.signed_distance(grid[outside]), np.linalg.norm(gap[outside], axis=1))
+
+
+def test_distance_matches_brute_force():
+    vertices, triangles = sphere_mesh(1.5, 24)
+    bvh = MeshBVH(vertices, triangles, leaf_size=4, chunk_size=97)
+    points = np.random.default_rng(3).uniform(-2.5, 2.5, (300, 3))
+
+    corners = vertices[triangles]
+    repeated = np.repeat(points, len(corners), axis=0)
+    tiled = np.tile(corners, (len(points), 1, 1))
+    brute = np.sqrt(_point_triangle_distance_sq(repeated, tiled[:, 0], tiled[:, 1], tiled[:, 2])
+                    .reshape(len(points), len(corners)).min(axis=1))
+
+    assert np.allclose(bvh.distance(points), brute)
+
+
+def test_empty_query():
+    bvh = MeshBVH(*sphere_mesh())
+    assert len(bvh.contains(np.zeros((0, 3)))) == 0
+    assert len(bvh.distance(np.zeros((0, 3)))) == 0
+
+
+def test_empty_mesh():
+    for triangles in ([], np.zeros((0, 3), dtype=np.int64)):
+        with pytest.raises(ValueError):
+            MeshBVH(np.zeros((0, 3)), triangles)
+
+
+def test_benchmark_reports_throughput():
+    for segments in (32, 64):
+        result = benchmark_mesh_bvh(*sphere_mesh(segments=segments), point_count=5000)
+        assert result["triangles"] == segments * (segments - 2)
+        assert result["contains_points_per_second"] > 0 and result["distance_points_per_second"] > 0
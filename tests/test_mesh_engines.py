@@ -0,0 +1,49 @@
+import collections
+
+import numpy as np
+import pytest
+
+from FusionFiller.FillerPlan import plan_fill
+from FusionFiller.FillerVoxel import voxel_infill_mesh
+from FusionFiller.FillerSDF import sdf_infill_mesh
+from meshes import ellipsoid_mesh, mesh_volume
+
+ENGINES = {"Voxel": voxel_infill_mesh, "SDF": sdf_infill_mesh}
+
+
+def open_edges(corners):
+    # Directed edges of a closed, consistently wound mesh cancel out in pairs
+    keys = np.round(corners, 9)
+    edges = collections.Counter()
+    for k in range(3):
+        for a, b in zip(map(tuple, keys[:, k]), map(tuple, keys[:, (k + 1) % 3])):
+            edges[(a, b)] += 1
+            edges[(b, a)] -= 1
+    return sum(abs(count) for count in edges.values()) // 2
+
+
+@pytest.mark.parametrize("engine", sorted(ENGINES))
+@pytest.mark.parametrize("body_type", ["Direct Cut", "Create Shell"])
+def test_infill_mesh_is_closed(engine, body_type):
+    mesh = ellipsoid_mesh((2.5, 2, .5), 32)
+    feature_def = {"infill_type": "Hex", "body_type": body_type, "input_size": 1.0, "input_rib_thickness": .25,
+                   "input_shell_thickness": .25}
+    plan = plan_fill(feature_def, mesh[0].min(axis=0), mesh[0].max(axis=0), mesh)
+
+    corners = ENGINES[engine](plan, feature_def, mesh, .05)
+
+    assert len(corners) and open_edges(corners) == 0
+    assert 0 < mesh_volume(corners) < mesh_volume(mesh[0][mesh[1]])
+
+
+def test_sdf_blocks_join_without_seams():
+    mesh = ellipsoid_mesh((2, 1.5, .5), 32)
+    feature_def = {"infill_type": "Circle", "body_type": "Direct Cut", "input_size": 1.0,
+                   "input_rib_thickness": .25, "input_shell_thickness": .25}
+    plan = plan_fill(feature_def, mesh[0].min(axis=0), mesh[0].max(axis=0), mesh)
+
+    whole = sdf_infill_mesh(plan, feature_def, mesh, .05, block_size=256)
+    blocks = sdf_infill_mesh(plan, feature_def, mesh, .05, block_size=7)
+
+    assert open_edges(blocks) == 0
+    assert np.isclose(mesh_volume(blocks), mesh_volume(whole))
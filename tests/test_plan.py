@@ -0,0 +1,370 @@
+import json
+
+import numpy as np
+import pytest
+
+from FusionFiller.FillerPlan import lattice_def, plan_fill, band_range, footprint_raster, raster_hits, plan_tiles, \
+    encode_plan, decode_plan, mirror_offset, mirror_symmetric, MIRROR_AXES, HEIGHT_BANDS, PLAN_FORMAT_VERSION, \
+    draft_plan, parametric_cells, DRAFT_CELL_LIMIT, DRAFT_CIRCLE_SIDES
+from meshes import sphere_mesh
+
+INFILL_TYPES = ["Hex", "Square", "Triangle", "Circle"]
+
+
+def feature_def(infill_type, **kwargs):
+    return dict({"infill_type": infill_type, "body_type": "Direct Cut", "input_size": 1.0,
+                 "input_rib_thickness": .2, "input_shell_thickness": .2}, **kwargs)
+
+
+def lattice_sites(plan, count=12):
+    # Every tool position of the endless lattice within count pattern repeats of the anchor
+    sites = []
+    for i in range(-count, count + 1):
+        for j in range(-count, count + 1):
+            for motif_index, motif in enumerate(plan["motifs"]):
+                sites.append((motif_index, plan["anchor"][0] + i * plan["d1_space"] + motif.dx,
+                              plan["anchor"][1] + j * plan["d2_space"] + motif.dy))
+    return sites
+
+
+def test_unknown_infill_type():
+    assert lattice_def("Gyroid", 1.0, .2) is None
+    assert plan_fill(feature_def("Gyroid"), (0, 0, 0), (1, 1, 1)) is None
+
+
+@pytest.mark.parametrize("infill_type", INFILL_TYPES)
+def test_cells_sit_on_the_lattice(infill_type):
+    plan = plan_fill(feature_def(infill_type), (-3, -2, 0), (4, 3, 1))
+
+    for cell in plan["cells"]:
+        motif = plan["motifs"][cell.motif]
+        i = (cell.x - plan["anchor"][0] - motif.dx) / plan["d1_space"]
+        j = (cell.y - plan["anchor"][1] - motif.dy) / plan["d2_space"]
+        assert abs(i - round(i)) < 1e-9 and abs(j - round(j)) < 1e-9
+
+
+@pytest.mark.parametrize("infill_type", INFILL_TYPES)
+def test_plan_without_mesh_covers_the_box_at_full_height(infill_type):
+    min_point, max_point = (-3, -2, 0), (4, 3, 1)
+    plan = plan_fill(feature_def(infill_type), min_point, max_point)
+
+    assert plan["candidate_count"] == len(plan["cells"])
+    assert all((cell.z_lo, cell.z_hi) == (0, HEIGHT_BANDS) for cell in plan["cells"])
+
+    planned = {(cell.motif, round(cell.x, 6), round(cell.y, 6)) for cell in plan["cells"]}
+    for motif_index, x, y in lattice_sites(plan):
+        if min_point[0] <= x <= max_point[0] and min_point[1] <= y <= max_point[1]:
+            assert (motif_index, round(x, 6), round(y, 6)) in planned
+
+    # Full height tools reach past the top and bottom of the body
+    z_bottom, z_top = band_range(plan, plan["cells"][0])
+    assert z_bottom < min_point[2] and z_top > max_point[2]
+
+
+@pytest.mark.parametrize("infill_type", INFILL_TYPES)
+def test_trimmed_tools_cover_the_material_under_them(infill_type):
+    vertices, triangles = sphere_mesh(3.0, 48)
+    plan = plan_fill(feature_def(infill_type), vertices.min(axis=0), vertices.max(axis=0), (vertices, triangles))
+
+    # Trimming has to shorten the tools near the rim of a sphere
+    assert any(cell.z_hi - cell.z_lo < HEIGHT_BANDS for cell in plan["cells"])
+
+    # Points of the solid under a tool's footprint must lie within the tool's height
+    points = np.random.default_rng(1).uniform(-3, 3, (20000, 3))
+    points = points[np.linalg.norm(points, axis=1) < 2.95]
+
+    reach = max(level["spoke"] for level in plan["levels"])
+    for cell in plan["cells"]:
+        z_bottom, z_top = band_range(plan, cell)
+        under = np.hypot(points[:, 0] - cell.x, points[:, 1] - cell.y) <= reach
+        assert np.all(points[under, 2] >= z_bottom) and np.all(points[under, 2] <= z_top)
+
+
+def test_footprint_raster_covers_the_triangle():
+    vertices = np.array([[0, 0, 0], [4, 1, 0], [1, 3, 0]], dtype=np.float64)
+    triangles = np.array([[0, 1, 2]])
+    raster = footprint_raster(vertices, triangles, .1)
+
+    # Every pixel with its center inside the triangle is covered
+    coverage = raster["coverage"]
+    i, j = np.meshgrid(np.arange(coverage.shape[0]), np.arange(coverage.shape[1]), indexing='ij')
+    x = raster["x0"] + (i + .5) * raster["pixel_size"]
+    y = raster["y0"] + (j + .5) * raster["pixel_size"]
+    inside = np.ones(x.shape, dtype=bool)
+    for k in range(3):
+        a, b = vertices[k], vertices[(k + 1) % 3]
+        inside &= (b[0] - a[0]) * (y - a[1]) - (b[1] - a[1]) * (x - a[0]) >= 0
+
+    assert inside.any()
+    assert np.all(coverage[inside])
+
+    # Footprints far from the triangle miss it
+    assert raster_hits(raster, np.array([1.5, 10.0]), np.array([1.2, 10.0]), .2).tolist() == [True, False]
+
+
+@pytest.mark.parametrize("infill_type", INFILL_TYPES)
+def test_culling_keeps_every_cell_over_the_body(infill_type):
+    vertices, triangles = sphere_mesh(3.0, 48)
+    min_point, max_point = vertices.min(axis=0), vertices.max(axis=0)
+    full = plan_fill(feature_def(infill_type), min_point, max_point)
+    culled = plan_fill(feature_def(infill_type), min_point, max_point, (vertices, triangles))
+
+    assert culled["candidate_count"] == full["candidate_count"]
+    assert len(culled["cells"]) < len(full["cells"])
+
+    # A cell whose footprint reaches the disk under the sphere must be kept
+    reach = max(level["spoke"] for level in culled["levels"])
+    kept = {(cell.motif, round(cell.x, 6), round(cell.y, 6)) for cell in culled["cells"]}
+    for cell in full["cells"]:
+        if np.hypot(cell.x, cell.y) < 2.95 + reach:
+            assert (cell.motif, round(cell.x, 6), round(cell.y, 6)) in kept
+
+
+def tiled_points(tiles, points):
+    return np.any([(points[:, 0] >= tile["x_min"]) & (points[:, 0] <= tile["x_max"]) &
+                   (points[:, 1] >= tile["y_min"]) & (points[:, 1] <= tile["y_max"]) for tile in tiles], axis=0)
+
+
+@pytest.mark.parametrize("tile_size, face_budget", [(.25, None), (None, 200), (None, None)])
+def test_tiles_cover_the_core_footprint(tile_size, face_budget):
+    vertices, triangles = sphere_mesh(3.0, 48)
+    plan = plan_fill(feature_def("Hex", input_rib_thickness=.4), vertices.min(axis=0), vertices.max(axis=0),
+                     (vertices, triangles))
+    tiles = plan_tiles(plan, 2000, tile_size, face_budget)
+
+    # Small tiles between the cells hold no cell, they still carry their slice of the core
+    if tile_size:
+        assert any(not tile["cells"] for tile in tiles)
+
+    points = np.random.default_rng(4).uniform(-3, 3, (20000, 2))
+    points = points[np.hypot(points[:, 0], points[:, 1]) < 3]
+    assert np.all(tiled_points(tiles, points))
+
+    # Every cell is cut in each tile its footprint overlaps
+    reach = max(level["spoke"] for level in plan["levels"])
+    for tile in tiles:
+        overlaps = [index for index, cell in enumerate(plan["cells"])
+                    if tile["x_min"] - reach < cell.x < tile["x_max"] + reach and
+                    tile["y_min"] - reach < cell.y < tile["y_max"] + reach]
+        assert tile["cells"] == overlaps
+
+
+def test_tiles_of_a_plan_without_cells():
+    plan = plan_fill(feature_def("Hex"), (0, 0, 0), (2, 2, 1))
+    plan["cells"] = []
+
+    tiles = plan_tiles(plan, 100, .5)
+    assert tiles and all(not tile["cells"] for tile in tiles)
+    assert np.all(tiled_points(tiles, np.random.default_rng(5).uniform(0, 2, (1000, 2))))
+
+
+@pytest.mark.parametrize("infill_type", INFILL_TYPES)
+def test_encoded_plan_round_trip(infill_type):
+    vertices, triangles = sphere_mesh(3.0, 48)
+    definition = feature_def(infill_type, grade_rib_thickness=.4, grade_distance=1.0, symmetry="YZ",
+                             anchor=[.3, -.2, 0])
+    plan = plan_fill(definition, vertices.min(axis=0), vertices.max(axis=0), (vertices, triangles))
+    decoded = decode_plan(encode_plan(plan))
+
+    assert len(decoded["cells"]) == len(plan["cells"])
+    for cell, decoded_cell in zip(plan["cells"], decoded["cells"]):
+        assert decoded_cell.x == pytest.approx(cell.x, abs=1e-6)
+        assert decoded_cell.y == pytest.approx(cell.y, abs=1e-6)
+        assert (decoded_cell.motif, decoded_cell.z_lo, decoded_cell.z_hi, decoded_cell.level) == \
+               (cell.motif, cell.z_lo, cell.z_hi, cell.level)
+
+    for key in ("infill_type", "input_size", "d1_space", "d2_space", "gap", "spoke", "x_space", "y_space",
+                "x_qty_scale", "motifs", "anchor", "origin", "mirror", "extent", "height", "z_base", "band_height",
+                "candidate_count", "levels"):
+        expected = pytest.approx(plan[key]) if isinstance(plan[key], float) else plan[key]
+        assert decoded[key] == expected
+
+
+def test_encoded_plan_size_and_versions():
+    plan = plan_fill(feature_def("Triangle", input_size=.2, input_rib_thickness=.04), (0, 0, 0), (12, 12, 1))
+    assert len(plan["cells"]) > 50000
+
+    text = encode_plan(plan)
+    assert len(text) < 1000000
+
+    # Plans of any other version are not reused
+    encoded = json.loads(text)
+    for version in (PLAN_FORMAT_VERSION - 1, PLAN_FORMAT_VERSION + 1, None):
+        encoded["header"]["version"] = version
+        assert decode_plan(json.dumps(encoded)) is None
+
+
+def test_encoded_empty_plan():
+    plan = plan_fill(feature_def("Hex"), (0, 0, 0), (1, 1, 1))
+    plan["cells"] = []
+    assert decode_plan(encode_plan(plan))["cells"] == []
+
+
+def corner_angles(motif):
+    return sorted(round((360 / motif.sides * i - motif.offset) % 360, 6) % 360 for i in range(motif.sides))
+
+
+@pytest.mark.parametrize("axis", [0, 1])
+@pytest.mark.parametrize("infill_type", INFILL_TYPES)
+def test_mirror_offset_maps_the_lattice_onto_itself(infill_type, axis):
+    plan = plan_fill(feature_def(infill_type), (-2, -2, 0), (2, 2, 1))
+    offset = mirror_offset(plan, axis)
+    assert offset is not None
+
+    plane = plan["anchor"][axis] + offset
+    sites = {(motif_index, round(x, 6), round(y, 6)) for motif_index, x, y in lattice_sites(plan)}
+    shapes = {index: (motif.sides, corner_angles(motif)) for index, motif in enumerate(plan["motifs"])}
+
+    for motif_index, x, y in lattice_sites(plan, 4):
+        motif = plan["motifs"][motif_index]
+        if axis == 0:
+            x = 2 * plane - x
+            mirrored = motif._replace(offset=motif.offset + 180)
+        else:
+            y = 2 * plane - y
+            mirrored = motif._replace(offset=-motif.offset)
+
+        # A tool of the same shape sits on the mirrored position
+        assert any((other, round(x, 6), round(y, 6)) in sites and shapes[other] == (mirrored.sides,
+                                                                                     corner_angles(mirrored))
+                   for other in shapes)
+
+
+def test_mirror_symmetric():
+    vertices, triangles = sphere_mesh(2.0, 32)
+    assert mirror_symmetric((vertices + (5, -3, 1), triangles), 0, .01)
+    assert mirror_symmetric((vertices, triangles), 1, .01)
+
+    # Pulling one side out breaks the symmetry across x only
+    stretched = vertices.copy()
+    stretched[:, 0] = np.where(stretched[:, 0] > 0, stretched[:, 0] * 1.5, stretched[:, 0])
+    assert not mirror_symmetric((stretched, triangles), 0, .01)
+    assert mirror_symmetric((stretched, triangles), 1, .01)
+
+
+@pytest.mark.parametrize("symmetry", sorted(MIRROR_AXES))
+@pytest.mark.parametrize("infill_type", INFILL_TYPES)
+def test_symmetric_plan_covers_the_full_plan(infill_type, symmetry):
+    vertices, triangles = sphere_mesh(3.0, 48)
+    vertices = vertices + (1, 2, 0)
+    mesh = (vertices, triangles)
+    half = plan_fill(feature_def(infill_type, symmetry=symmetry), vertices.min(axis=0), vertices.max(axis=0), mesh)
+    mirror = half["mirror"]
+    assert mirror == {"symmetry": symmetry, "axis": MIRROR_AXES[symmetry],
+                      "plane": pytest.approx((1, 2)[MIRROR_AXES[symmetry]])}
+
+    # Only cells reaching below the plane are planned
+    reach = max(level["spoke"] for level in half["levels"])
+    assert all((cell.x, cell.y)[mirror["axis"]] - reach < mirror["plane"] for cell in half["cells"])
+
+    # Mirrored, the half plan holds every cell of the lattice through the same anchor
+    full = plan_fill(feature_def(infill_type, anchor=half["anchor"]), vertices.min(axis=0), vertices.max(axis=0),
+                     mesh)
+    mirrored = set()
+    for cell in half["cells"]:
+        position = [cell.x, cell.y]
+        mirrored.add((round(position[0], 6), round(position[1], 6)))
+        position[mirror["axis"]] = 2 * mirror["plane"] - position[mirror["axis"]]
+        mirrored.add((round(position[0], 6), round(position[1], 6)))
+
+    # The footprint raster keeps a few cells just off the sphere that the mirrored plan leaves out
+    missing = [cell for cell in full["cells"] if (round(cell.x, 6), round(cell.y, 6)) not in mirrored]
+    assert all(np.hypot(cell.x - 1, cell.y - 2) > 3 for cell in missing)
+
+    detected = plan_fill(feature_def(infill_type, symmetry="Detect"), vertices.min(axis=0), vertices.max(axis=0),
+                         mesh)
+    assert detected["mirror"]["symmetry"] == "YZ"
+
+
+@pytest.mark.parametrize("infill_type", INFILL_TYPES)
+def test_chosen_plane_of_an_asymmetric_body_is_filled_in_full(infill_type):
+    vertices, triangles = sphere_mesh(3.0, 48)
+    vertices[:, 0] = np.where(vertices[:, 0] > 0, vertices[:, 0] * 1.5, vertices[:, 0])
+    mesh = (vertices, triangles)
+
+    full = plan_fill(feature_def(infill_type), vertices.min(axis=0), vertices.max(axis=0), mesh)
+    rejected = plan_fill(feature_def(infill_type, symmetry="YZ"), vertices.min(axis=0), vertices.max(axis=0), mesh)
+    assert rejected["mirror"] is None and rejected["mirror_rejected"] == "YZ"
+    assert rejected["cells"] == full["cells"]
+
+    # The body is still symmetric across XZ
+    kept = plan_fill(feature_def(infill_type, symmetry="XZ"), vertices.min(axis=0), vertices.max(axis=0), mesh)
+    assert kept["mirror"]["symmetry"] == "XZ" and kept["mirror_rejected"] is None
+
+
+@pytest.mark.parametrize("infill_type", INFILL_TYPES)
+def test_draft_cuts_circles_as_polygons(infill_type):
+    plan = plan_fill(feature_def(infill_type), (0, 0, 0), (4, 4, 1))
+    draft = plan_fill(feature_def(infill_type, draft=True), (0, 0, 0), (4, 4, 1))
+
+    for motif, draft_motif in zip(plan["motifs"], draft["motifs"]):
+        assert draft_motif == (motif._replace(sides=DRAFT_CIRCLE_SIDES) if motif.sides == 0 else motif)
+    assert draft["cells"] == plan["cells"]
+
+
+@pytest.mark.parametrize("infill_type", INFILL_TYPES)
+def test_draft_plan_caps_the_cell_count(infill_type):
+    vertices, triangles = sphere_mesh(3.0, 48)
+    plans = []
+
+    def plan_for(trial):
+        plans.append(plan_fill(trial, vertices.min(axis=0), vertices.max(axis=0), (vertices, triangles)))
+        return plans[-1]
+
+    definition = feature_def(infill_type, input_size=.1, input_rib_thickness=.02, draft=True)
+    draft = draft_plan(definition, plan_for)
+    assert len(plans[0]["cells"]) > DRAFT_CELL_LIMIT >= len(draft["cells"])
+
+    # Only the cell size is coarsened, the feature definition is left as it was
+    assert draft["input_size"] > definition["input_size"] == .1
+    assert all(level["rib"] == .02 for level in draft["levels"])
+
+    # A smaller limit coarsens further, fills under the limit are planned once
+    assert len(draft_plan(definition, plan_for, 200)["cells"]) <= 200
+    plans.clear()
+    assert draft_plan(feature_def(infill_type, draft=True), plan_for)["input_size"] == 1.0
+    assert len(plans) == 1
+
+
+@pytest.mark.parametrize("symmetry", sorted(MIRROR_AXES))
+@pytest.mark.parametrize("infill_type", INFILL_TYPES)
+def test_parametric_cells_draw_both_halves_once(infill_type, symmetry):
+    vertices, triangles = sphere_mesh(3.0, 48)
+    mesh = (vertices + (1, 2, 0), triangles)
+    min_point, max_point = mesh[0].min(axis=0), mesh[0].max(axis=0)
+
+    half = plan_fill(feature_def(infill_type, symmetry=symmetry), min_point, max_point, mesh)
+    full = plan_fill(feature_def(infill_type, anchor=half["anchor"]), min_point, max_point, mesh)
+    axis, plane = half["mirror"]["axis"], half["mirror"]["plane"]
+    assert half["anchor"][axis] + mirror_offset(half, axis) == pytest.approx(plane)
+
+    outlines = parametric_cells(half)
+    positions = [(round(x, 6), round(y, 6)) for x, y, _, _, _ in outlines]
+    assert len(set(positions)) == len(positions)
+
+    # Cells on the plane are drawn once, the others below it with their image above it
+    along = [(cell.x, cell.y)[axis] for cell in half["cells"]]
+    on_plane = sum(abs(value - plane) < 1e-9 for value in along)
+    below = sum(value < plane - 1e-9 for value in along)
+    assert len(outlines) == on_plane + 2 * below
+
+    # Every outline is a tool of the full lattice, with the same shape
+    shapes = {(round(cell.x, 6), round(cell.y, 6)): corner_angles(full["motifs"][cell.motif])
+              for cell in full["cells"]}
+    for (x, y, sides, offset, spoke), position in zip(outlines, positions):
+        if position in shapes:
+            assert corner_angles(full["motifs"][0]._replace(sides=sides, offset=offset)) == shapes[position]
+
+    # And the outlines cover the full lattice over the body
+    missing = [cell for cell in full["cells"] if (round(cell.x, 6), round(cell.y, 6)) not in set(positions)]
+    assert all(np.hypot(cell.x - 1, cell.y - 2) > 3 for cell in missing)
+
+
+def test_parametric_cells_without_a_mirror():
+    plan = plan_fill(feature_def("Hex", grade_rib_thickness=.4, grade_distance=1.0), (0, 0, 0), (4, 4, 1))
+    outlines = parametric_cells(plan)
+
+    assert [(x, y) for x, y, _, _, _ in outlines] == [(cell.x, cell.y) for cell in plan["cells"]]
+    assert all(outline[2:] == (plan["motifs"][cell.motif].sides, plan["motifs"][cell.motif].offset,
+                               plan["levels"][cell.level]["spoke"]) for outline, cell in zip(outlines, plan["cells"]))
+